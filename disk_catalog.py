@@ -0,0 +1,272 @@
+import os
+import json
+import stat
+import time
+import threading
+import subprocess
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from docker_engine import format_size
+from disk_headers import UnsupportedImage, read_disk_chain
+
+DISK_CATALOG_FILE = "disk_catalog.json"
+DISK_DIRECTORIES = [directory for directory in os.environ.get("CLOUD_DISK_DIRS", "").split(os.pathsep) if directory]
+DISK_EXTENSIONS = ('.qcow2', '.qcow', '.vmdk', '.vdi', '.vhd', '.vhdx', '.raw', '.img')
+DISK_SCAN_WORKERS = 8
+DISK_PROBE_WORKERS = 4
+
+
+@dataclass(slots=True)
+class DiskRecord:
+    path: str
+    mtime: int
+    size: int
+    format: str = ""
+    virtual_size: int = 0
+    actual_size: int = 0
+    cluster_size: int = 0
+    backing_chain: list = field(default_factory=list)
+    dirty: bool = False
+    error: str = ""
+
+    def row(self):
+        return [self.path, self.format, format_size(self.virtual_size), format_size(self.actual_size),
+                format_size(self.cluster_size) if self.cluster_size else "", " -> ".join(self.backing_chain), "yes" if self.dirty else "", self.error]
+
+
+def stat_key(path):
+    # (mtime, size) changes on every write qemu makes, so an unchanged pair means an unchanged header
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def probe_disk(qemu_path, path):
+    # --backing-chain fails when a backing file is missing, which is worth showing rather than hiding
+    for extra in (['--backing-chain'], []):
+        try:
+            result = subprocess.run([qemu_path, 'info', '--output=json', *extra, path],
+                                    check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except subprocess.CalledProcessError as e:
+            error = (e.stderr or str(e)).strip()
+            continue
+        documents = json.loads(result.stdout)
+        return documents if isinstance(documents, list) else [documents]
+    raise ValueError(error)
+
+
+def apply_info(record, documents):
+    top = documents[0]
+    record.format = top.get("format", "")
+    record.virtual_size = int(top.get("virtual-size", 0))
+    record.actual_size = int(top.get("actual-size", 0))
+    record.cluster_size = int(top.get("cluster-size", 0))
+    record.dirty = bool(top.get("dirty-flag", False))
+    if len(documents) > 1:
+        chain = [document.get("filename", "") for document in documents[1:]]
+    elif top.get("full-backing-filename") or top.get("backing-filename"):
+        chain = [top.get("full-backing-filename") or top.get("backing-filename")]
+    else:
+        chain = []
+    # Absolute paths so a base can be matched against every overlay that names it
+    record.backing_chain = [os.path.abspath(path) for path in chain]
+    record.error = ""
+
+
+def scan_directory(directory):
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(DISK_EXTENSIONS):
+                        stat = entry.stat()
+                        files.append((os.path.abspath(entry.path), stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirectories
+
+
+class DiskCatalog:
+    COLUMNS = ["Disk", "Role", "Format", "Virtual Size", "Allocated", "Cluster", "Backing Chain", "Dirty", "Error"]
+
+    def __init__(self, qemu_path, path=DISK_CATALOG_FILE, directories=None):
+        self.qemu_path = qemu_path
+        self.path = path
+        self.directories = list(directories if directories is not None else DISK_DIRECTORIES)
+        self.records = {}
+        self.golden = set()
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        for directory in stored.get("directories", []):
+            if directory not in self.directories:
+                self.directories.append(directory)
+        self.golden.update(stored.get("golden", []))
+        for entry in stored.get("records", []):
+            record = DiskRecord(**entry)
+            self.records[record.path] = record
+
+    def save(self):
+        with self.lock:
+            if not self.dirty or not self.path:
+                return
+            snapshot = {"directories": list(self.directories), "golden": sorted(self.golden),
+                        "records": [asdict(record) for record in self.records.values()]}
+            self.dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(snapshot, file)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            with self.lock:
+                self.dirty = True
+
+    def add_directory(self, directory):
+        directory = os.path.abspath(directory)
+        with self.lock:
+            if directory in self.directories:
+                return
+            self.directories.append(directory)
+            self.dirty = True
+
+    def mark_golden(self, path, golden=True):
+        # Bases are made read-only so neither a VM nor a commit can change what their clones read
+        path = os.path.abspath(path)
+        mode = os.stat(path).st_mode
+        writable = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+        os.chmod(path, mode & ~writable if golden else mode | stat.S_IWUSR)
+        with self.lock:
+            if golden:
+                self.golden.add(path)
+            else:
+                self.golden.discard(path)
+            self.dirty = True
+        self.save()
+
+    def dependents(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            return sorted(record.path for record in self.records.values() if path in record.backing_chain)
+
+    def row(self, record):
+        if record.path in self.golden:
+            role = f"golden ({len(self.dependents(record.path))} clones)"
+        elif record.backing_chain:
+            role = "overlay"
+        else:
+            role = ""
+        row = record.row()
+        return row[:1] + [role] + row[1:]
+
+    def cached(self, path, key):
+        with self.lock:
+            record = self.records.get(path)
+        if record is not None and (record.mtime, record.size) == key:
+            return record
+        return None
+
+    def probe(self, path, key):
+        record = DiskRecord(path, *key)
+        try:
+            try:
+                documents = read_disk_chain(path)
+            except (OSError, UnsupportedImage):
+                # Formats or variants the header readers do not know still get qemu-img's answer
+                documents = probe_disk(self.qemu_path, path)
+            apply_info(record, documents)
+        except (OSError, ValueError) as e:
+            record.error = str(e)
+        with self.lock:
+            self.records[path] = record
+            self.dirty = True
+        return record
+
+    def info(self, path):
+        # Single-disk lookup for callers such as resize; only re-probes when the file changed
+        path = os.path.abspath(path)
+        key = stat_key(path)
+        record = self.cached(path, key) or self.probe(path, key)
+        if record.error:
+            raise ValueError(record.error)
+        return record
+
+    def walk(self, executor):
+        files = []
+        pending = {executor.submit(scan_directory, directory) for directory in self.directories}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirectories = future.result()
+                files.extend(found)
+                pending.update(executor.submit(scan_directory, directory) for directory in subdirectories)
+        return files
+
+    def scan(self):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=DISK_SCAN_WORKERS) as executor:
+            files = self.walk(executor)
+        changed = [(path, (mtime, size)) for path, mtime, size in files if not self.cached(path, (mtime, size))]
+        with ThreadPoolExecutor(max_workers=DISK_PROBE_WORKERS) as executor:
+            list(executor.map(lambda item: self.probe(*item), changed))
+
+        # Forget disks that disappeared from the scanned trees; lookups from elsewhere are kept
+        seen = {path for path, _, _ in files}
+        roots = tuple(os.path.join(os.path.abspath(directory), "") for directory in self.directories)
+        with self.lock:
+            for path in [path for path in self.records if path.startswith(roots) and path not in seen]:
+                del self.records[path]
+                self.dirty = True
+            records = sorted((self.records[path] for path in seen), key=lambda record: record.path)
+        self.save()
+        elapsed = time.perf_counter() - start
+        return records, f"{len(records)} disks in {elapsed * 1000:.0f} ms, {len(changed)} probed"
+
+
+disk_catalog = None
+
+def get_disk_catalog(qemu_path):
+    global disk_catalog
+    if disk_catalog is None:
+        disk_catalog = DiskCatalog(qemu_path)
+    return disk_catalog
+
+
+def run_benchmark(disks=2000, qemu_path=None):
+    import tempfile
+
+    qemu_path = qemu_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_qemu_img.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i in range(disks):
+            directory = os.path.join(tmp_dir, f"pool{i % 20}")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"disk{i}.raw"), "wb") as file:
+                file.truncate(1 << 30)
+        catalog = DiskCatalog(qemu_path, os.path.join(tmp_dir, "catalog.json"), [tmp_dir])
+        print("cold scan:    ", catalog.scan()[1])
+        print("rescan:       ", catalog.scan()[1])
+        for i in range(0, disks, 100):
+            with open(os.path.join(tmp_dir, f"pool{i % 20}", f"disk{i}.raw"), "r+b") as file:
+                file.truncate(2 << 30)
+        print("1% changed:   ", catalog.scan()[1])
+        reloaded = DiskCatalog(qemu_path, os.path.join(tmp_dir, "catalog.json"), [tmp_dir])
+        print("after reload: ", reloaded.scan()[1])
+
+
+if __name__ == "__main__":
+    run_benchmark()
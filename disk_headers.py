@@ -0,0 +1,360 @@
+import os
+import re
+import uuid
+import struct
+
+# Enough to cover every fixed-offset header below; variable parts are read where they live
+HEADER_READ_SIZE = 4096
+MAX_BACKING_DEPTH = 16
+
+QCOW_MAGIC = b"QFI\xfb"
+QCOW2_EXT_BACKING_FORMAT = 0xE2792ACA
+QCOW2_DIRTY = 1
+QCOW2_SNAPSHOT_ENTRY = struct.Struct(">QIHHIIQII")
+VMDK_MAGIC = b"KDMV"
+VMDK_DESCRIPTOR = b"# Disk DescriptorFile"
+VDI_SIGNATURE = 0xBEDA107F
+VDI_TYPE_DIFF = 4
+VHD_COOKIE = b"conectix"
+VHD_SPARSE_COOKIE = b"cxsparse"
+VHD_TYPE_FIXED = 2
+VHD_MAX_GEOMETRY = 65535 * 16 * 255
+VHDX_SIGNATURE = b"vhdxfile"
+VHDX_REGION_TABLE = 192 * 1024
+VHDX_METADATA_REGION = uuid.UUID("8b7ca206-4790-4b9a-b8fe-575f050f886e")
+VHDX_FILE_PARAMETERS = uuid.UUID("caa16737-fa36-4d43-b3b6-33f0aa44e76b")
+VHDX_VIRTUAL_DISK_SIZE = uuid.UUID("2fa54224-cd1b-4876-b211-5dbed83bf4b8")
+VHDX_PARENT_LOCATOR = uuid.UUID("a8d35f2b-b30b-454d-abf7-d3d84834ab0c")
+VHDX_HAS_PARENT = 2
+
+VMDK_EXTENT = re.compile(r'^(?:RW|RDONLY|NOACCESS)\s+(\d+)\s+\w+\s+"([^"]*)"', re.MULTILINE)
+VMDK_PARENT = re.compile(r'^parentFileNameHint\s*=\s*"([^"]*)"', re.MULTILINE)
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def read_at(fd, size, offset):
+    # os.pread is POSIX only; elsewhere seek and read, which is fine as each fd has one reader
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def pread(fd, size, offset):
+    data = read_at(fd, size, offset)
+    if len(data) < size:
+        raise UnsupportedImage("truncated header")
+    return data
+
+
+def parse_qcow2_snapshots(fd, count, offset):
+    # Each entry is a fixed part, extra data, the id and the name, padded to 8 bytes
+    snapshots = []
+    for _ in range(count):
+        (l1_offset, l1_size, id_size, name_size, date_sec, date_nsec,
+         vm_clock, vm_state_size, extra_size) = QCOW2_SNAPSHOT_ENTRY.unpack(pread(fd, QCOW2_SNAPSHOT_ENTRY.size, offset))
+        extra = pread(fd, extra_size, offset + QCOW2_SNAPSHOT_ENTRY.size)
+        if len(extra) >= 8:
+            # v3 keeps the 64-bit vm state size in the extra data
+            vm_state_size = struct.unpack_from(">Q", extra, 0)[0]
+        names = pread(fd, id_size + name_size, offset + QCOW2_SNAPSHOT_ENTRY.size + extra_size)
+        snapshots.append({"id": names[:id_size].decode(), "name": names[id_size:].decode(),
+                          "vm-state-size": vm_state_size, "date-sec": date_sec, "date-nsec": date_nsec,
+                          "vm-clock-sec": vm_clock // 10**9, "vm-clock-nsec": vm_clock % 10**9,
+                          "l1-table-offset": l1_offset, "l1-size": l1_size})
+        offset += (QCOW2_SNAPSHOT_ENTRY.size + extra_size + id_size + name_size + 7) // 8 * 8
+    return snapshots
+
+
+def parse_qcow(fd, head):
+    version = struct.unpack_from(">I", head, 4)[0]
+    info = {"backing-filename": None}
+    if version == 1:
+        backing_offset, backing_size, _, size, cluster_bits = struct.unpack_from(">QIIQB", head, 8)
+        info.update({"format": "qcow", "virtual-size": size, "cluster-size": 1 << cluster_bits})
+    elif version in (2, 3):
+        backing_offset, backing_size, cluster_bits, size = struct.unpack_from(">QIIQ", head, 8)
+        info.update({"format": "qcow2", "virtual-size": size, "cluster-size": 1 << cluster_bits})
+        extensions_offset = 72
+        if version == 3:
+            incompatible = struct.unpack_from(">Q", head, 72)[0]
+            info["dirty-flag"] = bool(incompatible & QCOW2_DIRTY)
+            extensions_offset = struct.unpack_from(">I", head, 100)[0]
+        # Header extensions run until a zero type, each padded to 8 bytes
+        while extensions_offset + 8 <= len(head):
+            kind, length = struct.unpack_from(">II", head, extensions_offset)
+            if kind == 0:
+                break
+            if kind == QCOW2_EXT_BACKING_FORMAT:
+                info["backing-filename-format"] = head[extensions_offset + 8:extensions_offset + 8 + length].decode()
+            extensions_offset += 8 + (length + 7) // 8 * 8
+        snapshot_count, snapshots_offset = struct.unpack_from(">IQ", head, 60)
+        if snapshot_count:
+            info["snapshots"] = parse_qcow2_snapshots(fd, snapshot_count, snapshots_offset)
+    else:
+        raise UnsupportedImage(f"qcow version {version}")
+    if backing_offset and backing_size:
+        info["backing-filename"] = pread(fd, backing_size, backing_offset).decode()
+    return info
+
+
+def parse_vmdk_descriptor(text):
+    extents = VMDK_EXTENT.findall(text)
+    if not extents:
+        raise UnsupportedImage("VMDK descriptor without extents")
+    parent = VMDK_PARENT.search(text)
+    return {"format": "vmdk", "virtual-size": sum(int(sectors) for sectors, _ in extents) * 512,
+            "backing-filename": parent.group(1) if parent else None}
+
+
+def parse_vmdk(fd, head):
+    (_, _, capacity, grain, descriptor_offset, descriptor_size) = struct.unpack_from("<IIQQQQ", head, 4)
+    unclean = head[72]
+    info = {"format": "vmdk", "virtual-size": capacity * 512, "cluster-size": grain * 512,
+            "dirty-flag": bool(unclean), "backing-filename": None}
+    if descriptor_offset and descriptor_size:
+        # The embedded descriptor of a monolithicSparse file names the parent of a delta disk
+        text = pread(fd, descriptor_size * 512, descriptor_offset * 512).split(b"\0", 1)[0].decode(errors="replace")
+        parent = VMDK_PARENT.search(text)
+        info["backing-filename"] = parent.group(1) if parent else None
+    return info
+
+
+def parse_vdi(fd, head):
+    image_type = struct.unpack_from("<I", head, 0x4C)[0]
+    disk_size, block_size = struct.unpack_from("<QI", head, 0x170)
+    # A VDI differencing image only links its parent by UUID; qemu cannot open those either
+    if image_type == VDI_TYPE_DIFF:
+        raise UnsupportedImage("VDI differencing image")
+    return {"format": "vdi", "virtual-size": disk_size, "cluster-size": block_size, "backing-filename": None}
+
+
+def parse_vhd(fd, file_size):
+    footer = pread(fd, 512, file_size - 512)
+    if footer[:8] != VHD_COOKIE:
+        footer = pread(fd, 512, 0)
+        if footer[:8] != VHD_COOKIE:
+            raise UnsupportedImage("no VHD footer")
+    data_offset = struct.unpack_from(">Q", footer, 16)[0]
+    creator = footer[28:32]
+    current_size = struct.unpack_from(">Q", footer, 48)[0]
+    cylinders, heads, sectors = struct.unpack_from(">HBB", footer, 56)
+    disk_type = struct.unpack_from(">I", footer, 60)[0]
+    # Like qemu: images from Virtual PC and old qemu are sized by their geometry, not current_size
+    geometry_size = cylinders * heads * sectors
+    if creator in (b"vpc ", b"qemu") and geometry_size != VHD_MAX_GEOMETRY:
+        size = geometry_size * 512
+    else:
+        size = current_size
+    info = {"format": "vpc", "virtual-size": size, "backing-filename": None}
+    if disk_type != VHD_TYPE_FIXED:
+        dynamic = pread(fd, 1024, data_offset)
+        if dynamic[:8] != VHD_SPARSE_COOKIE:
+            raise UnsupportedImage("bad VHD dynamic header")
+        info["cluster-size"] = struct.unpack_from(">I", dynamic, 32)[0]
+        parent = dynamic[64:576].decode("utf-16-be", errors="replace").rstrip("\0")
+        info["backing-filename"] = parent or None
+    return info
+
+
+def parse_vhdx(fd):
+    metadata = None
+    for table_offset in (VHDX_REGION_TABLE, VHDX_REGION_TABLE + 64 * 1024):
+        table = pread(fd, 16 + 32 * 2047, table_offset)
+        if table[:4] != b"regi":
+            continue
+        count = struct.unpack_from("<I", table, 8)[0]
+        for i in range(min(count, 2047)):
+            guid, offset, length = struct.unpack_from("<16sQI", table, 16 + 32 * i)
+            if uuid.UUID(bytes_le=guid) == VHDX_METADATA_REGION:
+                metadata = (offset, length)
+        if metadata:
+            break
+    if metadata is None:
+        raise UnsupportedImage("VHDX without metadata region")
+
+    region_offset, region_length = metadata
+    region = pread(fd, min(region_length, 1024 * 1024), region_offset)
+    if region[:8] != b"metadata":
+        raise UnsupportedImage("bad VHDX metadata table")
+    items = {}
+    for i in range(struct.unpack_from("<H", region, 10)[0]):
+        guid, offset, length = struct.unpack_from("<16sII", region, 32 + 32 * i)
+        items[uuid.UUID(bytes_le=guid)] = region[offset:offset + length]
+
+    block_size, flags = struct.unpack_from("<II", items[VHDX_FILE_PARAMETERS])
+    info = {"format": "vhdx", "virtual-size": struct.unpack_from("<Q", items[VHDX_VIRTUAL_DISK_SIZE])[0],
+            "cluster-size": block_size, "backing-filename": None}
+    locator = items.get(VHDX_PARENT_LOCATOR)
+    if flags & VHDX_HAS_PARENT and locator:
+        entries = {}
+        for i in range(struct.unpack_from("<H", locator, 18)[0]):
+            key_offset, value_offset, key_length, value_length = struct.unpack_from("<IIHH", locator, 20 + 12 * i)
+            key = locator[key_offset:key_offset + key_length].decode("utf-16-le")
+            entries[key] = locator[value_offset:value_offset + value_length].decode("utf-16-le")
+        info["backing-filename"] = entries.get("relative_path") or entries.get("absolute_win32_path")
+    return info
+
+
+def read_disk_header(path):
+    # Same keys as one document of `qemu-img info --output=json`
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        stat = os.fstat(fd)
+        head = read_at(fd, HEADER_READ_SIZE, 0)
+        try:
+            if head[:4] == QCOW_MAGIC:
+                info = parse_qcow(fd, head)
+            elif head[:4] == VMDK_MAGIC:
+                info = parse_vmdk(fd, head)
+            elif head.startswith(VMDK_DESCRIPTOR):
+                info = parse_vmdk_descriptor(head.decode(errors="replace"))
+            elif len(head) >= 0x180 and struct.unpack_from("<I", head, 0x40)[0] == VDI_SIGNATURE:
+                info = parse_vdi(fd, head)
+            elif head[:8] == VHDX_SIGNATURE:
+                info = parse_vhdx(fd)
+            elif stat.st_size >= 512 and (head[:8] == VHD_COOKIE or read_at(fd, 8, stat.st_size - 512) == VHD_COOKIE):
+                info = parse_vhd(fd, stat.st_size)
+            elif path.lower().endswith((".raw", ".img")):
+                info = {"format": "raw", "virtual-size": stat.st_size, "backing-filename": None}
+            else:
+                raise UnsupportedImage("unrecognised image format")
+        except (struct.error, KeyError, UnicodeDecodeError) as e:
+            raise UnsupportedImage(f"malformed header: {e}")
+    finally:
+        os.close(fd)
+
+    info["filename"] = path
+    info["actual-size"] = stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+    if info.get("backing-filename"):
+        backing = info["backing-filename"]
+        info["full-backing-filename"] = backing if os.path.isabs(backing) else os.path.join(os.path.dirname(path), backing)
+    else:
+        info.pop("backing-filename", None)
+    return info
+
+
+def read_disk_chain(path):
+    # The image followed by each of its backing files, like `qemu-img info --backing-chain`
+    documents = [read_disk_header(path)]
+    while documents[-1].get("full-backing-filename"):
+        if len(documents) > MAX_BACKING_DEPTH:
+            raise UnsupportedImage("backing chain too deep")
+        backing = documents[-1]["full-backing-filename"]
+        if not os.path.exists(backing):
+            # Keep what was read; the record still names the missing backing file
+            break
+        documents.append(read_disk_header(backing))
+    return documents
+
+
+def write_fixtures(directory):
+    # Minimal hand-built images, one per format, with just the header fields the parsers read
+    size = 10 * 1024**3
+    fixtures = {}
+
+    def write(name, chunks, length=None):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as file:
+            for offset, data in chunks:
+                file.seek(offset)
+                file.write(data)
+            if length:
+                file.truncate(length)
+        fixtures[name] = path
+        return path
+
+    backing_format = b"qcow2"
+    extension = struct.pack(">II", QCOW2_EXT_BACKING_FORMAT, len(backing_format)) + backing_format.ljust(8, b"\0")
+    write("base.qcow2", [(0, QCOW_MAGIC + struct.pack(">IQIIQ", 3, 0, 0, 16, size) + bytes(60)
+                          + struct.pack(">I", 104))], 256 * 1024)
+    write("overlay.qcow2", [(0, QCOW_MAGIC + struct.pack(">IQIIQ", 3, 512, 10, 16, size) + bytes(40)
+                             + struct.pack(">Q", QCOW2_DIRTY) + bytes(20) + struct.pack(">I", 104)),
+                            (104, extension + bytes(8)), (512, b"base.qcow2")], 256 * 1024)
+    write("legacy.qcow", [(0, QCOW_MAGIC + struct.pack(">IQIIQB", 1, 0, 0, 0, size, 12))], 64 * 1024)
+
+    descriptor = (f'# Disk DescriptorFile\nversion=1\nCID=fffffffe\nparentCID=ffffffff\n'
+                  f'createType="monolithicSparse"\n\n# Extent description\nRW {size // 512} SPARSE "disk.vmdk"\n').encode()
+    write("disk.vmdk", [(0, VMDK_MAGIC + struct.pack("<IIQQQQIQQQB", 1, 3, size // 512, 128, 1, 20, 512, 0, 21, 128, 0)
+                         + b"\n \r\n"), (512, descriptor)], 64 * 1024)
+    write("flat.vmdk", [(0, descriptor.replace(b"monolithicSparse", b"monolithicFlat").replace(b"SPARSE", b"FLAT"))])
+
+    vdi = bytearray(0x200)
+    vdi[:40] = b"<<< Oracle VM VirtualBox Disk Image >>>\n"
+    struct.pack_into("<IIII", vdi, 0x40, VDI_SIGNATURE, 0x00010001, 0x190, 1)
+    struct.pack_into("<QI", vdi, 0x170, size, 1024 * 1024)
+    write("disk.vdi", [(0, bytes(vdi))], 64 * 1024)
+
+    footer = bytearray(512)
+    footer[:8] = VHD_COOKIE
+    struct.pack_into(">IIQI4s", footer, 8, 2, 0x00010000, 512, 0, b"win ")
+    struct.pack_into(">QQHBBI", footer, 40, size, size, 20805, 16, 63, 3)
+    dynamic = bytearray(1024)
+    dynamic[:8] = VHD_SPARSE_COOKIE
+    struct.pack_into(">QQIII", dynamic, 8, 0xFFFFFFFFFFFFFFFF, 1536, 0x00010000, size // (2 * 1024**2), 2 * 1024**2)
+    write("disk.vhd", [(0, bytes(footer)), (512, bytes(dynamic)), (64 * 1024, bytes(footer))])
+
+    metadata = bytearray(64 * 1024 + 64)
+    metadata[:8] = b"metadata"
+    struct.pack_into("<H", metadata, 10, 2)
+    struct.pack_into("<16sII", metadata, 32, VHDX_FILE_PARAMETERS.bytes_le, 64 * 1024, 8)
+    struct.pack_into("<16sII", metadata, 64, VHDX_VIRTUAL_DISK_SIZE.bytes_le, 64 * 1024 + 8, 8)
+    struct.pack_into("<IIQ", metadata, 64 * 1024, 32 * 1024**2, 0, size)
+    region = b"regi" + struct.pack("<III", 0, 1, 0) + struct.pack("<16sQII", VHDX_METADATA_REGION.bytes_le, 1024**2, 1024**2, 1)
+    write("disk.vhdx", [(0, VHDX_SIGNATURE), (VHDX_REGION_TABLE, region), (1024**2, bytes(metadata))], 2 * 1024**2)
+
+    write("disk.raw", [], size)
+    return fixtures
+
+
+def run_benchmark(copies=200):
+    import time
+    import shutil
+    import tempfile
+    import subprocess
+    import json
+
+    qemu_path = os.environ.get("QEMU_IMG") or shutil.which("qemu-img")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures = write_fixtures(tmp_dir)
+        for name, path in fixtures.items():
+            info = read_disk_chain(path)[0]
+            print(f"{name:<14} {info['format']:<6} virtual {info['virtual-size']:>12}  "
+                  f"cluster {info.get('cluster-size', '-')!s:>9}  backing {info.get('backing-filename')}  "
+                  f"dirty {info.get('dirty-flag', False)}")
+
+        paths = [path for path in fixtures.values() for _ in range(copies)]
+        start = time.perf_counter()
+        for path in paths:
+            read_disk_chain(path)
+        native = time.perf_counter() - start
+        print(f"native headers: {len(paths)} probes in {native * 1000:8.1f} ms ({native / len(paths) * 1e6:.0f} us each)")
+
+        if not qemu_path:
+            print("qemu-img not found (set QEMU_IMG) - skipping the comparison")
+            return
+        # Hand-built fixtures are not complete enough for qemu to open, so time it on a real image
+        sample = os.path.join(tmp_dir, "sample.qcow2")
+        subprocess.run([qemu_path, "create", "-f", "qcow2", sample, "1G"], check=True, stdout=subprocess.DEVNULL)
+        start = time.perf_counter()
+        count = min(len(paths), 100)
+        for _ in range(count):
+            document = json.loads(subprocess.run([qemu_path, "info", "--output=json", sample],
+                                                 check=True, stdout=subprocess.PIPE).stdout)
+        spawned = time.perf_counter() - start
+        print(f"qemu-img info:  {count} probes in {spawned * 1000:8.1f} ms ({spawned / count * 1e6:.0f} us each)")
+        try:
+            native_document = read_disk_header(sample)
+        except UnsupportedImage as e:
+            # The fake_qemu_img.py stand-in writes plain files, not real qcow2 images
+            print(f"cannot compare against {qemu_path}: {e}")
+            return
+        agrees = all(native_document.get(key) == document.get(key) for key in ("format", "virtual-size", "cluster-size"))
+        print(f"native and qemu-img agree on format, virtual size and cluster size: {agrees}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,436 @@
+import os
+import re
+import csv
+import time
+import itertools
+import threading
+import subprocess
+from dataclasses import dataclass, field
+
+from docker_engine import CancelToken, OperationCancelled, format_size, terminate_process
+from disk_catalog import get_disk_catalog
+from raw_disk import allocation_report, create_raw, native_raw_supported
+
+DISK_JOBS_PER_DEVICE = int(os.environ.get("CLOUD_DISK_JOBS_PER_DEVICE", "2"))
+DISK_JOB_POLL_INTERVAL = 0.25
+DISK_FORMATS = ['vmdk', 'vdi', 'vhd', 'vhdx', 'qcow', 'qcow2', 'raw', 'img']
+# -o options per qemu format and mode. Formats without a preallocation option get their
+# fixed-size subformat as "full", which is what "Fixed" meant in the old allocation choice
+PREALLOCATION_OPTIONS = {
+    'raw': {'off': [], 'falloc': ['preallocation=falloc'], 'full': ['preallocation=full']},
+    'qcow2': {'off': [], 'metadata': ['preallocation=metadata'], 'falloc': ['preallocation=falloc'],
+              'full': ['preallocation=full']},
+    'qcow': {'off': []},
+    'vdi': {'off': [], 'metadata': ['preallocation=metadata']},
+    'vpc': {'off': [], 'full': ['subformat=fixed']},
+    'vhdx': {'off': [], 'full': ['subformat=fixed']},
+    'vmdk': {'off': [], 'full': ['subformat=monolithicFlat']},
+}
+CONVERT_COMPRESSED_FORMATS = ('qcow', 'qcow2')
+CONVERT_COMPRESSION = ['none', 'zlib', 'zstd']
+DISK_SIZE_UNITS = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "Queued", "Running", "Done", "Failed", "Cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# qemu-img -p redraws "    (12.34/100%)" with carriage returns
+QEMU_PROGRESS = re.compile(r"\((\d+(?:\.\d+)?)/100%\)")
+
+
+def parse_disk_size(size_str):
+    size_str = size_str.strip().upper().rstrip("B")
+    if not size_str:
+        return 0
+    if size_str[-1] in DISK_SIZE_UNITS:
+        return int(float(size_str[:-1]) * DISK_SIZE_UNITS[size_str[-1]])
+    return int(float(size_str))
+
+
+def allocated_bytes(path):
+    # What has actually been written so far; a sparse file reports far less than its length
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+
+def storage_device(path):
+    # Jobs on the same filesystem compete for the same disk, so that is the concurrency unit
+    directory = os.path.dirname(os.path.abspath(path))
+    while directory and not os.path.exists(directory):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    try:
+        device = os.stat(directory).st_dev
+    except OSError:
+        return "?"
+    if hasattr(os, "major"):
+        return f"{os.major(device)}:{os.minor(device)}"
+    return str(device)
+
+
+def format_elapsed(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def qemu_format(disk_type):
+    # The UI uses file extensions; qemu-img calls VHD "vpc" and plain images "raw"
+    return {'img': 'raw', 'vhd': 'vpc'}.get(disk_type.lower(), disk_type.lower())
+
+
+def preallocation_modes(disk_type):
+    return list(PREALLOCATION_OPTIONS.get(qemu_format(disk_type), {'off': []}))
+
+
+def preallocation_mode(disk_type, allocation):
+    # Accepts a mode name or the old Dynamic/Fixed choice (Fixed = the most allocated mode available)
+    modes = preallocation_modes(disk_type)
+    allocation = allocation.strip().lower()
+    if allocation in ('', 'dynamic'):
+        return 'off'
+    if allocation == 'fixed':
+        return modes[-1]
+    if allocation not in modes:
+        raise ValueError(f"{disk_type} supports preallocation {', '.join(modes)}, not '{allocation}'")
+    return allocation
+
+
+def create_command(qemu_path, path, disk_size, disk_type, preallocation):
+    disk_type = qemu_format(disk_type)
+    command = [qemu_path, 'create', '-f', disk_type]
+    options = PREALLOCATION_OPTIONS.get(disk_type, {}).get(preallocation, [])
+    if options:
+        command += ['-o', ','.join(options)]
+    return command + [path, disk_size]
+
+
+def native_create(disk_type, preallocation):
+    # Raw images need no qemu-img at all; creating them in-process also gives exact progress
+    if qemu_format(disk_type) == 'raw' and native_raw_supported(preallocation):
+        return create_raw_job
+    return None
+
+
+def check_create(job):
+    # Only a create the user confirmed in the save dialog may replace an existing file
+    if not job.overwrite and os.path.exists(job.path):
+        return f"{job.path} already exists."
+    return None
+
+
+def create_raw_job(job, on_progress):
+    create_raw(job.path, job.target_bytes, job.preallocation, job.cancel, on_progress, job.overwrite)
+    virtual, allocated, data = allocation_report(job.path)
+    report = f"Done, {format_size(allocated)} allocated of {format_size(virtual)}"
+    return report if data is None else f"{report}, {format_size(data)} written"
+
+
+def convert_command(qemu_path, source, target, target_format, coroutines=8, out_of_order=True,
+                    compression=None, sparse=True):
+    target_format = qemu_format(target_format)
+    command = [qemu_path, 'convert', '-p', '-O', target_format, '-m', str(coroutines)]
+    compress = bool(compression) and target_format in CONVERT_COMPRESSED_FORMATS
+    # qemu-img refuses -W together with -c: compressed clusters have to be written in order
+    if out_of_order and not compress:
+        command.append('-W')
+    if compress:
+        command.append('-c')
+        if target_format == 'qcow2':
+            command += ['-o', f'compression_type={compression}']
+    # -S 0 writes every zero block out; 4k is qemu-img's default sparse detection granularity
+    command += ['-S', '4k' if sparse else '0', source, target]
+    return command
+
+
+def convert_compression_error(target_format, compression):
+    target_format = qemu_format(target_format)
+    if compression in (None, 'none'):
+        return None
+    if target_format not in CONVERT_COMPRESSED_FORMATS:
+        return "Compression is only available for qcow and qcow2 targets."
+    # Only qcow2 has a compression_type option; qcow (v1) clusters are always zlib
+    if target_format == 'qcow' and compression != 'zlib':
+        return f"qcow targets only support zlib compression, not {compression}."
+    return None
+
+
+def check_convert(job):
+    if os.path.exists(job.path):
+        return f"{job.path} already exists."
+    job.target_bytes = virtual_size(job.qemu_path, job.source)
+    return None
+
+
+def overlay_command(qemu_path, base, overlay, base_format):
+    # A relative backing path keeps a base and its clones valid when the folder is moved
+    backing = os.path.relpath(os.path.abspath(base), os.path.dirname(os.path.abspath(overlay)))
+    return [qemu_path, 'create', '-f', 'qcow2', '-F', qemu_format(base_format), '-b', backing, overlay]
+
+
+def check_overlay(job):
+    if os.path.exists(job.path):
+        return f"{job.path} already exists."
+    return None
+
+
+def flatten_command(qemu_path, overlay):
+    # Rebasing onto nothing copies every block the overlay still reads from its base into it
+    return [qemu_path, 'rebase', '-p', '-f', 'qcow2', '-b', '', overlay]
+
+
+def commit_command(qemu_path, overlay):
+    return [qemu_path, 'commit', '-p', '-f', 'qcow2', overlay]
+
+
+def resize_command(qemu_path, path, new_size):
+    return [qemu_path, 'resize', path, new_size]
+
+
+def virtual_size(qemu_path, path):
+    # Served from the disk catalog unless the file changed since it was last probed
+    return get_disk_catalog(qemu_path).info(path).virtual_size
+
+
+def check_resize(job):
+    if job.target_bytes < virtual_size(job.qemu_path, job.path):
+        return "Shrinking disks is not supported by QEMU. Only expansion is allowed."
+    return None
+
+
+def read_batch_csv(csv_path):
+    # path,size[,format][,allocation] with a header row; format defaults to the file extension and
+    # allocation takes a preallocation mode or the older Dynamic/Fixed
+    specs = []
+    with open(csv_path, newline="") as file:
+        for line_number, row in enumerate(csv.DictReader(file), start=2):
+            row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            if not row.get("path") or not row.get("size"):
+                raise ValueError(f"line {line_number}: path and size are required")
+            disk_type = row.get("format") or os.path.splitext(row["path"])[1].lstrip(".").lower()
+            if disk_type not in DISK_FORMATS:
+                raise ValueError(f"line {line_number}: unknown disk format '{disk_type}'")
+            try:
+                preallocation = preallocation_mode(disk_type, row.get("allocation") or row.get("preallocation") or "")
+            except ValueError as e:
+                raise ValueError(f"line {line_number}: {e}")
+            specs.append((row["path"], row["size"], disk_type, preallocation))
+    return specs
+
+
+@dataclass(slots=True)
+class DiskJob:
+    operation: str
+    path: str
+    command: list
+    qemu_path: str = ""
+    source: str = ""
+    target_bytes: int = 0
+    prepare: object = None
+    native: object = None
+    finish: object = None
+    preallocation: str = ""
+    overwrite: bool = False
+    cleanup_on_cancel: bool = False
+    id: int = 0
+    device: str = ""
+    state: str = QUEUED
+    progress: float = 0.0
+    reported_progress: bool = False
+    bytes_done: int = 0
+    baseline_bytes: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+    message: str = ""
+    output: list = field(default_factory=list)
+    cancel: CancelToken = field(default_factory=CancelToken)
+
+    def elapsed(self):
+        if not self.started:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def throughput(self):
+        elapsed = self.elapsed()
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    def row(self):
+        progress = f"{self.progress:.0f}%" if self.started else ""
+        speed = f"{format_size(self.throughput())}/s" if self.bytes_done else ""
+        return [str(self.id), self.operation, self.path, self.device, self.message or self.state,
+                progress, format_elapsed(self.elapsed()) if self.started else "", speed]
+
+
+class DiskJobScheduler:
+    COLUMNS = ["Job", "Operation", "Disk", "Device", "State", "Progress", "Elapsed", "Throughput"]
+
+    def __init__(self, per_device=DISK_JOBS_PER_DEVICE, listener=None):
+        self.per_device = per_device
+        self.listener = listener
+        self.jobs = {}
+        self.pending = {}
+        self.running = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def notify(self, job):
+        if self.listener is not None:
+            self.listener(job)
+
+    def set_per_device(self, per_device):
+        with self.lock:
+            self.per_device = per_device
+            devices = list(self.pending)
+        for device in devices:
+            self.start_ready(device)
+
+    def submit(self, job):
+        with self.lock:
+            job.id = next(self.ids)
+            job.device = storage_device(job.path)
+            self.jobs[job.id] = job
+            self.pending.setdefault(job.device, []).append(job)
+        self.notify(job)
+        self.start_ready(job.device)
+        return job
+
+    def start_ready(self, device):
+        started = []
+        with self.lock:
+            queue = self.pending.get(device, [])
+            while queue and self.running.get(device, 0) < self.per_device:
+                job = queue.pop(0)
+                self.running[device] = self.running.get(device, 0) + 1
+                started.append(job)
+        for job in started:
+            threading.Thread(target=self.run, args=(job,), daemon=True).start()
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return
+        with self.lock:
+            queue = self.pending.get(job.device, [])
+            if job in queue:
+                # Never started: nothing to stop or clean up
+                queue.remove(job)
+                job.state = CANCELLED
+        if job.state == CANCELLED:
+            self.notify(job)
+            return
+        job.cancel.cancel()
+
+    def run(self, job):
+        try:
+            job.state = RUNNING
+            job.started = time.monotonic()
+            job.baseline_bytes = allocated_bytes(job.path)
+            self.notify(job)
+            error = job.prepare(job) if job.prepare else None
+            if error:
+                job.state, job.message = FAILED, error
+            else:
+                self.execute(job)
+                if job.state == DONE and job.finish:
+                    # Follow-up work that only makes sense once qemu-img succeeded, e.g. removing a merged file
+                    job.finish(job)
+            if job.state == CANCELLED and job.cleanup_on_cancel and os.path.exists(job.path):
+                # A half-written new disk is worse than none
+                os.remove(job.path)
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            job.state, job.message = FAILED, str(e)
+        except Exception as e:
+            # A bug in a check or parser must not leave the job "Running" and its device slot taken for good
+            job.state, job.message = FAILED, f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.monotonic()
+            with self.lock:
+                self.running[job.device] -= 1
+            self.notify(job)
+            self.start_ready(job.device)
+
+    def execute(self, job):
+        if job.native is not None:
+            self.execute_native(job)
+            return
+        process = subprocess.Popen(job.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        job.cancel.on_cancel(lambda: terminate_process(process))
+        reader = threading.Thread(target=self.read_output, args=(job, process.stdout), daemon=True)
+        reader.start()
+        while process.poll() is None:
+            self.sample(job)
+            self.notify(job)
+            time.sleep(DISK_JOB_POLL_INTERVAL)
+        reader.join()
+        self.sample(job)
+        if job.cancel.cancelled:
+            job.state = CANCELLED
+        elif process.returncode != 0:
+            job.state = FAILED
+            job.message = job.output[-1] if job.output else f"qemu-img exited with {process.returncode}"
+        else:
+            job.state = DONE
+            job.progress = 100.0
+            if job.reported_progress and job.target_bytes:
+                job.bytes_done = job.target_bytes
+            if job.bytes_done:
+                job.message = f"Done, {format_size(job.throughput())}/s"
+
+    def execute_native(self, job):
+        last_notify = 0.0
+
+        def on_progress(done):
+            nonlocal last_notify
+            job.bytes_done = done
+            if job.target_bytes:
+                job.progress = min(99.0, 100.0 * done / job.target_bytes)
+            if time.monotonic() - last_notify >= DISK_JOB_POLL_INTERVAL:
+                last_notify = time.monotonic()
+                self.notify(job)
+
+        try:
+            report = job.native(job, on_progress)
+        except OperationCancelled:
+            job.state = CANCELLED
+            return
+        job.state = DONE
+        job.progress = 100.0
+        job.message = report or ""
+
+    def sample(self, job):
+        if job.reported_progress and job.target_bytes:
+            # qemu-img -p counts through the source's virtual size, so the rate is in guest-visible bytes
+            job.bytes_done = int(job.target_bytes * job.progress / 100)
+            return
+        job.bytes_done = max(0, allocated_bytes(job.path) - job.baseline_bytes)
+        if not job.reported_progress and job.target_bytes:
+            # No progress from qemu-img itself: estimate it from what has landed on disk
+            job.progress = min(99.0, 100.0 * job.bytes_done / job.target_bytes)
+
+    def read_output(self, job, stream):
+        buffer = b""
+        while True:
+            chunk = stream.read1(4096) if hasattr(stream, "read1") else stream.read(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(rb"[\r\n]", buffer)
+            for line in lines:
+                self.handle_output(job, line.decode(errors="replace").strip())
+        self.handle_output(job, buffer.decode(errors="replace").strip())
+
+    def handle_output(self, job, line):
+        if not line:
+            return
+        match = QEMU_PROGRESS.search(line)
+        if match:
+            job.reported_progress = True
+            job.progress = float(match.group(1))
+        else:
+            job.output.append(line)
@@ -0,0 +1,303 @@
+import os
+import time
+import struct
+import subprocess
+from dataclasses import dataclass
+
+from docker_engine import format_size
+from disk_catalog import probe_disk
+from disk_headers import QCOW_MAGIC, UnsupportedImage, pread, read_at, read_disk_chain
+from disk_jobs import overlay_command
+
+EXTERNAL_SNAPSHOT_SEPARATOR = "@"
+INTERNAL, EXTERNAL, ACTIVE = "internal", "external", "current"
+QCOW2_EXTENDED_L2 = 16
+QCOW2_OFFSET_MASK = 0x00FFFFFFFFFFFE00
+QCOW2_COMPRESSED = 1 << 62
+SNAPSHOT_COLUMNS = ["Snapshot", "Type", "ID", "Created", "VM State", "Space Used", "File"]
+
+
+@dataclass(slots=True)
+class Snapshot:
+    kind: str
+    name: str
+    path: str
+    id: str = ""
+    date: float = 0.0
+    vm_state_size: int = 0
+    used_bytes: object = None
+
+    def row(self):
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.date)) if self.date else ""
+        return [self.name, self.kind, self.id, created, format_size(self.vm_state_size) if self.vm_state_size else "",
+                format_size(self.used_bytes) if self.used_bytes is not None else "", self.path]
+
+
+def disk_in_use_error(in_use, path):
+    # in_use(path) names the running VMs with the disk open; rewriting it under them corrupts the guest
+    users = in_use(path) if in_use is not None else []
+    if users:
+        return f"{path} is open in running VM {', '.join(users)}. Shut it down first."
+    return None
+
+
+def snapshot_command(qemu_path, path, action, name):
+    # action is -c (create), -a (apply) or -d (delete)
+    return [qemu_path, 'snapshot', action, name, path]
+
+
+def external_snapshot_path(path, name):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}{EXTERNAL_SNAPSHOT_SEPARATOR}{name}{ext}"
+
+
+def snapshot_name_error(name):
+    if not name or name != name.strip():
+        return "Snapshot name is required and cannot start or end with spaces."
+    if any(char in name for char in '/\\:*?"<>|' + EXTERNAL_SNAPSHOT_SEPARATOR):
+        return "Snapshot name cannot contain path characters or @."
+    return None
+
+
+def l2_clusters(fd, l2_offset, cluster_bits, entry_size):
+    # Host clusters one L2 table points at; compressed entries pack the offset into fewer bits
+    table = read_at(fd, 1 << cluster_bits, l2_offset)
+    compressed_mask = (1 << (62 - (cluster_bits - 8))) - 1
+    # Extended L2 entries are 16 bytes; the first 8 hold the same offset word as a standard entry
+    entries = struct.unpack(f">{len(table) // 8}Q", table[:len(table) // 8 * 8])[::entry_size // 8]
+    return {((entry & compressed_mask) if entry & QCOW2_COMPRESSED else (entry & QCOW2_OFFSET_MASK)) >> cluster_bits
+            for entry in entries if entry & QCOW2_OFFSET_MASK}
+
+
+def referenced_clusters(fd, l1_offset, l1_size, cluster_bits, entry_size, l2_cache):
+    # Every host cluster one L1 table keeps alive: the table itself, its L2 tables and their data
+    if not l1_size:
+        return set()
+    clusters = set(range(l1_offset >> cluster_bits, ((l1_offset + l1_size * 8 - 1) >> cluster_bits) + 1))
+    for (entry,) in struct.iter_unpack(">Q", pread(fd, l1_size * 8, l1_offset)):
+        l2_offset = entry & QCOW2_OFFSET_MASK
+        if not l2_offset:
+            continue
+        if l2_offset not in l2_cache:
+            # Snapshots share most L2 tables with the active image, so each is read once
+            l2_cache[l2_offset] = l2_clusters(fd, l2_offset, cluster_bits, entry_size)
+        clusters.add(l2_offset >> cluster_bits)
+        clusters.update(l2_cache[l2_offset])
+    return clusters
+
+
+def snapshot_usage(path, snapshots):
+    # Bytes only each snapshot references, i.e. what deleting it would give back to the host
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        head = pread(fd, 72, 0)
+        if head[:4] != QCOW_MAGIC or struct.unpack_from(">I", head, 4)[0] not in (2, 3):
+            raise UnsupportedImage("not a qcow2 image")
+        cluster_bits, _, _, l1_size, l1_offset = struct.unpack_from(">IQIIQ", head, 20)
+        incompatible = struct.unpack_from(">Q", pread(fd, 8, 72), 0)[0] if struct.unpack_from(">I", head, 4)[0] == 3 else 0
+        entry_size = 16 if incompatible & QCOW2_EXTENDED_L2 else 8
+        l2_cache = {}
+        # Set algebra instead of per-cluster counting: once holds clusters a single table references
+        once = referenced_clusters(fd, l1_offset, l1_size, cluster_bits, entry_size, l2_cache)
+        shared = set()
+        per_snapshot = []
+        for snapshot in snapshots:
+            clusters = referenced_clusters(fd, snapshot["l1-table-offset"], snapshot["l1-size"],
+                                           cluster_bits, entry_size, l2_cache)
+            shared |= once & clusters
+            once = (once | clusters) - shared
+            per_snapshot.append(clusters)
+    finally:
+        os.close(fd)
+    return [len(clusters & once) << cluster_bits for clusters in per_snapshot]
+
+
+def internal_snapshots(qemu_path, path, documents):
+    top = documents[0]
+    snapshots = top.get("snapshots", [])
+    if not snapshots:
+        return []
+    used = [None] * len(snapshots)
+    if snapshots[0].get("l1-table-offset") is not None:
+        try:
+            used = snapshot_usage(path, snapshots)
+        except (OSError, UnsupportedImage, struct.error):
+            pass
+    return [Snapshot(INTERNAL, snapshot["name"], path, snapshot["id"],
+                     snapshot.get("date-sec", 0) + snapshot.get("date-nsec", 0) / 1e9,
+                     int(snapshot.get("vm-state-size", 0)), used[i])
+            for i, snapshot in enumerate(snapshots)]
+
+
+def external_snapshots(documents):
+    # Frozen files named <disk>@<name> directly under the disk; whatever is further down is a base, not ours
+    prefix = os.path.splitext(os.path.basename(documents[0]["filename"]))[0] + EXTERNAL_SNAPSHOT_SEPARATOR
+    snapshots = []
+    for document in documents[1:]:
+        filename = os.path.abspath(document["filename"])
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        if not stem.startswith(prefix):
+            break
+        snapshots.append(Snapshot(EXTERNAL, stem[len(prefix):], filename, date=os.path.getmtime(filename),
+                                  used_bytes=int(document.get("actual-size", 0))))
+    return snapshots
+
+
+def list_snapshots(qemu_path, path):
+    path = os.path.abspath(path)
+    try:
+        documents = read_disk_chain(path)
+    except UnsupportedImage:
+        documents = probe_disk(qemu_path, path)
+    if documents[0].get("format") != "qcow2":
+        raise ValueError(f"{path} is not a qcow2 disk.")
+    snapshots = internal_snapshots(qemu_path, path, documents) + external_snapshots(documents)
+    held = sum(snapshot.used_bytes or 0 for snapshot in snapshots)
+    written = int(documents[0].get("actual-size", 0))
+    snapshots.append(Snapshot(ACTIVE, "(current)", path, used_bytes=written))
+    return snapshots, f"{len(snapshots) - 1} snapshots holding {format_size(held)}, current image {format_size(written)}"
+
+
+def external_chain(path):
+    # Newest first, as the backing chain is walked from the disk downwards
+    return [snapshot.path for snapshot in external_snapshots(read_disk_chain(os.path.abspath(path)))]
+
+
+def create_external_snapshot(qemu_path, path, name):
+    # Offline external snapshot: the disk is frozen under a new name and a fresh overlay takes its place,
+    # so VM configs keep pointing at the same path
+    frozen = external_snapshot_path(path, name)
+
+    def run(job, on_progress):
+        if os.path.exists(frozen):
+            raise ValueError(f"{frozen} already exists.")
+        os.replace(path, frozen)
+        try:
+            subprocess.run(overlay_command(qemu_path, frozen, path, 'qcow2'), check=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            if os.path.exists(path):
+                os.remove(path)
+            os.replace(frozen, path)
+            raise
+        return f"Frozen as {os.path.basename(frozen)}"
+    return run
+
+
+def revert_external_snapshot(qemu_path, path, frozen):
+    # Everything written after the snapshot is thrown away: the overlay and any newer frozen files
+    def run(job, on_progress):
+        chain = external_chain(path)
+        if frozen not in chain:
+            raise ValueError(f"{frozen} is not an external snapshot of {path}.")
+        newer = chain[:chain.index(frozen)]
+        # The new overlay takes the disk's place only once it exists, and the newer files go last,
+        # so a failed qemu-img leaves the disk and every snapshot as they were
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            subprocess.run(overlay_command(qemu_path, frozen, tmp_path, 'qcow2'), check=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            os.replace(tmp_path, path)
+        except (OSError, subprocess.CalledProcessError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        for snapshot_path in newer:
+            os.remove(snapshot_path)
+        return f"Reverted, {len(newer)} newer snapshots removed" if newer else "Reverted"
+    return run
+
+
+def delete_external_command(qemu_path, path, frozen):
+    # The file directly above the snapshot absorbs its data, then points at whatever the snapshot was based on
+    chain = external_chain(path)
+    if frozen not in chain:
+        raise ValueError(f"{frozen} is not an external snapshot of {path}.")
+    index = chain.index(frozen)
+    child = chain[index - 1] if index else path
+    documents = read_disk_chain(frozen)
+    parent = documents[0].get("full-backing-filename")
+    if parent:
+        backing = os.path.relpath(os.path.abspath(parent), os.path.dirname(child))
+        command = [qemu_path, 'rebase', '-p', '-f', 'qcow2', '-F', documents[0].get("backing-filename-format", "qcow2"),
+                   '-b', backing, child]
+    else:
+        command = [qemu_path, 'rebase', '-p', '-f', 'qcow2', '-b', '', child]
+    return child, command
+
+
+def remove_frozen(frozen):
+    def finish(job):
+        os.remove(frozen)
+        job.message = f"{job.message}, {os.path.basename(frozen)} removed" if job.message else f"{os.path.basename(frozen)} removed"
+    return finish
+
+
+def write_snapshot_fixture(path, virtual_size, snapshots, cluster_bits=16, rewrite=0.1):
+    # A qcow2 with no data but real L1/L2 tables: each snapshot shares the previous one's clusters
+    # except for a fraction that were rewritten after it was taken
+    import random
+
+    cluster_size = 1 << cluster_bits
+    l2_entries = cluster_size // 8
+    l1_size = -(-virtual_size // (cluster_size * l2_entries))
+    data_clusters = virtual_size // cluster_size
+    next_cluster = [4]
+
+    def allocate(count=1):
+        start = next_cluster[0]
+        next_cluster[0] += count
+        return start
+
+    l1_cluster_count = -(-l1_size * 8 // cluster_size)
+    mapping = [allocate() for _ in range(data_clusters)]
+    tables = []
+    with open(path, "wb") as file:
+        for generation in range(snapshots + 1):
+            if generation:
+                for index in random.sample(range(data_clusters), int(data_clusters * rewrite)):
+                    mapping[index] = allocate()
+            l1_offset = allocate(l1_cluster_count) * cluster_size
+            l1 = []
+            for table in range(l1_size):
+                entries = mapping[table * l2_entries:(table + 1) * l2_entries]
+                l2_offset = allocate() * cluster_size
+                file.seek(l2_offset)
+                file.write(struct.pack(f">{len(entries)}Q", *((cluster * cluster_size) | (1 << 63) for cluster in entries)))
+                l1.append(l2_offset | (1 << 63))
+            file.seek(l1_offset)
+            file.write(struct.pack(f">{len(l1)}Q", *l1))
+            tables.append(l1_offset)
+
+        table_offset = allocate() * cluster_size
+        entries = b""
+        for index, l1_offset in enumerate(tables[:-1], 1):
+            ident, name = str(index).encode(), f"snap{index}".encode()
+            entry = struct.pack(">QIHHIIQII", l1_offset, l1_size, len(ident), len(name), int(time.time()), 0, 0, 0, 0)
+            entry += ident + name
+            entries += entry + bytes(-len(entry) % 8)
+        file.seek(table_offset)
+        file.write(entries)
+        header = QCOW_MAGIC + struct.pack(">IQIIQIIQQIIQ", 2, 0, 0, cluster_bits, virtual_size, 0, l1_size, tables[-1],
+                                          0, 0, snapshots, table_offset)
+        file.seek(0)
+        file.write(header)
+        file.truncate(next_cluster[0] * cluster_size)
+
+
+def run_benchmark(virtual_size=64 * 1024**3, snapshots=8):
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "disk.qcow2")
+        write_snapshot_fixture(path, virtual_size, snapshots)
+        start = time.perf_counter()
+        listed, summary = list_snapshots("qemu-img", path)
+        elapsed = time.perf_counter() - start
+        for snapshot in listed:
+            print(f"{snapshot.name:<10} {snapshot.kind:<9} exclusive {format_size(snapshot.used_bytes or 0):>8}")
+        print(f"{summary}; accounted {format_size(virtual_size)} x {snapshots + 1} tables in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()
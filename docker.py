@@ -1,7 +1,10 @@
-import os
-import subprocess
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
+from log_sink import LOG_FLUSH_INTERVAL_MS, LogSink
+from image_catalog import get_image_catalog
+from docker_engine import BuildProgress, CancelToken, DockerEngineError, OperationCancelled, build_lines, get_docker_client, format_images
 
 DEFAULT_ISO_PATH = r"D:\\4\\cloud\\ubuntu-24.04.2-desktop-amd64.iso"
 
@@ -33,55 +36,101 @@ def create_dockerfile(save_path, content, log_widget):
         gui_log(log_widget, f"Error creating Dockerfile: {e}")
         return False
 
-def build_docker_image(dockerfile_path, image_name, log_widget):
-    try:
-        subprocess.run(["docker", "build", "-t", image_name, "-f", dockerfile_path, os.path.dirname(dockerfile_path)], check=True, capture_output=True, text=True)
-        message = f"Image '{image_name}' built."
-        gui_log(log_widget, message)
-        return True
-    except FileNotFoundError:
-        gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
-        return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error building Docker image: {e.stderr}")
-        return False
-    except Exception as e:
-        gui_log(log_widget, f"An unexpected error occurred during Docker image build: {e}")
-        return False
+def build_docker_image(dockerfile_path, image_name, log_widget, cancel_token=None):
+    # The build runs in a worker thread; Tk is only touched from the drain loop below
+    cancel_token = cancel_token or CancelToken()
+    pending = queue.Queue()
+
+    def run():
+        progress = BuildProgress()
+        try:
+            for message in get_docker_client().build(dockerfile_path, image_name, cancel=cancel_token):
+                for line in build_lines(message):
+                    pending.put(line)
+                    progress.feed(line)
+            progress.finish()
+            pending.put(f"Image '{image_name}' built.\n{progress.summary()}")
+        except OperationCancelled:
+            pending.put(f"Build of '{image_name}' cancelled.")
+        except FileNotFoundError:
+            pending.put("Error: 'docker' command not found. Ensure Docker is installed and running.")
+        except DockerEngineError as e:
+            pending.put(f"Error building Docker image: {e}")
+        except Exception as e:
+            pending.put(f"An unexpected error occurred during Docker image build: {e}")
+        pending.put(None)
+
+    def drain():
+        while True:
+            try:
+                line = pending.get_nowait()
+            except queue.Empty:
+                log_widget.after(50, drain)
+                return
+            if line is None:
+                return
+            gui_log(log_widget, line)
+
+    threading.Thread(target=run, name="docker-build", daemon=True).start()
+    drain()
+    return cancel_token
 
 def list_docker_images(log_widget):
     try:
-        output = subprocess.check_output(["docker", "images"], text=True)
-        gui_log(log_widget, output)
+        gui_log(log_widget, format_images(get_docker_client().images()))
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error listing Docker images: {e.stderr}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error listing Docker images: {e}")
         return False
     except Exception as e:
         gui_log(log_widget, f"An unexpected error occurred while listing Docker images: {e}")
         return False
 
-def search_local_image(image_name, log_widget):
+def search_local_image(image_name, log_widget, sort_by="name"):
     try:
-        output = subprocess.check_output(["docker", "images", image_name], text=True)
-        gui_log(log_widget, output)
+        catalog = get_image_catalog()
+        catalog.refresh()
+        gui_log(log_widget, format_images(catalog.search(image_name, sort_by)))
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error searching for local image '{image_name}': {e.stderr}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error searching for local image '{image_name}': {e}")
         return False
     except Exception as e:
         gui_log(log_widget, f"An unexpected error occurred while searching for local image '{image_name}': {e}")
         return False
 
+class TkLogSink(LogSink):
+    def __init__(self, log_widget):
+        super().__init__()
+        self.log_widget = log_widget
+
+    def write(self, message):
+        if super().write(message):
+            self.log_widget.after(LOG_FLUSH_INTERVAL_MS, self.flush)
+
+    def flush(self):
+        lines = self.take()
+        if not lines:
+            return
+        self.log_widget.insert(tk.END, "\n".join(lines) + "\n")
+        # Keep the widget at a fixed number of lines by trimming from the top
+        line_count = int(self.log_widget.index("end-1c").split(".")[0])
+        if line_count > self.capacity:
+            self.log_widget.delete("1.0", f"{line_count - self.capacity + 1}.0")
+        self.log_widget.see(tk.END)
+
 def gui_log(log_widget, message):
-    log_widget.insert(tk.END, message + "\n")
-    log_widget.see(tk.END)
+    # Lines are batched and written at most once per frame
+    sink = getattr(log_widget, "log_sink", None)
+    if sink is None:
+        sink = log_widget.log_sink = TkLogSink(log_widget)
+    sink.write(message)
 
 def main_gui():
     root = tk.Tk()
@@ -105,8 +154,16 @@ def main_gui():
     ttk.Button(docker_tab, text="Create Dockerfile", command=lambda: create_dockerfile(
         filedialog.asksaveasfilename(defaultextension="Dockerfile"), dockerfile_content.get("1.0", tk.END), output_box)).grid(row=1, column=0, pady=5)
 
-    ttk.Button(docker_tab, text="Build Docker Image", command=lambda: build_docker_image(
-        filedialog.askopenfilename(title="Select Dockerfile"), simple_input_popup("Image Name/Tag"), output_box)).grid(row=1, column=1, pady=5)
+    current_build = {}
+
+    def start_build():
+        if current_build.get("token"):
+            current_build["token"].cancel()
+        current_build["token"] = build_docker_image(
+            filedialog.askopenfilename(title="Select Dockerfile"), simple_input_popup("Image Name/Tag"), output_box)
+
+    ttk.Button(docker_tab, text="Build Docker Image", command=start_build).grid(row=1, column=1, pady=5)
+    ttk.Button(docker_tab, text="Cancel Build", command=lambda: current_build.get("token") and current_build["token"].cancel()).grid(row=1, column=2, pady=5)
 
     ttk.Button(docker_tab, text="List Images", command=lambda: list_docker_images(output_box)).grid(row=2, column=0, pady=5)
     ttk.Button(docker_tab, text="Search Image", command=lambda: search_local_image(simple_input_popup("Local Image Name"), output_box)).grid(row=3, column=0, pady=5)
@@ -0,0 +1,1029 @@
+import os
+import io
+import re
+import json
+import time
+import signal
+import calendar
+import socket
+import tarfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode, quote
+from dataclasses import dataclass, field
+
+DOCKER_SOCKET = os.environ.get("DOCKER_SOCKET", "/var/run/docker.sock")
+ENGINE_TIMEOUT = 30
+ENGINE_POOL_SIZE = 4
+
+
+class DockerEngineError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DockerUnavailable(DockerEngineError):
+    pass
+
+
+class OperationCancelled(DockerEngineError):
+    pass
+
+
+class CancelToken:
+    # Shared between the UI and a worker; cancel() runs every registered closer once
+    def __init__(self):
+        self.cancelled = False
+        self.closers = []
+        self.lock = threading.Lock()
+
+    def on_cancel(self, closer):
+        with self.lock:
+            if not self.cancelled:
+                self.closers.append(closer)
+                return
+        closer()
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            closers, self.closers = self.closers, []
+        for closer in closers:
+            try:
+                closer()
+            except OSError:
+                pass
+
+    def check(self):
+        if self.cancelled:
+            raise OperationCancelled("Cancelled.")
+
+
+@dataclass(slots=True)
+class ImageInfo:
+    id: str
+    repository: str
+    tag: str
+    digest: str
+    size: int
+    created: float
+
+
+@dataclass(slots=True)
+class ContainerInfo:
+    id: str
+    names: str
+    image: str
+    command: str
+    created: float
+    state: str
+    status: str
+    ports: list = field(default_factory=list)
+
+
+def short_id(image_or_container_id):
+    return image_or_container_id.split(":", 1)[-1][:12]
+
+
+def format_size(size):
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.3g}{unit}"
+        size /= 1000
+    return f"{size:.3g}TB"
+
+
+def parse_size(size_str):
+    # CLI sizes come back human readable, e.g. "187MB" or "1.2GB"
+    units = {"B": 1, "kB": 1000, "KB": 1000, "MB": 1000**2, "GB": 1000**3, "TB": 1000**4}
+    size_str = size_str.split(" ", 1)[0]
+    for unit in ("kB", "KB", "MB", "GB", "TB", "B"):
+        if size_str.endswith(unit):
+            try:
+                return int(float(size_str[:-len(unit)]) * units[unit])
+            except ValueError:
+                return 0
+    return 0
+
+
+def parse_cli_time(created_at):
+    # e.g. "2024-05-01 10:11:12 +0000 UTC"; the CLI prints daemon-local time, so the offset is applied
+    try:
+        created = calendar.timegm(time.strptime(created_at[:19], "%Y-%m-%d %H:%M:%S"))
+    except (ValueError, TypeError):
+        return 0.0
+    offset = created_at[20:25]
+    if len(offset) == 5 and offset[0] in "+-" and offset[1:].isdigit():
+        created -= (1 if offset[0] == "+" else -1) * (int(offset[1:3]) * 3600 + int(offset[3:]) * 60)
+    return float(created)
+
+
+def format_age(created):
+    if not created:
+        return "N/A"
+    seconds = max(0, time.time() - created)
+    for unit, length in (("year", 365 * 86400), ("month", 30 * 86400), ("week", 7 * 86400),
+                         ("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= length:
+            count = int(seconds // length)
+            return f"{count} {unit}{'s' if count > 1 else ''} ago"
+    return "Less than a minute ago"
+
+
+def format_port(port):
+    if port.get("PublicPort"):
+        return f"{port.get('IP', '')}:{port['PublicPort']}->{port['PrivatePort']}/{port.get('Type', 'tcp')}"
+    return f"{port.get('PrivatePort')}/{port.get('Type', 'tcp')}"
+
+
+def format_port_bindings(bindings):
+    # NetworkSettings.Ports from 'docker inspect': {"80/tcp": [{"HostIp": "0.0.0.0", "HostPort": "8080"}], ...}
+    ports = []
+    for container_port, host_ports in (bindings or {}).items():
+        if not host_ports:
+            ports.append(container_port)
+            continue
+        for host in host_ports:
+            ports.append(f"{host.get('HostIp', '')}:{host.get('HostPort')}->{container_port}")
+    return ports
+
+
+def parse_iso_time(timestamp):
+    # e.g. "2024-05-01T10:11:12.123456789Z"
+    return parse_cli_time((timestamp or "").replace("T", " "))
+
+
+def split_reference(reference):
+    # "registry:5000/app:1.0" -> ("registry:5000/app", "1.0"), "app@sha256:..." -> ("app", "sha256:...")
+    if "@" in reference:
+        name, _, digest = reference.partition("@")
+        return name, digest
+    name, _, tag = reference.rpartition(":")
+    if not name or "/" in tag:
+        return reference, "latest"
+    return name, tag
+
+
+def build_context_tar(context_dir, dockerfile_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(context_dir, arcname=".")
+        dockerfile_in_context = os.path.abspath(dockerfile_path).startswith(os.path.abspath(context_dir) + os.sep)
+        if not dockerfile_in_context:
+            tar.add(dockerfile_path, arcname=".dockerfile")
+    arcname = os.path.relpath(dockerfile_path, context_dir) if dockerfile_in_context else ".dockerfile"
+    return buffer.getvalue(), arcname.replace(os.sep, "/")
+
+
+def terminate_process(process):
+    # The CLI runs in its own session so helpers it spawned are stopped with it
+    if process.poll() is not None:
+        return
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            return
+        except OSError:
+            pass
+    process.terminate()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=ENGINE_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class EngineEventStream:
+    # Follows GET /events on its own connection; close() from any thread ends the iteration
+    def __init__(self, socket_path, since=None):
+        self.socket_path = socket_path
+        self.since = since
+        self.conn = None
+        self.closed = False
+
+    def __iter__(self):
+        query = {"filters": json.dumps({"type": ["container"]})}
+        if self.since is not None:
+            query["since"] = str(int(self.since))
+        self.conn = UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            self.conn.request("GET", f"/events?{urlencode(query)}")
+            response = self.conn.getresponse()
+            if response.status >= 400:
+                raise DockerEngineError(response.read().decode(errors="replace"), response.status)
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+            raise DockerUnavailable(f"Cannot connect to Docker at {self.socket_path}: {e}")
+        except (http.client.HTTPException, OSError, ValueError):
+            if not self.closed:
+                raise
+        finally:
+            self.conn.close()
+
+    def close(self):
+        self.closed = True
+        if self.conn is not None and self.conn.sock is not None:
+            try:
+                self.conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class CliEventStream:
+    def __init__(self, since=None):
+        self.since = since
+        self.process = None
+        self.closed = False
+
+    def __iter__(self):
+        args = ["docker", "events", "--format", "{{json .}}", "--filter", "type=container"]
+        if self.since is not None:
+            args += ["--since", str(int(self.since))]
+        self.process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            for line in self.process.stdout:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            self.close()
+
+    def close(self):
+        self.closed = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+class EngineClient:
+    def __init__(self, socket_path=DOCKER_SOCKET, timeout=ENGINE_TIMEOUT, pool_size=ENGINE_POOL_SIZE):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return UnixHTTPConnection(self.socket_path, self.timeout)
+
+    def release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def send(self, method, path, query=None, body=None, headers=None, read_timeout=None):
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        # A pooled keep-alive connection may have been closed by the daemon; retry once on a new one
+        for attempt in range(2):
+            conn = self.acquire()
+            try:
+                if read_timeout is not None:
+                    # Calls that wait on the daemon (stop with a grace period) need more than the default
+                    if conn.sock is None:
+                        conn.connect()
+                    conn.sock.settimeout(max(read_timeout, self.timeout))
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+                conn.close()
+                raise DockerUnavailable(f"Cannot connect to Docker at {self.socket_path}: {e}")
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt:
+                    raise DockerUnavailable(f"Lost connection to Docker: {e}")
+                continue
+            if response.status >= 400:
+                payload = response.read()
+                self.release(conn)
+                try:
+                    message = json.loads(payload).get("message", "")
+                except ValueError:
+                    message = payload.decode(errors="replace")
+                raise DockerEngineError(message or f"HTTP {response.status}", response.status)
+            return conn, response
+
+    def request(self, method, path, query=None, body=None, headers=None, read_timeout=None):
+        conn, response = self.send(method, path, query, body, headers, read_timeout)
+        payload = response.read()
+        if read_timeout is not None and conn.sock is not None:
+            conn.sock.settimeout(self.timeout)
+        self.release(conn)
+        if not payload:
+            return None
+        return json.loads(payload)
+
+    def stream(self, method, path, query=None, body=None, headers=None, cancel=None):
+        # Engine progress endpoints answer with one JSON document per line
+        conn, response = self.send(method, path, query, body, headers)
+        if cancel is not None:
+            # Dropping the connection is how the daemon is told to abort a build or pull
+            cancel.on_cancel(lambda: conn.sock is not None and conn.sock.shutdown(socket.SHUT_RDWR))
+        try:
+            for line in response:
+                line = line.strip()
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("error"):
+                    raise DockerEngineError(message["error"])
+                yield message
+        except (http.client.HTTPException, OSError, ValueError) as e:
+            if cancel is not None and cancel.cancelled:
+                raise OperationCancelled("Cancelled.")
+            raise DockerEngineError(f"Lost connection to Docker: {e}")
+        finally:
+            if response.isclosed() and not (cancel is not None and cancel.cancelled):
+                self.release(conn)
+            else:
+                conn.close()
+        if cancel is not None:
+            cancel.check()
+
+    def ping(self):
+        conn, response = self.send("GET", "/_ping")
+        ok = response.read() == b"OK"
+        self.release(conn)
+        return ok
+
+    def events(self, since=None):
+        return EngineEventStream(self.socket_path, since)
+
+    def images(self, reference=None):
+        query = {"filters": json.dumps({"reference": [reference]})} if reference else None
+        images = []
+        for image in self.request("GET", "/images/json", query) or []:
+            digest = (image.get("RepoDigests") or ["<none>@<none>"])[0].rpartition("@")[2]
+            for repo_tag in image.get("RepoTags") or ["<none>:<none>"]:
+                repository, tag = split_reference(repo_tag)
+                images.append(ImageInfo(image["Id"], repository, tag, digest, image.get("Size", 0), image.get("Created", 0)))
+        return images
+
+    def containers(self, all=False, ids=None):
+        query = {"all": "1" if all else "0"}
+        if ids:
+            query["filters"] = json.dumps({"id": list(ids)})
+        containers = []
+        for c in self.request("GET", "/containers/json", query) or []:
+            containers.append(ContainerInfo(
+                c["Id"],
+                ",".join(name.lstrip("/") for name in c.get("Names") or []),
+                c.get("Image", ""),
+                c.get("Command", ""),
+                c.get("Created", 0),
+                c.get("State", ""),
+                c.get("Status", ""),
+                [format_port(port) for port in c.get("Ports") or []],
+            ))
+        return containers
+
+    def remote_digest(self, image_name):
+        # Asks the registry (through the daemon) for the manifest digest without pulling anything
+        name, tag = split_reference(image_name)
+        separator = "@" if tag.startswith("sha256:") else ":"
+        descriptor = self.request("GET", f"/distribution/{name}{separator}{tag}/json") or {}
+        return descriptor.get("Descriptor", {}).get("digest")
+
+    def stop(self, container_id, timeout=None):
+        # 304 (already stopped) is not an error
+        query = {"t": str(timeout)} if timeout is not None else None
+        self.request("POST", f"/containers/{quote(container_id, safe='')}/stop", query,
+                     read_timeout=None if timeout is None else timeout + ENGINE_TIMEOUT)
+
+    def restart(self, container_id, timeout=None):
+        query = {"t": str(timeout)} if timeout is not None else None
+        self.request("POST", f"/containers/{quote(container_id, safe='')}/restart", query,
+                     read_timeout=None if timeout is None else timeout + ENGINE_TIMEOUT)
+
+    def kill(self, container_id):
+        self.request("POST", f"/containers/{quote(container_id, safe='')}/kill")
+
+    def remove(self, container_id, force=False):
+        self.request("DELETE", f"/containers/{quote(container_id, safe='')}", {"force": "1" if force else "0"})
+
+    def pull(self, image_name, cancel=None):
+        name, tag = split_reference(image_name)
+        yield from self.stream("POST", "/images/create", {"fromImage": name, "tag": tag}, cancel=cancel)
+
+    def build(self, dockerfile_path, image_name, context_dir=None, cancel=None):
+        context_dir = context_dir or os.path.dirname(dockerfile_path) or "."
+        context, dockerfile = build_context_tar(context_dir, dockerfile_path)
+        query = {"t": image_name, "dockerfile": dockerfile}
+        yield from self.stream("POST", "/build", query, context, {"Content-Type": "application/x-tar"}, cancel)
+
+
+class CliClient:
+    def run(self, args):
+        try:
+            return subprocess.run(["docker"] + args, check=True, capture_output=True, text=True).stdout
+        except subprocess.CalledProcessError as e:
+            raise DockerEngineError(e.stderr.strip() or str(e), e.returncode)
+
+    def json_lines(self, args):
+        return [json.loads(line) for line in self.run(args).splitlines() if line.strip()]
+
+    def stream(self, args, cancel=None, env=None):
+        process = subprocess.Popen(["docker"] + args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                   env=dict(os.environ, **env) if env else None, start_new_session=True)
+        if cancel is not None:
+            cancel.on_cancel(lambda: terminate_process(process))
+        lines = []
+        try:
+            for line in process.stdout:
+                lines.append(line)
+                del lines[:-5]
+                yield {"stream": line}
+        except GeneratorExit:
+            terminate_process(process)
+            raise
+        if process.wait() != 0:
+            if cancel is not None and cancel.cancelled:
+                raise OperationCancelled("Cancelled.")
+            raise DockerEngineError("".join(lines).strip(), process.returncode)
+
+    def ping(self):
+        self.run(["version", "--format", "{{.Server.Version}}"])
+        return True
+
+    def events(self, since=None):
+        return CliEventStream(since)
+
+    def images(self, reference=None):
+        args = ["images", "--no-trunc", "--digests", "--format", "{{json .}}"] + ([reference] if reference else [])
+        return [ImageInfo(i.get("ID", ""), i.get("Repository", ""), i.get("Tag", ""), i.get("Digest", ""),
+                          parse_size(i.get("Size", "")), parse_cli_time(i.get("CreatedAt")))
+                for i in self.json_lines(args)]
+
+    def containers(self, all=False, ids=None):
+        args = ["ps", "--no-trunc", "--format", "{{json .}}"] + (["-a"] if all else [])
+        for container_id in ids or []:
+            args += ["--filter", f"id={container_id}"]
+        listed = self.json_lines(args)
+        if not listed:
+            return []
+        # One multi-ID inspect covers ports for every container, instead of one 'docker port' each
+        try:
+            inspected = {i["Id"]: i for i in json.loads(self.run(["inspect", "--type", "container"] + [c["ID"] for c in listed]))}
+        except (DockerEngineError, ValueError):
+            inspected = {}
+        containers = []
+        for c in listed:
+            details = inspected.get(c.get("ID"))
+            if details is None:
+                ports = [p.strip() for p in c.get("Ports", "").split(",") if p.strip()]
+                command = c.get("Command", "").strip('"')
+                created = parse_cli_time(c.get("CreatedAt"))
+            else:
+                ports = format_port_bindings(details.get("NetworkSettings", {}).get("Ports"))
+                command = " ".join([details.get("Path", "")] + (details.get("Args") or [])).strip()
+                created = parse_iso_time(details.get("Created"))
+            containers.append(ContainerInfo(c.get("ID", ""), c.get("Names", ""), c.get("Image", ""), command,
+                                            created, c.get("State", ""), c.get("Status", ""), ports))
+        return containers
+
+    def remote_digest(self, image_name):
+        # The CLI has no cheap registry lookup; only pinned references are known up front
+        name, tag = split_reference(image_name)
+        return tag if tag.startswith("sha256:") else None
+
+    def stop(self, container_id, timeout=None):
+        self.run(["stop"] + (["-t", str(timeout)] if timeout is not None else []) + [container_id])
+
+    def restart(self, container_id, timeout=None):
+        self.run(["restart"] + (["-t", str(timeout)] if timeout is not None else []) + [container_id])
+
+    def kill(self, container_id):
+        self.run(["kill", container_id])
+
+    def remove(self, container_id, force=False):
+        self.run(["rm"] + (["-f"] if force else []) + [container_id])
+
+    def pull(self, image_name, cancel=None):
+        yield from self.stream(["pull", image_name], cancel)
+
+    def build(self, dockerfile_path, image_name, context_dir=None, cancel=None):
+        context_dir = context_dir or os.path.dirname(dockerfile_path) or "."
+        # Plain progress gives one line per BuildKit step event, which BuildProgress can time
+        yield from self.stream(["build", "--progress=plain", "-t", image_name, "-f", dockerfile_path, context_dir],
+                               cancel)
+
+
+class DockerClient:
+    def __init__(self, socket_path=DOCKER_SOCKET):
+        self.engine = EngineClient(socket_path) if hasattr(socket, "AF_UNIX") else None
+        self.cli = CliClient()
+
+    def backend(self):
+        if self.engine is not None and os.path.exists(self.engine.socket_path):
+            return self.engine
+        return self.cli
+
+    def call(self, method, *args, **kwargs):
+        backend = self.backend()
+        try:
+            return getattr(backend, method)(*args, **kwargs)
+        except DockerUnavailable:
+            if backend is self.cli:
+                raise
+            return getattr(self.cli, method)(*args, **kwargs)
+
+    def stream(self, method, *args, **kwargs):
+        backend = self.backend()
+        try:
+            yield from getattr(backend, method)(*args, **kwargs)
+            return
+        except DockerUnavailable:
+            if backend is self.cli:
+                raise
+        yield from getattr(self.cli, method)(*args, **kwargs)
+
+    def images(self, reference=None):
+        return self.call("images", reference)
+
+    def containers(self, all=False, ids=None):
+        return self.call("containers", all, ids)
+
+    def events(self, since=None):
+        return self.call("events", since)
+
+    def stop(self, container_id, timeout=None):
+        return self.call("stop", container_id, timeout)
+
+    def restart(self, container_id, timeout=None):
+        return self.call("restart", container_id, timeout)
+
+    def kill(self, container_id):
+        return self.call("kill", container_id)
+
+    def remove(self, container_id, force=False, timeout=None):
+        # Give the container its grace period before the forced removal
+        if timeout is not None:
+            try:
+                self.stop(container_id, timeout)
+            except DockerEngineError:
+                pass
+        return self.call("remove", container_id, force)
+
+    def inventory(self, all=True):
+        return ContainerInventory(self.containers(all))
+
+    def remote_digest(self, image_name):
+        return self.call("remote_digest", image_name)
+
+    def local_digests(self, image_name):
+        name, _ = split_reference(image_name)
+        return {image.digest for image in self.images(name) if image.digest.startswith("sha256:")}
+
+    def pull(self, image_name, cancel=None):
+        return self.stream("pull", image_name, cancel=cancel)
+
+    def build(self, dockerfile_path, image_name, context_dir=None, cancel=None):
+        return self.stream("build", dockerfile_path, image_name, context_dir, cancel=cancel)
+
+
+docker_client = None
+
+def get_docker_client():
+    global docker_client
+    if docker_client is None:
+        docker_client = DockerClient()
+    return docker_client
+
+
+def format_images(images):
+    lines = [f"{'REPOSITORY':<30} {'TAG':<15} {'IMAGE ID':<14} {'CREATED':<18} {'SIZE':<10}"]
+    for image in images:
+        lines.append(f"{image.repository:<30} {image.tag:<15} {short_id(image.id):<14} {format_age(image.created):<18} {format_size(image.size):<10}")
+    return "\n".join(lines)
+
+
+# Events that change what the container list shows; exec_*, attach, resize etc. are ignored
+CONTAINER_EVENT_ACTIONS = {"create", "start", "restart", "stop", "die", "kill", "oom", "pause", "unpause",
+                           "rename", "update", "health_status", "destroy"}
+
+
+def event_action(event):
+    # "health_status: healthy" -> "health_status"
+    return (event.get("Action") or event.get("status") or "").split(":", 1)[0]
+
+
+def event_container_id(event):
+    return event.get("id") or event.get("Actor", {}).get("ID", "")
+
+
+class ContainerInventory:
+    COLUMNS = ("CONTAINER ID", "IMAGE", "COMMAND", "CREATED", "STATUS", "PORTS", "NAMES")
+    WIDTHS = (15, 20, 20, 15, 25, 25, 15)
+
+    def __init__(self, containers=()):
+        self.containers = list(containers)
+        self.by_id = {c.id: c for c in self.containers}
+
+    def __len__(self):
+        return len(self.containers)
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def get(self, container_id):
+        return self.by_id.get(container_id)
+
+    def update(self, container):
+        if container.id in self.by_id:
+            self.containers[self.containers.index(self.by_id[container.id])] = container
+        else:
+            self.containers.append(container)
+        self.by_id[container.id] = container
+
+    def remove(self, container_id):
+        container = self.by_id.pop(container_id, None)
+        if container is not None:
+            self.containers.remove(container)
+
+    def running(self):
+        return ContainerInventory(c for c in self.containers if c.state == "running")
+
+    def row(self, c):
+        return (short_id(c.id), c.image, c.command, format_age(c.created), c.status,
+                ", ".join(c.ports) if c.ports else "N/A", c.names)
+
+    def rows(self):
+        return [self.row(c) for c in self.containers]
+
+
+def format_containers(containers):
+    inventory = containers if isinstance(containers, ContainerInventory) else ContainerInventory(containers)
+    header = " ".join(f"{title:<{width}}" for title, width in zip(inventory.COLUMNS, inventory.WIDTHS))
+    lines = [header]
+    for row in inventory.rows():
+        # Shorten long fields for neatness
+        cells = [(value[:width - 3] + '...') if len(value) > width else value
+                 for value, width in zip(row, inventory.WIDTHS)]
+        lines.append(" ".join(f"{value:<{width}}" for value, width in zip(cells, inventory.WIDTHS)))
+    return "\n".join(lines)
+
+
+BUILDKIT_LINE = re.compile(r"^#(\d+) (.*)$")
+BUILDKIT_DONE = re.compile(r"^DONE (\d+(?:\.\d+)?)s$")
+CLASSIC_STEP = re.compile(r"^Step (\d+)/(\d+) : (.*)$")
+
+
+class BuildStep:
+    __slots__ = ("name", "started", "duration", "cached", "failed")
+
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+        self.duration = None
+        self.cached = False
+        self.failed = False
+
+
+class BuildProgress:
+    # Understands both BuildKit plain progress ("#5 [2/3] RUN ...", "#5 DONE 1.2s")
+    # and the classic builder ("Step 2/3 : RUN ...", " ---> Using cache")
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.finished = None
+        self.steps = {}
+        self.classic_step = None
+
+    def feed(self, line):
+        # Returns the step whose timing was just settled, if any
+        line = line.rstrip()
+        now = self.clock()
+        match = BUILDKIT_LINE.match(line)
+        if match:
+            key, rest = match.groups()
+            step = self.steps.get(key)
+            if step is None:
+                self.steps[key] = BuildStep(rest, now)
+                return None
+            if rest == "CACHED":
+                step.cached = True
+                step.duration = 0.0
+                return step
+            done = BUILDKIT_DONE.match(rest)
+            if done:
+                step.duration = float(done.group(1))
+                return step
+            if rest.startswith("ERROR"):
+                step.failed = True
+                step.duration = now - step.started
+                return step
+            return None
+
+        match = CLASSIC_STEP.match(line.strip())
+        if match:
+            settled = self.close_classic_step(now)
+            self.classic_step = BuildStep(match.group(0), now)
+            self.steps[f"step{match.group(1)}"] = self.classic_step
+            return settled
+        if self.classic_step is not None:
+            if "Using cache" in line:
+                self.classic_step.cached = True
+            elif line.startswith("Successfully built") or line.startswith("Successfully tagged"):
+                return self.close_classic_step(now)
+        return None
+
+    def close_classic_step(self, now):
+        step, self.classic_step = self.classic_step, None
+        if step is not None and step.duration is None:
+            step.duration = now - step.started
+        return step
+
+    def finish(self):
+        self.close_classic_step(self.clock())
+        self.finished = self.clock()
+
+    def timed_steps(self):
+        return [step for step in self.steps.values()
+                if step.duration is not None and not step.name.startswith("[internal]")]
+
+    def summary(self, slowest=3):
+        elapsed = (self.finished or self.clock()) - self.started
+        steps = self.timed_steps()
+        cached = [step for step in steps if step.cached]
+        lines = [f"Build finished in {elapsed:.1f}s: {len(steps)} steps, {len(cached)} from cache."]
+        if cached:
+            lines.append("Cache hits:")
+            lines += [f"  {step.name}" for step in cached]
+        built = sorted((step for step in steps if not step.cached), key=lambda step: step.duration, reverse=True)
+        if built:
+            lines.append("Slowest steps:")
+            lines += [f"  {step.duration:6.1f}s  {step.name}" for step in built[:slowest]]
+        return "\n".join(lines)
+
+
+LAYER_STATUSES = ("Pulling fs layer", "Waiting", "Downloading", "Verifying Checksum", "Download complete",
+                  "Extracting", "Pull complete", "Already exists")
+
+
+class PullProgress:
+    # Folds pull progress messages into per-layer state and a running byte count
+    def __init__(self, image_name):
+        self.image_name = image_name
+        self.layers = {}
+        self.downloaded = 0
+        self.digest = None
+        self.status = "Queued"
+
+    def feed(self, message):
+        # Returns the layer id the message was about, or None for image-level messages
+        if "stream" in message:
+            message = cli_progress_message(message["stream"])
+        status = message.get("status", "")
+        layer_id = message.get("id")
+        if status.startswith("Digest: "):
+            self.digest = status[len("Digest: "):]
+            return None
+        if not layer_id or not status.startswith(LAYER_STATUSES):
+            self.status = status or self.status
+            return None
+        detail = message.get("progressDetail") or {}
+        layer = self.layers.setdefault(layer_id, {"status": "", "current": 0, "total": 0})
+        same_phase = layer["status"] == status
+        current = detail.get("current", layer["current"] if same_phase else 0)
+        if status == "Downloading":
+            self.downloaded += max(0, current - (layer["current"] if same_phase else 0))
+        layer["status"] = status
+        layer["current"] = current
+        layer["total"] = detail.get("total", layer["total"] if same_phase else 0)
+        return layer_id
+
+    def layer_text(self, layer_id):
+        layer = self.layers[layer_id]
+        if layer["total"]:
+            percent = 100 * layer["current"] // layer["total"]
+            return f"{format_size(layer['current'])} / {format_size(layer['total'])} ({percent}%)"
+        return ""
+
+
+def cli_progress_message(line):
+    # The CLI prints plain lines rather than JSON: "a1b2c3: Pull complete" -> {"id": "a1b2c3", "status": "Pull complete"}
+    layer_id, separator, status = line.strip().partition(": ")
+    if separator and status.startswith(LAYER_STATUSES):
+        return {"id": layer_id, "status": status}
+    return {"status": line.strip()}
+
+
+def build_lines(message):
+    # Engine build messages can carry several lines in one "stream" chunk
+    if "stream" in message:
+        return message["stream"].splitlines()
+    if message.get("status"):
+        return [progress_line(message)]
+    return []
+
+
+def progress_line(message):
+    # Pull and build progress messages share one shape: status/progress or a raw stream chunk
+    if "stream" in message:
+        return message["stream"].rstrip("\n")
+    text = message.get("status", "")
+    if message.get("id"):
+        text = f"{message['id']}: {text}"
+    if message.get("progress"):
+        text = f"{text} {message['progress']}"
+    return text
+
+
+def run_benchmark(calls=200):
+    import tempfile
+    from http.server import BaseHTTPRequestHandler
+    from socketserver import ThreadingUnixStreamServer
+    from urllib.parse import urlsplit, parse_qs
+
+    # What the daemon and 'docker ps'/'docker inspect' report for the same two containers
+    engine_containers = [
+        {"Id": "a1" * 32, "Names": ["/web"], "Image": "nginx:1.25", "Command": "nginx -g 'daemon off;'",
+         "Created": 1714558272, "State": "running", "Status": "Up 2 hours",
+         "Ports": [{"IP": "0.0.0.0", "PrivatePort": 80, "PublicPort": 8080, "Type": "tcp"}]},
+        {"Id": "b2" * 32, "Names": ["/job"], "Image": "busybox", "Command": "sleep 1",
+         "Created": 1714561872, "State": "exited", "Status": "Exited (0) 1 hour ago", "Ports": []},
+    ]
+    cli_output = {
+        "ps": "\n".join(json.dumps({"ID": c["Id"], "Names": c["Names"][0].lstrip("/"), "Image": c["Image"],
+                                    "Command": json.dumps(c["Command"]), "State": c["State"], "Status": c["Status"],
+                                    "CreatedAt": time.strftime("%Y-%m-%d %H:%M:%S +0000 UTC", time.gmtime(c["Created"])),
+                                    "Ports": ", ".join(format_port(p) for p in c["Ports"])})
+                        for c in engine_containers),
+        "inspect": json.dumps([{"Id": c["Id"], "Path": c["Command"].split(" ", 1)[0],
+                                "Args": c["Command"].split(" ")[1:],
+                                "Created": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime(c["Created"])),
+                                "NetworkSettings": {"Ports": {f"{p['PrivatePort']}/{p['Type']}":
+                                                              [{"HostIp": p["IP"], "HostPort": str(p["PublicPort"])}]
+                                                              for p in c["Ports"]}}}
+                               for c in engine_containers]),
+    }
+    pull_messages = [{"status": "Pulling from library/nginx", "id": "1.25"}]
+    for layer in ("l1", "l2"):
+        pull_messages.append({"status": "Pulling fs layer", "id": layer})
+        for current in (1000000, 2000000):
+            pull_messages.append({"status": "Downloading", "id": layer,
+                                  "progressDetail": {"current": current, "total": 2000000}})
+        pull_messages.append({"status": "Pull complete", "id": layer})
+    pull_messages.append({"status": "Digest: sha256:" + "c3" * 32})
+    build_messages = [{"stream": "Step 1/2 : FROM busybox\n"}, {"stream": " ---> Using cache\n"},
+                      {"stream": "Step 2/2 : RUN true\n"}, {"stream": "Successfully built 0123456789ab\n"}]
+
+    class FakeEngineHandler(BaseHTTPRequestHandler):
+        # Keep-alive, as the daemon does, so the connection pool has something to reuse
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/_ping":
+                self.send_body(b"OK", "text/plain")
+            elif url.path == "/containers/json":
+                listed = [c for c in engine_containers if query.get("all") == ["1"] or c["State"] == "running"]
+                ids = json.loads(query.get("filters", ["{}"])[0]).get("id")
+                if ids:
+                    listed = [c for c in listed if any(c["Id"].startswith(i) for i in ids)]
+                self.send_body(json.dumps(listed).encode())
+            else:
+                self.send_body(json.dumps({"message": f"page not found: {url.path}"}).encode(), status=404)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if url.path == "/images/create":
+                self.send_stream(pull_messages)
+            elif url.path == "/build":
+                dockerfile = parse_qs(url.query)["dockerfile"][0]
+                with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+                    found = dockerfile in [name.removeprefix("./") for name in tar.getnames()]
+                self.send_stream(build_messages if found else [{"error": f"Cannot locate {dockerfile}"}])
+            else:
+                self.send_body(json.dumps({"message": f"page not found: {url.path}"}).encode(), status=404)
+
+        def send_body(self, body, content_type="application/json", status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_stream(self, messages):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for message in messages:
+                    chunk = json.dumps(message).encode() + b"\r\n"
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # A cancelled pull or build hangs up mid-stream, which is how the daemon sees it too
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    class CannedCli(CliClient):
+        # The fallback path with the daemon gone: canned 'docker ps' / 'docker inspect' output
+        def __init__(self):
+            self.calls = []
+
+        def run(self, args):
+            self.calls.append(args[0])
+            return cli_output[args[0]]
+
+    def as_tuples(containers):
+        return [(c.id, c.names, c.image, c.command, c.created, c.state, c.ports) for c in containers]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "docker.sock")
+        server = ThreadingUnixStreamServer(socket_path, FakeEngineHandler)
+        server.daemon_threads = True
+        server.block_on_close = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        client = DockerClient(socket_path)
+        print(f"backend with the socket present: {type(client.backend()).__name__}, ping {client.engine.ping()}")
+        expected = [(c["Id"], c["Names"][0].lstrip("/"), c["Image"], c["Command"], c["Created"], c["State"],
+                     [format_port(p) for p in c["Ports"]]) for c in engine_containers]
+        print(f"typed containers match the daemon: {as_tuples(client.containers(all=True)) == expected}")
+        filtered = client.containers(all=True, ids=[engine_containers[1]['Id'][:12]])
+        print(f"id filter: {[c.names for c in filtered]}, running only: {[c.names for c in client.containers()]}")
+        try:
+            client.engine.request("GET", "/nope")
+        except DockerEngineError as e:
+            print(f"HTTP errors surface as DockerEngineError: {e.status} {e}")
+
+        for label, pool_size in (("pooled keep-alive", ENGINE_POOL_SIZE), ("new connection each", 0)):
+            engine = EngineClient(socket_path, pool_size=pool_size)
+            start = time.perf_counter()
+            for _ in range(calls):
+                engine.containers(all=True)
+            elapsed = time.perf_counter() - start
+            engine.close()
+            print(f"{label:<20} {calls} x /containers/json in {elapsed * 1000:8.1f} ms "
+                  f"({elapsed / calls * 1e6:.0f} us each)")
+
+        pull = PullProgress("nginx:1.25")
+        for message in client.pull("nginx:1.25"):
+            pull.feed(message)
+        print(f"pull: {len(pull.layers)} layers, {format_size(pull.downloaded)} downloaded, digest {pull.digest}")
+
+        dockerfile = os.path.join(tmp_dir, "context", "Dockerfile")
+        os.makedirs(os.path.dirname(dockerfile))
+        with open(dockerfile, "w") as file:
+            file.write("FROM busybox\nRUN true\n")
+        build = BuildProgress()
+        for message in client.build(dockerfile, "bench:latest"):
+            for line in build_lines(message):
+                build.feed(line)
+        build.finish()
+        print(build.summary())
+
+        cancel = CancelToken()
+        cancel.cancel()
+        try:
+            list(client.pull("nginx:1.25", cancel=cancel))
+        except OperationCancelled:
+            print("cancelled pull: OperationCancelled, connection dropped")
+
+        client.engine.close()
+        server.shutdown()
+        server.server_close()
+        # The socket file is still there but nothing listens: the engine refuses and the CLI takes over
+        client.cli = CannedCli()
+        fallback = client.containers(all=True)
+        print(f"daemon gone: fell back to the CLI ({', '.join(client.cli.calls)}), "
+              f"same containers: {as_tuples(fallback) == expected}")
+        os.unlink(socket_path)
+        print(f"backend with no socket: {type(client.backend()).__name__}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
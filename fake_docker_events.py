@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Scripted stand-in for the Docker client's event stream, so the Live Containers watcher can be checked
+# without a daemon:
+#   QT_QPA_PLATFORM=offscreen python fake_docker_events.py
+# events() replays one fixed sequence of container events, then blocks like a quiet daemon until closed;
+# containers(ids=...) answers with the state each container was in after the last event about it.
+import os
+import sys
+import time
+import threading
+import importlib.util
+
+from docker_engine import ContainerInfo
+
+WEB_ID = "a1" * 32
+JOB_ID = "b2" * 32
+
+
+def container(container_id, names, state, status):
+    return ContainerInfo(container_id, names, "busybox", "sleep 60", 1714558272.0, state, status)
+
+
+# (event, what 'docker ps -a --filter id=...' shows once it has happened; None when the container is gone)
+SCRIPT = [
+    ({"Type": "container", "Action": "create", "id": WEB_ID, "time": 100}, container(WEB_ID, "web", "created", "Created")),
+    ({"Type": "container", "Action": "start", "id": WEB_ID, "time": 101}, container(WEB_ID, "web", "running", "Up 1 second")),
+    # exec_* and attach do not change the list and must not cost a refresh
+    ({"Type": "container", "Action": "exec_start: sh", "id": WEB_ID, "time": 102}, None),
+    ({"Type": "container", "Action": "health_status: healthy", "Actor": {"ID": WEB_ID}, "time": 103},
+     container(WEB_ID, "web", "running", "Up 3 seconds (healthy)")),
+    ({"Type": "container", "Action": "die", "id": WEB_ID, "time": 104}, container(WEB_ID, "web", "exited", "Exited (0)")),
+    ({"Type": "container", "Action": "destroy", "id": WEB_ID, "time": 105}, None),
+    # Created and removed before the watcher could look it up: the refresh finds nothing
+    ({"Type": "container", "Action": "create", "id": JOB_ID, "time": 106}, None),
+    ({"Type": "container", "Action": "destroy", "id": JOB_ID, "time": 107}, None),
+]
+
+EXPECTED = [
+    ("changed", WEB_ID, "created"),
+    ("changed", WEB_ID, "running"),
+    ("changed", WEB_ID, "running"),
+    ("changed", WEB_ID, "exited"),
+    ("removed", WEB_ID, None),
+    ("removed", JOB_ID, None),
+    ("removed", JOB_ID, None),
+]
+
+
+class ScriptedEventStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield from self.events
+        # A live daemon keeps the stream open; only close() ends it
+        self.closed.wait()
+
+    def close(self):
+        self.closed.set()
+
+
+class ScriptedEventClient:
+    def __init__(self, script=SCRIPT):
+        self.script = script
+        self.state = {}
+        self.streams = []
+        self.since = []
+        self.lookups = []
+
+    def events(self, since=None):
+        # The first connection gets the whole script; a reconnect finds a quiet daemon
+        self.since.append(since)
+        stream = ScriptedEventStream(self.replay() if not self.streams else [])
+        self.streams.append(stream)
+        return stream
+
+    def replay(self):
+        # Each container moves to its scripted state just before its event is delivered
+        for event, after in self.script:
+            if after is not None:
+                self.state[after.id] = after
+            elif event["Action"] == "destroy":
+                self.state.pop(event["id"], None)
+            yield event
+
+    def containers(self, all=False, ids=None):
+        self.lookups.append(list(ids or []))
+        return [self.state[i] for i in ids or [] if i in self.state]
+
+
+def load_app():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "phase two.py")
+    spec = importlib.util.spec_from_file_location("phase_two", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = load_app()
+    # The watcher emits from its own thread; as in the app, the signals are delivered through the event loop
+    qt_app = app.QApplication.instance() or app.QApplication(sys.argv)
+    client = ScriptedEventClient()
+    watcher = app.ContainerEventWatcher(client, reconnect_delay=0.1)
+    emitted = []
+    watcher.container_changed.connect(lambda c: emitted.append(("changed", c.id, c.state)))
+    watcher.container_removed.connect(lambda container_id: emitted.append(("removed", container_id, None)))
+    watcher.start(since=99)
+    deadline = time.monotonic() + 5
+    while len(emitted) < len(EXPECTED) and time.monotonic() < deadline:
+        qt_app.processEvents()
+        time.sleep(0.01)
+    watcher.stop()
+    watcher.thread.join(timeout=5)
+
+    for kind, container_id, state in emitted:
+        print(f"{kind:<8} {container_id[:12]}  {state or ''}")
+    ignored = len(SCRIPT) - len(client.lookups) - sum(1 for event, _ in SCRIPT if event["Action"] == "destroy")
+    print(f"events followed from {client.since[0]}, {len(client.lookups)} single-container lookups, "
+          f"{ignored} ignored event")
+    ok = emitted == EXPECTED and all(len(ids) == 1 for ids in client.lookups) and not watcher.thread.is_alive()
+    print(f"signals match the script: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# Stand-in for qemu-img so the disk job queue can be exercised without QEMU:
+#   QEMU_IMG=./fake_qemu_img.py python "phase two.py"
+# qcow2 images get a real v3 header (size, backing file) and no data; everything else is a plain
+# sparse file. Internal snapshots are recorded in a real snapshot table but keep no data.
+# Preallocated creates, conversions, rebases and commits run at FAKE_QEMU_IMG_MBPS,
+# FAKE_QEMU_IMG_FAIL=1 makes every command fail.
+import os
+import sys
+import json
+import time
+import struct
+
+from disk_headers import QCOW_MAGIC, UnsupportedImage, read_disk_header
+
+CHUNK = 1024 * 1024
+RATE = float(os.environ.get("FAKE_QEMU_IMG_MBPS", "200")) * 1024 * 1024
+UNITS = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+QCOW2_HEADER_FILE_SIZE = 256 * 1024
+QCOW2_BACKING_OFFSET = 512
+QCOW2_SNAPSHOT_TABLE_OFFSET = 128 * 1024
+
+
+def parse_size(size_str):
+    size_str = size_str.upper().rstrip("B")
+    if size_str[-1] in UNITS:
+        return int(float(size_str[:-1]) * UNITS[size_str[-1]])
+    return int(size_str)
+
+
+def parse_options(args):
+    options = {}
+    positional = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ("-f", "-O", "-o", "-m", "-S", "-F", "-b", "--output"):
+            options[arg] = args.pop(0)
+        elif arg.startswith("--output="):
+            options["--output"] = arg.split("=", 1)[1]
+        elif arg.startswith("-") and len(arg) > 1:
+            options[arg] = True
+        else:
+            positional.append(arg)
+    return options, positional
+
+
+def is_qcow2(path):
+    with open(path, "rb") as file:
+        return file.read(4) == QCOW_MAGIC
+
+
+def write_qcow2(path, size, backing=""):
+    backing = backing.encode()
+    header = QCOW_MAGIC + struct.pack(">IQIIQ", 3, QCOW2_BACKING_OFFSET if backing else 0, len(backing), 16, size)
+    header += bytes(72 - len(header)) + bytes(28) + struct.pack(">I", 104) + bytes(8)
+    with open(path, "wb") as file:
+        file.write(header)
+        file.seek(QCOW2_BACKING_OFFSET)
+        file.write(backing)
+        file.truncate(QCOW2_HEADER_FILE_SIZE)
+
+
+def write_snapshots(path, snapshots):
+    table = b""
+    for snapshot in snapshots:
+        ident, name = snapshot["id"].encode(), snapshot["name"].encode()
+        entry = struct.pack(">QIHHIIQII", 0, 0, len(ident), len(name), snapshot["date-sec"], snapshot["date-nsec"], 0, 0, 16)
+        entry += struct.pack(">QQ", snapshot["vm-state-size"], snapshot["disk-size"]) + ident + name
+        table += entry + bytes(-len(entry) % 8)
+    with open(path, "r+b") as file:
+        file.seek(60)
+        file.write(struct.pack(">IQ", len(snapshots), QCOW2_SNAPSHOT_TABLE_OFFSET if snapshots else 0))
+        file.seek(QCOW2_SNAPSHOT_TABLE_OFFSET)
+        file.write(table)
+
+
+def read_snapshots(path):
+    snapshots = read_disk_header(path).get("snapshots", [])
+    with open(path, "rb") as file:
+        for snapshot, offset in zip(snapshots, snapshot_offsets(file, len(snapshots))):
+            file.seek(offset + 48)
+            snapshot["disk-size"] = struct.unpack(">Q", file.read(8))[0]
+    return snapshots
+
+
+def snapshot_offsets(file, count):
+    offset = QCOW2_SNAPSHOT_TABLE_OFFSET
+    for _ in range(count):
+        yield offset
+        file.seek(offset + 12)
+        id_size, name_size = struct.unpack(">HH", file.read(4))
+        offset += (40 + 16 + id_size + name_size + 7) // 8 * 8
+
+
+def virtual_size(path):
+    if is_qcow2(path):
+        return read_disk_header(path)["virtual-size"]
+    return os.path.getsize(path)
+
+
+def set_virtual_size(path, size):
+    with open(path, "r+b") as file:
+        if is_qcow2(path):
+            file.seek(24)
+            file.write(struct.pack(">Q", size))
+        else:
+            file.truncate(size)
+
+
+def copy_at_rate(reader, writer, size, sparse=True, progress=False):
+    # Copies from reader (or zeros when there is none) at the configured rate
+    position = 0
+    while position < size:
+        count = min(CHUNK, size - position)
+        chunk = reader.read(count) if reader is not None else b""
+        chunk = chunk or bytes(count)
+        if writer is not None:
+            if sparse and not chunk.strip(b"\0"):
+                writer.seek(len(chunk), os.SEEK_CUR)
+            else:
+                writer.write(chunk)
+                writer.flush()
+        position += len(chunk)
+        if progress:
+            print(f"    ({100.0 * position / max(1, size):.2f}/100%)", end="\r", flush=True)
+        time.sleep(len(chunk) / RATE)
+    if progress:
+        print(flush=True)
+
+
+def preallocation(options):
+    for option in options.get("-o", "").split(","):
+        if option.startswith("preallocation="):
+            return option.split("=", 1)[1]
+    return "off"
+
+
+def create(options, positional):
+    path = positional[0]
+    backing = options.get("-b", "")
+    if backing:
+        resolved = backing if os.path.isabs(backing) else os.path.join(os.path.dirname(os.path.abspath(path)), backing)
+        if not os.path.exists(resolved):
+            sys.exit(f"qemu-img: {path}: Could not open '{resolved}': No such file or directory")
+        size = parse_size(positional[1]) if len(positional) > 1 else virtual_size(resolved)
+    else:
+        size = parse_size(positional[1])
+    disk_format = options.get("-f", "raw")
+    print(f"Formatting '{path}', fmt={disk_format} size={size}", flush=True)
+    if disk_format == "qcow2":
+        write_qcow2(path, size, backing)
+        start = QCOW2_HEADER_FILE_SIZE
+    else:
+        with open(path, "wb") as file:
+            file.truncate(size)
+        start = 0
+    if preallocation(options) in ("full", "falloc"):
+        with open(path, "r+b") as file:
+            file.seek(start)
+            copy_at_rate(None, file, max(0, size - start), sparse=False)
+
+
+def resize(options, positional):
+    path, size = positional[0], positional[1]
+    current = virtual_size(path)
+    new_size = current + parse_size(size[1:]) if size.startswith("+") else parse_size(size)
+    if new_size < current and "--shrink" not in options:
+        sys.exit("qemu-img: Use the --shrink option to perform a shrink operation.")
+    set_virtual_size(path, new_size)
+    print("Image resized.", flush=True)
+
+
+def info(options, positional):
+    path = positional[0]
+    try:
+        document = read_disk_header(path)
+    except UnsupportedImage:
+        stat = os.stat(path)
+        document = {
+            "filename": path,
+            "format": os.path.splitext(path)[1].lstrip(".") or "raw",
+            "virtual-size": stat.st_size,
+            "actual-size": getattr(stat, "st_blocks", 0) * 512,
+        }
+    if document["format"] == "qcow2":
+        document.setdefault("dirty-flag", False)
+    print(json.dumps(document, indent=4))
+
+
+def convert(options, positional):
+    source, target = positional[0], positional[1]
+    sparse = options.get("-S", "4k") != "0"
+    size = virtual_size(source)
+    with open(source, "rb") as reader:
+        if options.get("-O") == "qcow2":
+            # The header is all the stand-in keeps of a qcow2 image; the data is only read
+            write_qcow2(target, size)
+            copy_at_rate(reader, None, size, sparse, "-p" in options)
+            return
+        with open(target, "wb") as writer:
+            writer.truncate(size)
+            copy_at_rate(reader, writer, size, sparse, "-p" in options)
+
+
+def rebase(options, positional):
+    path = positional[0]
+    if not is_qcow2(path):
+        sys.exit(f"qemu-img: {path}: not a qcow2 image")
+    size = virtual_size(path)
+    snapshots = read_snapshots(path)
+    copy_at_rate(None, None, min(size, 64 * CHUNK), progress="-p" in options)
+    write_qcow2(path, size, options.get("-b", ""))
+    write_snapshots(path, snapshots)
+
+
+def snapshot(options, positional):
+    path = positional[-1]
+    if not is_qcow2(path):
+        sys.exit(f"qemu-img: {path}: snapshots are only supported by qcow2")
+    snapshots = read_snapshots(path)
+    if "-l" in options:
+        if snapshots:
+            print("Snapshot list:")
+            print(f"{'ID':<8}{'TAG':<24}{'VM SIZE':>10}{'DATE':>22}")
+            for entry in snapshots:
+                date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["date-sec"]))
+                print(f"{entry['id']:<8}{entry['name']:<24}{'0 B':>10}{date:>22}")
+        return
+    name = positional[0]
+    found = [entry for entry in snapshots if name in (entry["name"], entry["id"])]
+    if "-c" in options:
+        if found:
+            sys.exit(f"qemu-img: Could not create snapshot '{name}': snapshot already exists")
+        now = time.time()
+        ident = str(max([int(entry["id"]) for entry in snapshots] + [0]) + 1)
+        snapshots.append({"id": ident, "name": name, "date-sec": int(now), "date-nsec": int(now % 1 * 1e9),
+                          "vm-state-size": 0, "disk-size": virtual_size(path)})
+    elif not found:
+        sys.exit(f"qemu-img: Could not {'apply' if '-a' in options else 'delete'} snapshot '{name}': Can't find the snapshot")
+    elif "-a" in options:
+        set_virtual_size(path, found[0]["disk-size"])
+    else:
+        snapshots.remove(found[0])
+    write_snapshots(path, snapshots)
+
+
+def commit(options, positional):
+    path = positional[0]
+    backing = read_disk_header(path).get("full-backing-filename")
+    if not backing:
+        sys.exit(f"qemu-img: {path}: Image does not have a backing file")
+    if not os.access(backing, os.W_OK):
+        sys.exit(f"qemu-img: Could not reopen '{backing}': Permission denied")
+    copy_at_rate(None, None, 16 * CHUNK, progress="-p" in options)
+    print("Image committed.", flush=True)
+
+
+COMMANDS = {"create": create, "resize": resize, "info": info, "convert": convert, "rebase": rebase, "commit": commit,
+            "snapshot": snapshot}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in COMMANDS:
+        sys.exit(f"qemu-img: unsupported command {' '.join(argv[1:2])}")
+    if os.environ.get("FAKE_QEMU_IMG_FAIL"):
+        sys.exit("qemu-img: simulated failure")
+    options, positional = parse_options(argv[2:])
+    try:
+        COMMANDS[argv[1]](options, positional)
+    except (OSError, IndexError, ValueError) as e:
+        sys.exit(f"qemu-img: {e}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# Stand-in for qemu-system-x86_64 that serves QMP, so the VM supervisor can be exercised without QEMU:
+#   QEMU_SYSTEM=./fake_qemu_system.py python "phase two.py"
+# It understands -name, -smp and -qmp unix:PATH / tcp:HOST:PORT and ignores everything else.
+# vCPU threads are named "CPU n/TCG" like QEMU's with debug-threads=on, and burn FAKE_QEMU_CPU_LOAD of a core
+# each while running. Block counters grow at FAKE_QEMU_IO_MBPS; system_powerdown exits after FAKE_QEMU_POWERDOWN_DELAY.
+import os
+import sys
+import json
+import time
+import socket
+import threading
+
+CPU_LOAD = float(os.environ.get("FAKE_QEMU_CPU_LOAD", "0.2"))
+IO_RATE = float(os.environ.get("FAKE_QEMU_IO_MBPS", "20")) * 1024 * 1024
+POWERDOWN_DELAY = float(os.environ.get("FAKE_QEMU_POWERDOWN_DELAY", "0.5"))
+
+
+class FakeVm:
+    def __init__(self, name, vcpus):
+        self.name = name
+        self.vcpus = vcpus
+        self.status = "running"
+        self.lock = threading.Lock()
+        self.io_seconds = 0.0
+        self.resumed = time.monotonic()
+        self.clients = []
+
+    def running(self):
+        return self.status == "running"
+
+    def io_bytes(self):
+        with self.lock:
+            seconds = self.io_seconds + (time.monotonic() - self.resumed if self.running() else 0.0)
+        return int(seconds * IO_RATE)
+
+    def set_status(self, status, event):
+        with self.lock:
+            if self.running():
+                self.io_seconds += time.monotonic() - self.resumed
+            self.status = status
+            self.resumed = time.monotonic()
+        self.broadcast(event)
+
+    def broadcast(self, event):
+        now = time.time()
+        message = {"event": event, "data": {}, "timestamp": {"seconds": int(now), "microseconds": int(now % 1 * 1e6)}}
+        for client in list(self.clients):
+            try:
+                client.sendall(json.dumps(message).encode() + b"\r\n")
+            except OSError:
+                pass
+
+    def execute(self, command):
+        if command == "qmp_capabilities":
+            return {}
+        if command == "query-status":
+            return {"running": self.running(), "singlestep": False, "status": self.status}
+        if command == "stop":
+            self.set_status("paused", "STOP")
+            return {}
+        if command == "cont":
+            self.set_status("running", "RESUME")
+            return {}
+        if command == "system_powerdown":
+            self.broadcast("POWERDOWN")
+            threading.Timer(POWERDOWN_DELAY, self.shutdown).start()
+            return {}
+        if command == "quit":
+            threading.Timer(0.05, lambda: os._exit(0)).start()
+            return {}
+        if command == "query-blockstats":
+            io = self.io_bytes()
+            return [{"device": "", "qdev": "/machine/peripheral-anon/device[0]/virtio-backend", "node-name": "disk0",
+                     "stats": {"rd_bytes": io * 3 // 4, "wr_bytes": io // 4,
+                               "rd_operations": io // 4096 * 3 // 4, "wr_operations": io // 4096 // 4}}]
+        if command == "query-cpus-fast":
+            return [{"cpu-index": index, "thread-id": tid, "target": "x86_64"} for index, tid in enumerate(vcpu_tids)]
+        raise KeyError(command)
+
+    def shutdown(self):
+        self.set_status("shutdown", "SHUTDOWN")
+        os._exit(0)
+
+
+vcpu_tids = []
+
+
+def vcpu(vm, index):
+    if sys.platform.startswith("linux"):
+        import ctypes
+
+        ctypes.CDLL(None).prctl(15, f"CPU {index}/TCG".encode(), 0, 0, 0)
+    vcpu_tids.append(threading.get_native_id())
+    while True:
+        if vm.running() and CPU_LOAD > 0:
+            end = time.perf_counter() + 0.01 * CPU_LOAD
+            while time.perf_counter() < end:
+                pass
+            time.sleep(0.01 * (1 - CPU_LOAD))
+        else:
+            time.sleep(0.05)
+
+
+def serve_client(vm, client):
+    greeting = {"QMP": {"version": {"qemu": {"micro": 0, "minor": 0, "major": 9}, "package": "fake"}, "capabilities": []}}
+    client.sendall(json.dumps(greeting).encode() + b"\r\n")
+    vm.clients.append(client)
+    try:
+        for line in client.makefile("rb"):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                reply = {"return": vm.execute(request["execute"])}
+            except KeyError as e:
+                reply = {"error": {"class": "CommandNotFound", "desc": f"The command {e.args[0]} has not been found"}}
+            except ValueError as e:
+                reply = {"error": {"class": "GenericError", "desc": str(e)}}
+            client.sendall(json.dumps(reply).encode() + b"\r\n")
+    except OSError:
+        pass
+    finally:
+        vm.clients.remove(client)
+        client.close()
+
+
+def listen(address):
+    kind, _, target = address.split(",")[0].partition(":")
+    if kind == "unix":
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(target)
+    else:
+        host, _, port = target.rpartition(":")
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, int(port)))
+    server.listen(1)
+    return server
+
+
+def main(argv):
+    if argv[1:] == ["-accel", "help"]:
+        print("Accelerators supported in QEMU binary:\ntcg")
+        return
+    options = {}
+    for flag, value in zip(argv[1:], argv[2:]):
+        if flag in ("-name", "-smp", "-qmp"):
+            options[flag] = value
+    vm = FakeVm(options.get("-name", "fake").split(",")[0], int(options.get("-smp", "1").split(",")[0]))
+    for index in range(vm.vcpus):
+        threading.Thread(target=vcpu, args=(vm, index), daemon=True).start()
+    if "-qmp" not in options:
+        while True:
+            time.sleep(3600)
+    server = listen(options["-qmp"])
+    while True:
+        client, _ = server.accept()
+        threading.Thread(target=serve_client, args=(vm, client), daemon=True).start()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,255 @@
+import os
+import re
+import glob
+import time
+from dataclasses import dataclass, field
+
+SYS_ROOT = os.environ.get("CLOUD_SYS_ROOT", "/sys")
+VCPU_THREAD = re.compile(r"^CPU (\d+)/")
+VCPU_PIN_TIMEOUT = 30
+
+
+@dataclass(slots=True)
+class HostCpu:
+    cpu: int
+    socket: int
+    core: int
+    node: int
+
+
+@dataclass(slots=True)
+class HostTopology:
+    cpus: list = field(default_factory=list)
+    sockets: int = 1
+    cores_per_socket: int = 1
+    threads_per_core: int = 1
+    nodes: dict = field(default_factory=dict)
+    hugepages: dict = field(default_factory=dict)
+    hugetlbfs: dict = field(default_factory=dict)
+
+    def summary(self):
+        text = f"{self.sockets} sockets x {self.cores_per_socket} cores x {self.threads_per_core} threads"
+        if len(self.nodes) > 1:
+            text += f", {len(self.nodes)} NUMA nodes"
+        free = [f"{count} free {size_kb // 1024} MB" for size_kb, count in sorted(self.hugepages.items()) if count]
+        if free:
+            text += f", hugepages: {', '.join(free)}"
+        return text
+
+
+@dataclass(slots=True)
+class Placement:
+    sockets: int
+    cores: int
+    threads: int
+    host_cpus: list = field(default_factory=list)
+    node: int = -1
+    hugepage_size_kb: int = 0
+
+
+def parse_cpu_list(text):
+    # "0-3,8,10-11" as used throughout /sys
+    cpus = []
+    for part in text.strip().split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def read_sys(path, default=""):
+    try:
+        with open(path, "r") as file:
+            return file.read().strip()
+    except OSError:
+        return default
+
+
+def read_host_topology(root=SYS_ROOT):
+    online = read_sys(os.path.join(root, "devices/system/cpu/online"))
+    if not online:
+        # No /sys (Windows, macOS): all that is known is the logical CPU count
+        count = os.cpu_count() or 1
+        return HostTopology([HostCpu(cpu, 0, cpu, 0) for cpu in range(count)], 1, count, 1, {0: list(range(count))})
+
+    node_of = {}
+    nodes = {}
+    for node_path in glob.glob(os.path.join(root, "devices/system/node/node[0-9]*")):
+        node = int(os.path.basename(node_path)[4:])
+        nodes[node] = parse_cpu_list(read_sys(os.path.join(node_path, "cpulist")))
+        node_of.update({cpu: node for cpu in nodes[node]})
+
+    cpus = []
+    for cpu in parse_cpu_list(online):
+        topology = os.path.join(root, f"devices/system/cpu/cpu{cpu}/topology")
+        socket = int(read_sys(os.path.join(topology, "physical_package_id"), "0"))
+        core = int(read_sys(os.path.join(topology, "core_id"), str(cpu)))
+        cpus.append(HostCpu(cpu, socket, core, node_of.get(cpu, 0)))
+    if not nodes:
+        nodes = {0: [host_cpu.cpu for host_cpu in cpus]}
+
+    sockets = {host_cpu.socket for host_cpu in cpus}
+    cores = {(host_cpu.socket, host_cpu.core) for host_cpu in cpus}
+    hugepages = {}
+    for pool in glob.glob(os.path.join(root, "kernel/mm/hugepages/hugepages-*kB")):
+        size_kb = int(os.path.basename(pool)[len("hugepages-"):-2])
+        hugepages[size_kb] = int(read_sys(os.path.join(pool, "free_hugepages"), "0"))
+    return HostTopology(cpus, len(sockets), max(1, len(cores) // len(sockets)), max(1, len(cpus) // len(cores)),
+                        nodes, hugepages, hugetlbfs_mounts())
+
+
+def hugetlbfs_mounts():
+    # {page size in kB: mount point}; a mount without pagesize= uses the 2 MB default
+    mounts = {}
+    try:
+        with open("/proc/mounts", "r") as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) > 3 and fields[2] == "hugetlbfs":
+                    size = re.search(r"pagesize=(\d+)([KMG])", fields[3])
+                    size_kb = int(size.group(1)) * {"K": 1, "M": 1024, "G": 1024**2}[size.group(2)] if size else 2048
+                    mounts.setdefault(size_kb, fields[1])
+    except OSError:
+        pass
+    return mounts
+
+
+host_topology = None
+
+def get_host_topology():
+    global host_topology
+    if host_topology is None:
+        host_topology = read_host_topology()
+    return host_topology
+
+
+def hugepage_size(host, memory_mb):
+    # Largest page size with enough free pages for all of guest RAM, or 0 when none has
+    for size_kb in sorted(host.hugepages, reverse=True):
+        if memory_mb * 1024 % size_kb == 0 and host.hugepages[size_kb] * size_kb >= memory_mb * 1024:
+            return size_kb
+    return 0
+
+
+def guest_shape(vcpus, host):
+    # Mirror the host: SMT siblings only when the count splits evenly, and no more cores per socket than the host has
+    threads = host.threads_per_core if vcpus % host.threads_per_core == 0 else 1
+    cores = vcpus // threads
+    sockets = 1
+    while cores > host.cores_per_socket and cores % 2 == 0:
+        sockets *= 2
+        cores //= 2
+    return sockets, cores, threads
+
+
+def pin_plan(vcpus, threads, host):
+    # Whole host cores in guest-thread-sized groups, from one NUMA node when it is big enough so memory stays local
+    by_core = {}
+    for host_cpu in host.cpus:
+        by_core.setdefault((host_cpu.node, host_cpu.socket, host_cpu.core), []).append(host_cpu.cpu)
+    for node in sorted(host.nodes, key=lambda node: -len(host.nodes[node])):
+        groups = [sorted(cpus)[:threads] for (core_node, _, _), cpus in sorted(by_core.items())
+                  if core_node == node and len(cpus) >= threads]
+        if len(groups) * threads >= vcpus:
+            return [cpu for group in groups for cpu in group][:vcpus], node
+    spread = [cpu for _, cpus in sorted(by_core.items()) for cpu in sorted(cpus)]
+    if len(spread) < vcpus:
+        raise ValueError(f"Cannot pin {vcpus} vCPUs to {len(spread)} host CPUs.")
+    return spread[:vcpus], -1
+
+
+def plan_placement(vcpus, memory_mb, host, match_topology=True, pin=False, hugepages=False):
+    sockets, cores, threads = guest_shape(vcpus, host) if match_topology else (1, vcpus, 1)
+    placement = Placement(sockets, cores, threads)
+    if pin:
+        placement.host_cpus, node = pin_plan(vcpus, threads, host)
+        # Binding memory only means something when there is more than one node to choose from
+        placement.node = node if len(host.nodes) > 1 else -1
+    if hugepages:
+        placement.hugepage_size_kb = hugepage_size(host, memory_mb)
+        if not placement.hugepage_size_kb:
+            free = ", ".join(f"{count} x {size_kb // 1024} MB" for size_kb, count in sorted(host.hugepages.items()))
+            raise ValueError(f"Not enough free hugepages for {memory_mb} MB ({free or 'none reserved'}).")
+    return placement
+
+
+def smp_arg(vcpus, placement):
+    return f"{vcpus},sockets={placement.sockets},cores={placement.cores},threads={placement.threads}"
+
+
+def memory_args(memory_mb, placement, host=None):
+    # Guest RAM as an explicit backend: hugepage-backed memfd (or hugetlbfs file) and/or bound to the pinned node
+    if not placement.hugepage_size_kb and placement.node < 0:
+        return []
+    options = ["id=mem0", f"size={memory_mb}M"]
+    if placement.hugepage_size_kb:
+        host = host or get_host_topology()
+        mount = host.hugetlbfs.get(placement.hugepage_size_kb)
+        if mount:
+            # An existing hugetlbfs mount is what the admin set up; memfd needs no mount at all
+            backend = "memory-backend-file"
+            options.append(f"mem-path={mount}")
+        else:
+            backend = "memory-backend-memfd"
+            options += ["hugetlb=on", f"hugetlbsize={placement.hugepage_size_kb}K"]
+        # Fault every page in at start: a VM that cannot get its hugepages fails now, not mid-run
+        options.append("prealloc=on")
+    else:
+        backend = "memory-backend-ram"
+    if placement.node >= 0:
+        options += [f"host-nodes={placement.node}", "policy=bind"]
+    return ["-object", f"{backend},{','.join(options)}", "-machine", "memory-backend=mem0"]
+
+
+def vcpu_threads(pid):
+    # QEMU names vCPU threads "CPU <n>/KVM" (or /TCG) when started with -name ...,debug-threads=on
+    threads = {}
+    for task in glob.glob(f"/proc/{pid}/task/*"):
+        match = VCPU_THREAD.match(read_sys(os.path.join(task, "comm")))
+        if match:
+            threads[int(match.group(1))] = int(os.path.basename(task))
+    return threads
+
+
+def pin_vcpus(pid, placement, timeout=VCPU_PIN_TIMEOUT):
+    if not hasattr(os, "sched_setaffinity"):
+        raise OSError("CPU pinning needs sched_setaffinity (Linux).")
+    deadline = time.monotonic() + timeout
+    while True:
+        threads = vcpu_threads(pid)
+        if len(threads) >= len(placement.host_cpus):
+            break
+        if time.monotonic() > deadline or not os.path.exists(f"/proc/{pid}"):
+            raise OSError(f"Found {len(threads)} of {len(placement.host_cpus)} vCPU threads.")
+        time.sleep(0.1)
+    for index, cpu in enumerate(placement.host_cpus):
+        os.sched_setaffinity(threads[index], {cpu})
+    # Emulator and I/O threads stay off the pinned cores, and on the same node when memory is bound to one
+    host = get_host_topology()
+    allowed = host.nodes.get(placement.node, []) if placement.node >= 0 else [host_cpu.cpu for host_cpu in host.cpus]
+    others = set(allowed) - set(placement.host_cpus) or set(placement.host_cpus)
+    for task in glob.glob(f"/proc/{pid}/task/*"):
+        tid = int(os.path.basename(task))
+        if tid not in threads.values():
+            try:
+                os.sched_setaffinity(tid, others)
+            except OSError:
+                continue
+    return len(placement.host_cpus)
+
+
+if __name__ == "__main__":
+    import sys
+
+    host = get_host_topology()
+    print(host.summary())
+    for node, cpus in sorted(host.nodes.items()):
+        print(f"node {node}: cpus {cpus}")
+    vcpus = int(sys.argv[1]) if len(sys.argv) > 1 else len(host.cpus)
+    memory_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    placement = plan_placement(vcpus, memory_mb, host, pin=len(host.cpus) >= vcpus)
+    print("-smp", smp_arg(vcpus, placement))
+    print("pinning", placement.host_cpus or "off", "node", placement.node)
+    print(" ".join(memory_args(memory_mb, placement, host)))
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+HUB_API_URL = os.environ.get("DOCKERHUB_API_URL", "https://hub.docker.com")
+HUB_CACHE_FILE = "dockerhub_cache.json"
+HUB_CACHE_TTL = 6 * 60 * 60
+HUB_CACHE_MAX_ENTRIES = 2000
+
+# Only these fields of the repository document are kept, so the file stays small
+KEPT_FIELDS = ("pull_count", "star_count", "description", "last_updated")
+
+
+def split_repository(name):
+    namespace = 'library' if '/' not in name else name.split('/', 1)[0]
+    repo = name if '/' not in name else name.split('/', 1)[1]
+    return namespace, repo
+
+
+class HubMetadataCache:
+    def __init__(self, path=HUB_CACHE_FILE, ttl=HUB_CACHE_TTL, max_entries=HUB_CACHE_MAX_ENTRIES, api_url=HUB_API_URL):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.api_url = api_url.rstrip("/")
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        # Stored oldest-used first, so insertion order restores the LRU order
+        for key, entry in stored.get("entries", []):
+            self.entries[key] = entry
+        self.evict()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty or not self.path:
+                return
+            snapshot = {"entries": list(self.entries.items())}
+            self.dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(snapshot, file)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            with self.lock:
+                self.dirty = True
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, etag=None):
+        with self.lock:
+            self.entries[key] = {"fetched": time.time(), "etag": etag, "data": data}
+            self.entries.move_to_end(key)
+            self.evict()
+            self.dirty = True
+
+    def touch(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["fetched"] = time.time()
+                self.dirty = True
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched"] < self.ttl
+
+    def fresh(self, key):
+        entry = self.get(key)
+        return entry["data"] if self.is_fresh(entry) else None
+
+    def repository(self, session, name, timeout=5):
+        namespace, repo = split_repository(name)
+        key = f"repo:{namespace}/{repo}"
+        entry = self.get(key)
+        if self.is_fresh(entry):
+            return entry["data"]
+
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        try:
+            response = session.get(f"{self.api_url}/v2/repositories/{namespace}/{repo}/", headers=headers, timeout=timeout)
+            if response.status_code == 304 and entry is not None:
+                self.touch(key)
+                return entry["data"]
+            response.raise_for_status()
+        except Exception:
+            # Hub unreachable: a stale answer is better than an empty column
+            if entry is not None:
+                return entry["data"]
+            raise
+
+        document = response.json()
+        data = {field: document.get(field) for field in KEPT_FIELDS}
+        self.put(key, data, response.headers.get("ETag"))
+        return data
+
+    def search_results(self, query, allow_stale=False):
+        entry = self.get(f"search:{query}")
+        if entry is None:
+            return None
+        if allow_stale or self.is_fresh(entry):
+            return entry["data"]
+        return None
+
+    def store_search_results(self, query, rows):
+        self.put(f"search:{query}", rows)
+
+
+def run_benchmark(names=50, rounds=3):
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import requests
+
+    hits = {"count": 0}
+
+    class FakeHubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits["count"] += 1
+            etag = f'"{self.path}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps({"pull_count": 1234567, "star_count": 42, "description": "stand-in"}).encode()
+            time.sleep(0.02)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "cache.json")
+        session = requests.Session()
+        repositories = [f"bench/repo{i}" for i in range(names)]
+
+        def timed_round(label, cache):
+            before = hits["count"]
+            start = time.perf_counter()
+            for name in repositories:
+                cache.repository(session, name)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<28} {elapsed * 1000:9.2f} ms  {hits['count'] - before:4d} requests")
+
+        cache = HubMetadataCache(cache_path, api_url=api_url)
+        timed_round("cold", cache)
+        for i in range(rounds):
+            timed_round(f"warm #{i + 1}", cache)
+        cache.save()
+
+        reloaded = HubMetadataCache(cache_path, api_url=api_url)
+        timed_round("warm after reload", reloaded)
+
+        reloaded.ttl = 0
+        timed_round("expired (ETag revalidate)", reloaded)
+
+        server.shutdown()
+        server.server_close()
+        timed_round("expired, Hub unreachable", reloaded)
+
+
+if __name__ == "__main__":
+    run_benchmark()
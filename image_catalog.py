@@ -0,0 +1,106 @@
+import time
+import bisect
+import threading
+
+from docker_engine import get_docker_client
+
+CATALOG_MAX_AGE = 30
+SORT_KEYS = {
+    "name": (lambda image: (image.repository, image.tag), False),
+    "size": (lambda image: image.size, True),
+    "age": (lambda image: image.created, True),
+}
+
+
+def image_key(image):
+    return (image.id, image.repository, image.tag)
+
+
+def index_terms(image):
+    # "bitnami/nginx:1.25" is findable as "bitnami/nginx", "nginx", "1.25" and "bitnami/nginx:1.25"
+    repository = image.repository.lower()
+    tag = image.tag.lower()
+    terms = {repository, tag, f"{repository}:{tag}"}
+    terms.update(part for part in repository.split("/") if part)
+    return terms
+
+
+def is_subsequence(query, text):
+    position = 0
+    for char in query:
+        position = text.find(char, position) + 1
+        if not position:
+            return False
+    return True
+
+
+class ImageCatalog:
+    def __init__(self, client=None, max_age=CATALOG_MAX_AGE):
+        self.client = client or get_docker_client()
+        self.max_age = max_age
+        self.records = {}
+        self.index = []
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def refresh(self, force=False):
+        if not force and self.loaded_at is not None and time.monotonic() - self.loaded_at < self.max_age:
+            return
+        # One listing call, then only the records that changed are re-indexed
+        fresh = {image_key(image): image for image in self.client.images()}
+        with self.lock:
+            if not self.records:
+                self.index = sorted((term, key) for key, image in fresh.items() for term in index_terms(image))
+            else:
+                for key in self.records.keys() - fresh.keys():
+                    self.unindex(key, self.records[key])
+                for key in fresh.keys() - self.records.keys():
+                    for term in index_terms(fresh[key]):
+                        bisect.insort(self.index, (term, key))
+            self.records = fresh
+            self.loaded_at = time.monotonic()
+
+    def unindex(self, key, image):
+        for term in index_terms(image):
+            position = bisect.bisect_left(self.index, (term, key))
+            if position < len(self.index) and self.index[position] == (term, key):
+                del self.index[position]
+
+    def prefix_matches(self, prefix):
+        keys = set()
+        position = bisect.bisect_left(self.index, (prefix,))
+        while position < len(self.index) and self.index[position][0].startswith(prefix):
+            keys.add(self.index[position][1])
+            position += 1
+        return keys
+
+    def search(self, query, sort_by="name"):
+        query = query.strip().lower()
+        with self.lock:
+            if not query:
+                keys = set(self.records)
+            else:
+                keys = self.prefix_matches(query)
+                if not keys and ":" in query:
+                    repository, _, tag = query.partition(":")
+                    keys = {key for key in self.prefix_matches(repository) if key[2].lower().startswith(tag)}
+                if not keys:
+                    # Nothing starts with the query: fall back to a fuzzy (in-order letters) match
+                    keys = {key for key, image in self.records.items()
+                            if is_subsequence(query, f"{image.repository}:{image.tag}".lower())}
+            results = [self.records[key] for key in keys]
+        sort_key, reverse = SORT_KEYS.get(sort_by, SORT_KEYS["name"])
+        results.sort(key=sort_key, reverse=reverse)
+        return results
+
+
+image_catalog = None
+
+def get_image_catalog():
+    global image_catalog
+    if image_catalog is None:
+        image_catalog = ImageCatalog()
+    return image_catalog
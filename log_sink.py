@@ -0,0 +1,51 @@
+import os
+import threading
+from collections import deque
+
+LOG_CAPACITY = 5000
+LOG_FLUSH_INTERVAL_MS = 16
+LOG_SPILL_FILE = os.environ.get("CLOUD_LOG_SPILL_FILE")
+
+
+class LogSink:
+    # Toolkit-neutral part of the output box sink: a bounded buffer of lines waiting for the
+    # next flush, and an optional spill file that keeps everything the widget trims away
+    def __init__(self, capacity=LOG_CAPACITY, spill_path=LOG_SPILL_FILE):
+        self.capacity = capacity
+        self.pending = deque(maxlen=capacity)
+        self.dropped = 0
+        self.scheduled = False
+        self.lock = threading.Lock()
+        self.spill = open(spill_path, "a", encoding="utf-8") if spill_path else None
+
+    def write(self, message):
+        # Returns True when the caller has to schedule a flush
+        lines = message.split("\n")
+        with self.lock:
+            # Lines pushed out before they were ever shown would be trimmed from the widget anyway
+            self.dropped += max(0, len(self.pending) + len(lines) - self.capacity)
+            self.pending.extend(lines)
+            if self.spill is not None:
+                self.spill.write(message + "\n")
+            schedule = not self.scheduled
+            self.scheduled = True
+        return schedule
+
+    def take(self):
+        with self.lock:
+            lines = list(self.pending)
+            dropped = self.dropped
+            self.pending.clear()
+            self.dropped = 0
+            self.scheduled = False
+            if self.spill is not None:
+                self.spill.flush()
+        if dropped:
+            lines.insert(0, f"... {dropped} earlier lines not shown ...")
+        return lines
+
+    def close(self):
+        with self.lock:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
@@ -0,0 +1,138 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import threading
+
+KDF_SCHEME = "scrypt"
+KDF_TARGET_MS = int(os.environ.get("CLOUD_KDF_TARGET_MS", "150"))
+KDF_BLOCK_SIZE = 8
+KDF_PARALLELISM = 1
+KDF_MIN_LOG_N = 14
+# 2^16 with r=8 is 64 MiB per derivation; a fast host gets more work from the target, never more memory
+KDF_MAX_LOG_N = 16
+# Calibration on a busy host lands a step or so lower; only a larger gap is worth a rehash
+KDF_REHASH_TOLERANCE = 1
+KDF_SALT_BYTES = 16
+KDF_KEY_BYTES = 32
+
+calibration_lock = threading.Lock()
+calibrated_log_n = None
+dummy_hash = None
+
+
+def scrypt_memory(log_n, r):
+    # scrypt needs 128 * r * N bytes; OpenSSL refuses anything over maxmem
+    return 128 * r * (1 << log_n)
+
+
+def derive(password, salt, log_n, r, p):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=1 << log_n, r=r, p=p,
+                          maxmem=2 * scrypt_memory(log_n, r) + (1 << 20), dklen=KDF_KEY_BYTES)
+
+
+def calibrate(target_ms=KDF_TARGET_MS):
+    # Double N until one derivation takes at least the target or the memory cap is reached
+    salt = os.urandom(KDF_SALT_BYTES)
+    log_n = KDF_MIN_LOG_N
+    while log_n < KDF_MAX_LOG_N:
+        start = time.perf_counter()
+        derive("calibration", salt, log_n, KDF_BLOCK_SIZE, KDF_PARALLELISM)
+        if (time.perf_counter() - start) * 1000 >= target_ms:
+            break
+        log_n += 1
+    return log_n
+
+
+def current_log_n():
+    global calibrated_log_n
+    with calibration_lock:
+        if calibrated_log_n is None:
+            calibrated_log_n = calibrate()
+        return calibrated_log_n
+
+
+def encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password, log_n=None):
+    log_n = log_n or current_log_n()
+    salt = os.urandom(KDF_SALT_BYTES)
+    key = derive(password, salt, log_n, KDF_BLOCK_SIZE, KDF_PARALLELISM)
+    return f"{KDF_SCHEME}${log_n}${KDF_BLOCK_SIZE}${KDF_PARALLELISM}${encode(salt)}${encode(key)}"
+
+
+def is_hashed(stored):
+    return stored.startswith(KDF_SCHEME + "$")
+
+
+def verify_password(password, stored):
+    if stored is None:
+        # Unknown user: spend the same time as a real check so names cannot be probed by timing
+        global dummy_hash
+        if dummy_hash is None:
+            dummy_hash = hash_password("")
+        verify_password(password, dummy_hash)
+        return False
+    if not is_hashed(stored):
+        # Entry from before hashing; the caller rehashes it once the login succeeds
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        _, log_n, r, p, salt, key = stored.split("$")
+        expected = base64.b64decode(key)
+        actual = derive(password, base64.b64decode(salt), int(log_n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    if not is_hashed(stored):
+        return True
+    # Entries hashed on a slower host (or with an older target) are upgraded to today's cost, and ones
+    # over the memory cap come down to it. Within the tolerance they stay, so a calibration that varies
+    # by a step between runs does not rewrite every password it sees
+    log_n = int(stored.split("$")[1])
+    return log_n > KDF_MAX_LOG_N or log_n < current_log_n() - KDF_REHASH_TOLERANCE
+
+
+def run_benchmark(logins=100, seconds=3):
+    from concurrent.futures import ThreadPoolExecutor
+
+    start = time.perf_counter()
+    log_n = current_log_n()
+    print(f"calibrated N=2^{log_n} r={KDF_BLOCK_SIZE} p={KDF_PARALLELISM} "
+          f"({scrypt_memory(log_n, KDF_BLOCK_SIZE) >> 20} MiB) in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"for a {KDF_TARGET_MS} ms target")
+
+    stored = hash_password("correct horse 1!")
+    latencies = []
+    for i in range(logins):
+        start = time.perf_counter()
+        verify_password("correct horse 1!" if i % 2 else "wrong", stored)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"login verify over {logins} attempts: p50 {p50:.1f} ms  p99 {p99:.1f} ms")
+
+    # hashlib.scrypt releases the GIL, so one thread per core saturates the host
+    cores = os.cpu_count() or 1
+    deadline = time.perf_counter() + seconds
+
+    def hash_until_deadline():
+        count = 0
+        while time.perf_counter() < deadline:
+            hash_password("benchmark", log_n)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(max_workers=cores) as executor:
+        total = sum(executor.map(lambda _: hash_until_deadline(), range(cores)))
+    print(f"{total / seconds:.1f} hashes/s on {cores} cores = {total / seconds / cores:.1f} hashes/s/core")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,15 +1,33 @@
 import sys
 import subprocess
-import json
 import os
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QAbstractItemView, QHeaderView, QTableWidgetItem, QTableWidget, QTabWidget,QTextEdit, QSpinBox, QInputDialog, QFileDialog, QMessageBox, QComboBox, QHBoxLayout, QApplication, QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel, QStackedWidget, QMainWindow
+import sqlite3
+import time
+import bisect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import Qt, QObject, QTimer, Signal, QAbstractTableModel, QModelIndex
+from PySide6.QtWidgets import QCheckBox, QAbstractItemView, QHeaderView, QTableWidgetItem, QTableWidget, QTableView, QTabWidget,QTextEdit, QSpinBox, QDoubleSpinBox, QInputDialog, QFileDialog, QMessageBox, QComboBox, QHBoxLayout, QApplication, QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel, QStackedWidget, QMainWindow
 from PySide6.QtGui import QFont
 import requests
+from requests.adapters import HTTPAdapter
+from docker_engine import CONTAINER_EVENT_ACTIONS, BuildProgress, CancelToken, OperationCancelled, PullProgress, build_lines, format_size, ContainerInventory, DockerEngineError, event_action, event_container_id, get_docker_client, format_images, format_containers
+from image_catalog import get_image_catalog
+from hub_cache import HubMetadataCache, split_repository
+from user_store import open_user_store
+from password_hash import hash_password, needs_rehash, verify_password
+from log_sink import LOG_FLUSH_INTERVAL_MS, LogSink
+from disk_catalog import DiskCatalog, get_disk_catalog
+from host_topology import get_host_topology, pin_vcpus, plan_placement
+from vm_launch import AIO_MODES, CACHE_MODES, STORAGE_BUSES, StorageOptions, disk_format, format_command, get_launch_profiles, launch_command, save_vm_config, storage_defaults, storage_error, vm_disk_error, vm_name_error, vm_resources_error
+from vm_supervisor import QmpError, VmSupervisor
+from vm_batch import VM_LAUNCH_RATE, BatchLauncher, batch_configs, read_vm_specs
+from disk_snapshots import EXTERNAL, INTERNAL, SNAPSHOT_COLUMNS, create_external_snapshot, delete_external_command, disk_in_use_error, list_snapshots, remove_frozen, revert_external_snapshot, snapshot_command, snapshot_name_error
+from disk_jobs import CONVERT_COMPRESSION, DISK_JOBS_PER_DEVICE, DONE, FINISHED_STATES, DiskJob, DiskJobScheduler, check_convert, check_create, check_overlay, convert_compression_error, check_resize, commit_command, convert_command, create_command, flatten_command, native_create, overlay_command, preallocation_modes, parse_disk_size, read_batch_csv, resize_command
 
 special_chars = ['!', '@', '#', '$', '%', '^', '&', '*', '(', ')', '-', '_', '+', '=', '~', '`', '[', '{', ']', '}', '\\', '|', ';', ':', '"', "'", '<', ',', '>', '.', '/', '?']
 
-qemu_path = r"C:\newww\ucrt64\bin\qemu-img.exe"
+qemu_path = os.environ.get("QEMU_IMG", r"C:\newww\ucrt64\bin\qemu-img.exe")
 
 DARK_BG = "#1e1e1e"
 DARK_TEXT = "#ffffff"
@@ -18,8 +36,240 @@ ACCENT_CYAN = "#00ffff"
 TEXTBOX_BG = "#2d2d2d"
 TEXTBOX_FG = "#ffffff"
 
+HUB_LOOKUP_WORKERS = 8
+PULL_CONCURRENCY = 3
+BULK_ACTION_WORKERS = 16
+BULK_ACTIONS = ["Stop", "Restart", "Kill", "Remove"]
+PULL_COUNT_PLACEHOLDER = "..."
+
+TABLE_STYLE = """
+    QHeaderView::section {
+    background-color: #d3d3d3;  /* Light grey background for header */
+    color: black;  /* Black text color for header */
+    font-weight: bold;  /* Bold header text */
+    }
+    QTableView::item {
+    background-color: #e0e0e0;  /* Grey background for data cells */
+    color: black;
+    }
+    QTableView::item:selected {
+    background-color: #007acc;
+    color: white;
+    }
+"""
+
+def sort_key(value):
+    # Numbers shown with thousands separators ("1,234") sort numerically, everything else as text
+    try:
+        return (0, float(value.replace(",", "")), "")
+    except (ValueError, AttributeError):
+        return (1, 0.0, str(value).lower())
+
+class RowTableModel(QAbstractTableModel):
+    # Rows are stored once as tuples of display strings; sorting and filtering only
+    # reorder the list of source row numbers that the view sees
+    def __init__(self, headers, centered_columns=(), parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.centered_columns = set(centered_columns)
+        self.rows = []
+        self.order = []
+        self.positions = {}
+        self.filter_text = ""
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.rows[self.order[index.row()]][index.column()]
+        if role == Qt.TextAlignmentRole and index.column() in self.centered_columns:
+            return int(Qt.AlignCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        self.sort_column = column
+        self.sort_order = order
+        self.apply_view()
+        self.endResetModel()
+
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.strip().lower()
+        self.apply_view()
+        self.endResetModel()
+
+    def matches(self, row):
+        return not self.filter_text or any(self.filter_text in value.lower() for value in row)
+
+    def apply_view(self):
+        self.order = [i for i, row in enumerate(self.rows) if self.matches(row)]
+        if 0 <= self.sort_column < len(self.headers):
+            column = self.sort_column
+            self.order.sort(key=lambda i: sort_key(self.rows[i][column]), reverse=self.sort_order == Qt.DescendingOrder)
+        self.positions = {source: position for position, source in enumerate(self.order)}
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = [tuple(row) for row in rows]
+        self.apply_view()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_rows([])
+
+    def append_rows(self, rows):
+        start = len(self.rows)
+        self.rows.extend(tuple(row) for row in rows)
+        new_rows = [i for i in range(start, len(self.rows)) if self.matches(self.rows[i])]
+        if not new_rows:
+            return
+        if 0 <= self.sort_column < len(self.headers):
+            self.beginResetModel()
+            self.apply_view()
+            self.endResetModel()
+            return
+        first = len(self.order)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+        for source in new_rows:
+            self.positions[source] = len(self.order)
+            self.order.append(source)
+        self.endInsertRows()
+
+    def view_position(self, source_row, values):
+        # Where a row about to be inserted at source_row lands in the current order: after every row
+        # apply_view() would put first, with ties kept in source order as its stable sort does
+        if not 0 <= self.sort_column < len(self.headers):
+            return bisect.bisect_left(self.order, source_row)
+        column = self.sort_column
+        key = sort_key(values[column])
+        descending = self.sort_order == Qt.DescendingOrder
+        for position, source in enumerate(self.order):
+            other = sort_key(self.rows[source][column])
+            if other == key:
+                if source >= source_row:
+                    return position
+            elif (other < key) == descending:
+                return position
+        return len(self.order)
+
+    def insert_row(self, source_row, values):
+        # Only the inserted row is announced; the rows below it are renumbered, not reset
+        values = tuple(values)
+        position = self.view_position(source_row, values) if self.matches(values) else None
+        if position is not None:
+            self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(source_row, values)
+        self.order = [source + 1 if source >= source_row else source for source in self.order]
+        if position is not None:
+            self.order.insert(position, source_row)
+        self.positions = {source: position for position, source in enumerate(self.order)}
+        if position is not None:
+            self.endInsertRows()
+
+    def remove_row(self, source_row):
+        position = self.positions.get(source_row)
+        if position is not None:
+            self.beginRemoveRows(QModelIndex(), position, position)
+        del self.rows[source_row]
+        self.order = [source - 1 if source > source_row else source for source in self.order if source != source_row]
+        self.positions = {source: position for position, source in enumerate(self.order)}
+        if position is not None:
+            self.endRemoveRows()
+
+    def update_row(self, source_row, values):
+        # Changed rows keep their place until the next sort or filter
+        values = tuple(values)
+        if self.rows[source_row] == values:
+            return
+        self.rows[source_row] = values
+        position = self.positions.get(source_row)
+        if position is not None:
+            self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.headers) - 1))
+
+    def set_cell(self, source_row, column, value):
+        row = self.rows[source_row]
+        self.update_row(source_row, row[:column] + (value,) + row[column + 1:])
+
+    def source_row_count(self):
+        return len(self.rows)
+
+    def row_values(self, position):
+        return self.rows[self.order[position]]
+
+class FilterableTable(QWidget):
+    def __init__(self, headers, centered_columns=(), selectable=True):
+        super().__init__()
+        self.model = RowTableModel(headers, centered_columns, self)
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter...")
+        self.filter_input.textChanged.connect(self.model.set_filter)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setWordWrap(False)
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(24)
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.view.setSortingEnabled(True)
+        if selectable:
+            self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+            self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        else:
+            self.view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.view.setStyleSheet(TABLE_STYLE)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.filter_input)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+class QtLogSink(QObject):
+    flush_requested = Signal()
+
+    def __init__(self, log_widget):
+        super().__init__(log_widget)
+        self.log_widget = log_widget
+        self.buffer = LogSink()
+        # The document itself drops its oldest lines past the capacity
+        log_widget.document().setMaximumBlockCount(self.buffer.capacity)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.timer.timeout.connect(self.flush)
+        self.flush_requested.connect(self.timer.start)
+
+    def write(self, message):
+        if self.buffer.write(message):
+            self.flush_requested.emit()
+
+    def flush(self):
+        lines = self.buffer.take()
+        if lines:
+            self.log_widget.append("\n".join(lines))
+
 def gui_log(log_widget, message):
-    log_widget.append(message)
+    # Lines are batched and written at most once per frame
+    sink = getattr(log_widget, "log_sink", None)
+    if sink is None:
+        sink = log_widget.log_sink = QtLogSink(log_widget)
+    sink.write(message)
 
 def create_dockerfile(save_path, content, log_widget):
     try:
@@ -31,144 +281,251 @@ def create_dockerfile(save_path, content, log_widget):
         gui_log(log_widget, f"Error creating Dockerfile: {e}")
         return False
 
+class ImageBuildJob(QObject):
+    output = Signal(str)
+    build_finished = Signal(bool, str)
+
+    def __init__(self, dockerfile_path, image_name, client=None):
+        super().__init__()
+        self.dockerfile_path = dockerfile_path
+        self.image_name = image_name
+        self.client = client or get_docker_client()
+        self.cancel_token = CancelToken()
+        self.progress = BuildProgress()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="docker-build", daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        try:
+            for message in self.client.build(self.dockerfile_path, self.image_name, cancel=self.cancel_token):
+                for line in build_lines(message):
+                    self.output.emit(line)
+                    self.progress.feed(line)
+            self.progress.finish()
+            get_image_catalog().invalidate()
+            self.build_finished.emit(True, f"Image '{self.image_name}' built.\n{self.progress.summary()}")
+        except OperationCancelled:
+            self.build_finished.emit(False, f"Build of '{self.image_name}' cancelled.")
+        except FileNotFoundError:
+            self.build_finished.emit(False, "Error: 'docker' command not found. Ensure Docker is installed and running.")
+        except DockerEngineError as e:
+            self.build_finished.emit(False, f"Error building Docker image: {e}")
+        except Exception as e:
+            self.build_finished.emit(False, f"An unexpected error occurred: {e}")
+
 def build_docker_image(dockerfile_path, image_name, log_widget):
+    # Runs in the background; output is streamed into log_widget line by line
+    job = ImageBuildJob(dockerfile_path, image_name)
+    job.output.connect(lambda line: gui_log(log_widget, line))
+    job.build_finished.connect(lambda ok, message: gui_log(log_widget, message))
+    job.start()
+    return job
+
+def list_docker_images(log_widget):
     try:
-        subprocess.run(["docker", "build", "-t", image_name, "-f", dockerfile_path, os.path.dirname(dockerfile_path)],
-                       check=True, capture_output=True, text=True)
-        gui_log(log_widget, f"Image '{image_name}' built.")
+        gui_log(log_widget, format_images(get_docker_client().images()))
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error building Docker image: {e.stderr}")
-        return False
-    except Exception as e:
-        gui_log(log_widget, f"An unexpected error occurred: {e}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error listing Docker images: {e}")
         return False
 
-def list_docker_images(log_widget):
+def search_local_image(image_name, log_widget, sort_by="name"):
     try:
-        output = subprocess.check_output(["docker", "images"], text=True)
-        gui_log(log_widget, output)
+        catalog = get_image_catalog()
+        catalog.refresh()
+        gui_log(log_widget, format_images(catalog.search(image_name, sort_by)))
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error listing Docker images: {e.stderr}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error searching image '{image_name}': {e}")
         return False
 
-def search_local_image(image_name, log_widget):
+def show_container_inventory(containers_table, inventory):
+    containers_table.model.set_rows(inventory.rows())
+    containers_table.setVisible(True)
+
+def list_running_containers(log_widget, containers_table=None):
     try:
-        output = subprocess.check_output(["docker", "images", image_name], text=True)
-        gui_log(log_widget, output)
+        inventory = get_docker_client().inventory(all=False)
+        gui_log(log_widget, "Running Containers:\n" + format_containers(inventory))
+        if containers_table is not None:
+            show_container_inventory(containers_table, inventory)
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error searching image '{image_name}': {e.stderr}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error listing running containers: {e}")
         return False
 
-def list_running_containers(log_widget):
+def list_all_containers(log_widget, containers_table=None):
     try:
-        output = subprocess.check_output(["docker", "ps"], text=True)
-        gui_log(log_widget, "Running Containers:\n" + output)
+        # One batched listing covers ports, status, image and names for every container
+        inventory = get_docker_client().inventory()
+        gui_log(log_widget, "All Containers:\n" + format_containers(inventory))
+        if containers_table is not None:
+            show_container_inventory(containers_table, inventory)
         return True
     except FileNotFoundError:
         gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
         return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error listing running containers: {e.stderr}")
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error listing containers: {e}")
         return False
 
-import subprocess
-
-def list_all_containers(log_widget):
+def stop_container(container_id, log_widget):
     try:
-        containers = subprocess.check_output([
-            "docker", "ps", "-a",
-            "--format",
-            "{{.ID}}\t{{.Image}}\t{{.Command}}\t{{.RunningFor}}\t{{.Status}}\t{{.Ports}}\t{{.Names}}"
-        ], text=True).strip().split('\n')
-
-        header = f"{'CONTAINER ID':<15} {'IMAGE':<20} {'COMMAND':<20} {'CREATED':<15} {'STATUS':<25} {'PORTS':<25} {'NAMES':<15}"
-        lines = [header]
-
-        for line in containers:
-            parts = line.split('\t')
-
-            if len(parts) < 7:
-                continue
-            container_id, image, command, created, status, ports, names = parts
+        get_docker_client().stop(container_id)
+        gui_log(log_widget, f"Container '{container_id}' stopped successfully.")
+        return True
+    except DockerEngineError as e:
+        gui_log(log_widget, f"Error stopping container '{container_id}': {e}")
+        return False
+    except FileNotFoundError:
+        gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
+        return False
 
-            # Shorten long command for neatness
-            command = (command[:17] + '...') if len(command) > 20 else command
+class DockerHubLookups(QObject):
+    pull_count_ready = Signal(int, int, str)
+    search_ready = Signal(int, str, object, str)
 
-            # Try to get ports explicitly using 'docker port'
-            try:
-                port_output = subprocess.check_output(
-                    ["docker", "port", container_id],
-                    text=True,
-                    stderr=subprocess.DEVNULL
-                ).strip()
-
-                if port_output:
-                    # Join multiple ports with comma if multiple lines
-                    ports = ", ".join(port_output.splitlines())
-                else:
-                    # If empty, keep the original ports field (may be empty)
-                    ports = ports if ports else "N/A"
-            except subprocess.CalledProcessError:
-                # If error, fallback to original ports or N/A
-                ports = ports if ports else "N/A"
+    def __init__(self, max_workers=HUB_LOOKUP_WORKERS):
+        super().__init__()
+        # One keep-alive session shared by all workers, pooled to the worker count
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hub-lookup")
+        self.cache = HubMetadataCache()
+        self.generation = 0
+        self.futures = []
+        self.results_table = None
+        self.output_box = None
+        self.status_label = None
+        self.pull_count_ready.connect(self.apply_pull_count)
+        self.search_ready.connect(self.apply_search)
+
+    def start(self, results_table, output_box=None, status_label=None):
+        self.cancel()
+        self.results_table = results_table
+        self.output_box = output_box
+        self.status_label = status_label
+
+    def cancel(self):
+        # Bumping the generation drops results from lookups that are already in flight
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+
+    def submit(self, row, name):
+        self.futures.append(self.executor.submit(self.fetch_pull_count, self.generation, row, name))
+
+    def search(self, image_name):
+        self.futures.append(self.executor.submit(self.fetch_search, self.generation, image_name))
+
+    def fetch_search(self, generation, image_name):
+        # Emits the rows, or None and the error; a stale cached answer comes with a notice instead
+        if generation != self.generation:
+            return
+        fmt = "{{.Name}}\t{{.Description}}\t{{.StarCount}}\t{{.IsOfficial}}"
+        try:
+            raw_cmd = subprocess.check_output(["docker", "search", "--format", fmt, image_name],
+                                              text=True, stderr=subprocess.PIPE, timeout=10)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            rows = self.cache.search_results(image_name, allow_stale=True)
+            if rows is not None:
+                self.search_ready.emit(generation, image_name, rows, "Docker Hub is unreachable, showing cached results.")
+            elif isinstance(e, subprocess.TimeoutExpired):
+                self.search_ready.emit(generation, image_name, None, f"Timed out searching DockerHub for '{image_name}'.")
+            else:
+                detail = e.stderr if isinstance(e, subprocess.CalledProcessError) else e
+                self.search_ready.emit(generation, image_name, None, f"Error searching DockerHub for '{image_name}': {detail}")
+            return
+        rows = [line.split("\t") for line in raw_cmd.splitlines()]
+        self.cache.store_search_results(image_name, rows)
+        self.search_ready.emit(generation, image_name, rows, "")
 
-            ports = (ports[:22] + '...') if len(ports) > 25 else ports
+    def apply_search(self, generation, image_name, rows, message):
+        if generation != self.generation or self.results_table is None:
+            return
+        if message:
+            self.output_box.append(message)
+        if rows is None:
+            self.status_label.setText("Error during search.")
+            return
+        show_search_results(image_name, rows, self.output_box, self.status_label, self.results_table)
 
-            lines.append(f"{container_id:<15} {image:<20} {command:<20} {created:<15} {status:<25} {ports:<25} {names:<15}")
+    def cached_pull_count(self, name):
+        data = self.cache.fresh(f"repo:{'/'.join(split_repository(name))}")
+        return None if data is None else format_pull_count(data)
 
-        output = "\n".join(lines)
-        gui_log(log_widget, "All Containers:\n" + output)
+    def fetch_pull_count(self, generation, row, name):
+        if generation != self.generation:
+            return
+        try:
+            pulls = format_pull_count(self.cache.repository(self.session, name))
+        except Exception:
+            pulls = "0"
+        self.pull_count_ready.emit(generation, row, pulls)
 
-        return True
+    def apply_pull_count(self, generation, row, pulls):
+        if generation != self.generation or self.results_table is None:
+            return
+        if all(future.done() for future in self.futures):
+            self.cache.save()
+        if row >= self.results_table.model.source_row_count():
+            return
+        self.results_table.model.set_cell(row, 4, pulls)
 
-    except FileNotFoundError:
-        gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
-        return False
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error listing containers: {e.stderr}")
-        return False
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        self.cache.save()
 
+def format_pull_count(data):
+    return f"{data.get('pull_count') or 0:,}"
 
+hub_lookups = None
 
-def stop_container(container_id, log_widget):
-    try:
-        subprocess.run(["docker", "stop", container_id], check=True, capture_output=True, text=True)
-        gui_log(log_widget, f"Container '{container_id}' stopped successfully.")
-        return True
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error stopping container '{container_id}': {e.stderr}")
-        return False
-    except FileNotFoundError:
-        gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
-        return False
+def get_hub_lookups():
+    global hub_lookups
+    if hub_lookups is None:
+        hub_lookups = DockerHubLookups()
+    return hub_lookups
 
 def search_dockerhub_image(image_name, output_box, status_label, results_table):
     output_box.clear()
     status_label.setText(f"Searching for '{image_name}'...")
-    results_table.setRowCount(0)  
-    QApplication.processEvents()  
-
+    results_table.model.clear()
+    lookups = get_hub_lookups()
+    lookups.start(results_table, output_box, status_label)
+
+    # Search results are cached too, so a repeated search needs no round trip
+    rows = lookups.cache.search_results(image_name)
+    if rows is None:
+        # 'docker search' can take its whole timeout; it runs in the lookup pool and the rows come back as a signal
+        lookups.search(image_name)
+        return
+    show_search_results(image_name, rows, output_box, status_label, results_table)
+
+def show_search_results(image_name, rows, output_box, status_label, results_table):
+    lookups = get_hub_lookups()
     try:
-        fmt = "{{.Name}}\t{{.Description}}\t{{.StarCount}}\t{{.IsOfficial}}"
-        raw_cmd = subprocess.check_output(
-            ["docker", "search", "--format", fmt, image_name],
-            text=True,
-            timeout=10
-        )
-
-        if not raw_cmd.strip():
+        if not rows:
             output_box.append(f"No results found for '{image_name}'. Please check the image name and try again.")
             status_label.setText(f"No results found for '{image_name}'.")
             return
@@ -176,9 +533,10 @@ def search_dockerhub_image(image_name, output_box, status_label, results_table):
         def truncate(text, max_length):
             return text if len(text) <= max_length else text[:max_length - 3] + "..."
 
-        for line in raw_cmd.splitlines():
+        new_rows = []
+        for row in rows:
             try:
-                name, desc, stars, official = line.split("\t")
+                name, desc, stars, official = row
             except ValueError:
                 continue
 
@@ -190,77 +548,457 @@ def search_dockerhub_image(image_name, output_box, status_label, results_table):
             stars = f"{int(stars):,}" if stars.isdigit() else stars
             
     
-            row_position = results_table.rowCount()
-            results_table.insertRow(row_position)
-    
-    
-            results_table.setItem(row_position, 0, QTableWidgetItem(name))
-            results_table.setItem(row_position, 1, QTableWidgetItem(short_desc))
-    
-    
-            stars_item = QTableWidgetItem(stars)
-            stars_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            results_table.setItem(row_position, 2, stars_item)
-    
-            results_table.setItem(row_position, 3, QTableWidgetItem(official_icon))
-
-
-
-    
-            official_item = QTableWidgetItem(official_icon)
-            official_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            results_table.setItem(row_position, 3, official_item)
-
-
-
-            
-            namespace = 'library' if '/' not in name else name.split('/', 1)[0]
-            repo = name if '/' not in name else name.split('/', 1)[1]
-            api_url = f"https://hub.docker.com/v2/repositories/{namespace}/{repo}/"
-            
-            try:
-                response = requests.get(api_url, timeout=5)
-                response.raise_for_status()
-                pulls = response.json().get('pull_count', 0)
-                pulls = f"{pulls:,}"
-            except Exception:
-                pulls = 0
-                
-            
-                
-            pull_count_item = QTableWidgetItem(str(pulls))
-            pull_count_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            results_table.setItem(row_position, 4, pull_count_item)
-
+            # Pull count is filled in by the lookup pool as each response arrives
+            pulls = lookups.cached_pull_count(name)
+            new_rows.append((name, short_desc, stars, official_icon, pulls or PULL_COUNT_PLACEHOLDER))
+            if pulls is None:
+                lookups.submit(results_table.model.source_row_count() + len(new_rows) - 1, name)
 
+        results_table.model.append_rows(new_rows)
         results_table.setVisible(True)
+        lookups.cache.save()
         
       
         hub_url = f"https://hub.docker.com/r/{image_name}" if '/' in image_name else f"https://hub.docker.com/_/{image_name}"
         output_box.append(f"\n🔗 View on DockerHub: {hub_url}\n")
         status_label.setText(f"Displaying results for '{image_name}'.")
 
-    except subprocess.CalledProcessError as e:
-        output_box.append(f"Error searching DockerHub for '{image_name}': {e.stderr}")
-        status_label.setText("Error during search.")
-    except requests.exceptions.RequestException as e:
-        status_label.setText("Error during search.")
-        QMessageBox.critical(None, "API Error", f"Could not connect to Docker Hub or an error occurred: {e}")
     except Exception as e:
         status_label.setText("An unexpected error occurred.")
         QMessageBox.critical(None, "Error", f"An unexpected error occurred: {e}")
 
-def pull_docker_image(image_name, log_widget):
-    try:
-        output = subprocess.check_output(["docker", "pull", image_name], text=True)
-        gui_log(log_widget, output)
+class ImagePullQueue(QObject):
+    image_status = Signal(str, str)
+    layer_progress = Signal(str, str, str, str)
+    throughput_changed = Signal(str)
+    queue_finished = Signal(str)
+
+    def __init__(self, concurrency=PULL_CONCURRENCY, client=None):
+        super().__init__()
+        self.client = client or get_docker_client()
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="docker-pull")
+        self.futures = {}
+        self.tokens = {}
+        self.results = {}
+        self.downloaded = 0
+        self.started = None
+        self.lock = threading.Lock()
+
+    def set_concurrency(self, concurrency):
+        if concurrency == self.concurrency:
+            return
+        # Pulls already queued keep their executor; new ones use the resized pool
+        self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="docker-pull")
+        self.concurrency = concurrency
+
+    def submit(self, image_names):
+        if not any(not future.done() for future in self.futures.values()):
+            self.futures, self.tokens, self.results = {}, {}, {}
+            self.downloaded = 0
+            self.started = time.monotonic()
+        for image_name in image_names:
+            if image_name in self.futures and not self.futures[image_name].done():
+                continue
+            self.tokens[image_name] = CancelToken()
+            self.image_status.emit(image_name, "Queued")
+            future = self.executor.submit(self.pull, image_name, self.tokens[image_name])
+            future.add_done_callback(self.pull_done)
+            self.futures[image_name] = future
+
+    def cancel(self):
+        for image_name, future in self.futures.items():
+            if future.cancel():
+                self.results[image_name] = "cancelled"
+                self.image_status.emit(image_name, "Cancelled")
+            self.tokens[image_name].cancel()
+        self.check_finished()
+
+    def pull(self, image_name, cancel_token):
+        try:
+            # Skip the download when the registry digest is one we already have locally
+            try:
+                digest = self.client.remote_digest(image_name)
+            except DockerEngineError:
+                digest = None
+            if digest and digest in self.client.local_digests(image_name):
+                self.image_status.emit(image_name, f"Up to date ({digest[:19]}), skipped")
+                return "skipped"
+
+            self.image_status.emit(image_name, "Pulling")
+            progress = PullProgress(image_name)
+            last_emit = {}
+            for message in self.client.pull(image_name, cancel=cancel_token):
+                before = progress.downloaded
+                layer_id = progress.feed(message)
+                with self.lock:
+                    self.downloaded += progress.downloaded - before
+                if layer_id is None:
+                    continue
+                # Layer updates arrive per chunk; pass on status changes and at most ten updates a second
+                status = progress.layers[layer_id]["status"]
+                now = time.monotonic()
+                previous = last_emit.get(layer_id)
+                if previous and previous[0] == status and now - previous[1] < 0.1:
+                    continue
+                last_emit[layer_id] = (status, now)
+                self.layer_progress.emit(image_name, layer_id, status, progress.layer_text(layer_id))
+                self.throughput_changed.emit(self.throughput_text())
+            get_image_catalog().invalidate()
+            self.image_status.emit(image_name, f"Done, {len(progress.layers)} layers")
+            return "pulled"
+        except OperationCancelled:
+            self.image_status.emit(image_name, "Cancelled")
+            return "cancelled"
+        except FileNotFoundError:
+            self.image_status.emit(image_name, "Error: 'docker' command not found.")
+            return "failed"
+        except DockerEngineError as e:
+            self.image_status.emit(image_name, f"Error: {e}")
+            return "failed"
+
+    def pull_done(self, future):
+        if future.cancelled():
+            return
+        image_name = next((name for name, f in self.futures.items() if f is future), None)
+        if image_name is not None:
+            self.results[image_name] = future.result()
+        self.check_finished()
+
+    def throughput_text(self):
+        elapsed = max(time.monotonic() - (self.started or time.monotonic()), 0.001)
+        return f"Downloaded {format_size(self.downloaded)} at {format_size(self.downloaded / elapsed)}/s"
+
+    def check_finished(self):
+        if not self.futures or any(not f.done() for f in self.futures.values()):
+            return
+        counts = {}
+        for outcome in self.results.values():
+            counts[outcome] = counts.get(outcome, 0) + 1
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items()))
+        self.queue_finished.emit(f"{summary}. {self.throughput_text()}")
+
+class BulkContainerAction(QObject):
+    container_done = Signal(str, bool, str)
+    action_finished = Signal(str)
+
+    def __init__(self, action, container_ids, grace_period=10, client=None, max_workers=BULK_ACTION_WORKERS):
+        super().__init__()
+        self.action = action
+        self.container_ids = list(container_ids)
+        self.grace_period = grace_period
+        self.client = client or get_docker_client()
+        self.max_workers = max_workers
+        self.outcomes = {}
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="docker-bulk", daemon=True)
+        self.thread.start()
+
+    def apply(self, container_id):
+        started = time.monotonic()
+        try:
+            if self.action == "Stop":
+                self.client.stop(container_id, self.grace_period)
+            elif self.action == "Restart":
+                self.client.restart(container_id, self.grace_period)
+            elif self.action == "Kill":
+                self.client.kill(container_id)
+            elif self.action == "Remove":
+                self.client.remove(container_id, force=True, timeout=self.grace_period)
+            ok, detail = True, f"done in {time.monotonic() - started:.1f}s"
+        except FileNotFoundError:
+            ok, detail = False, "'docker' command not found"
+        except DockerEngineError as e:
+            ok, detail = False, str(e)
+        self.container_done.emit(container_id, ok, detail)
+        return container_id, ok, detail
+
+    def run(self):
+        started = time.monotonic()
+        # Every container waits out its grace period in parallel, so the batch takes about one period
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="docker-bulk") as executor:
+            for container_id, ok, detail in executor.map(self.apply, self.container_ids):
+                self.outcomes[container_id] = (ok, detail)
+        failed = {container_id: detail for container_id, (ok, detail) in self.outcomes.items() if not ok}
+        lines = [f"{self.action}: {len(self.outcomes) - len(failed)} succeeded, {len(failed)} failed "
+                 f"in {time.monotonic() - started:.1f}s."]
+        lines += [f"  {container_id}: {detail}" for container_id, detail in failed.items()]
+        self.action_finished.emit("\n".join(lines))
+
+def selected_container_ids(table):
+    rows = sorted({index.row() for index in table.view.selectionModel().selectedRows()})
+    return [table.model.row_values(row)[0] for row in rows]
+
+class ContainerEventWatcher(QObject):
+    container_changed = Signal(object)
+    container_removed = Signal(str)
+    status_changed = Signal(str)
+
+    def __init__(self, client=None, reconnect_delay=2):
+        super().__init__()
+        self.client = client or get_docker_client()
+        self.reconnect_delay = reconnect_delay
+        self.stream = None
+        self.thread = None
+        self.running = False
+
+    def start(self, since):
+        self.running = True
+        self.thread = threading.Thread(target=self.follow, args=(since,), name="docker-events", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.stream is not None:
+            self.stream.close()
+
+    def follow(self, since):
+        while self.running:
+            try:
+                self.stream = self.client.events(since)
+                self.status_changed.emit("Live")
+                for event in self.stream:
+                    since = event.get("time", since)
+                    if event_action(event) not in CONTAINER_EVENT_ACTIONS:
+                        continue
+                    container_id = event_container_id(event)
+                    if event_action(event) == "destroy":
+                        self.container_removed.emit(container_id)
+                        continue
+                    # Re-read only the container the event is about, never the whole host
+                    matches = self.client.containers(all=True, ids=[container_id])
+                    if matches:
+                        self.container_changed.emit(matches[0])
+                    else:
+                        self.container_removed.emit(container_id)
+            except (DockerEngineError, FileNotFoundError) as e:
+                if self.running:
+                    self.status_changed.emit(f"Event stream error: {e}")
+            if self.running:
+                self.status_changed.emit("Event stream lost, reconnecting...")
+                time.sleep(self.reconnect_delay)
+
+class DiskJobQueue(QObject):
+    job_changed = Signal(object)
+
+    def __init__(self, per_device=DISK_JOBS_PER_DEVICE, in_use=None):
+        super().__init__()
+        # The scheduler reports from its worker threads; the signal hands each update to the UI thread
+        self.scheduler = DiskJobScheduler(per_device, listener=self.job_changed.emit)
+        self.in_use = in_use
+
+    def create_disk(self, path, disk_size, disk_type, preallocation, overwrite=False):
+        command = create_command(qemu_path, path, disk_size, disk_type, preallocation)
+        return self.scheduler.submit(DiskJob(f"Create ({preallocation})", path, command, qemu_path,
+                                             target_bytes=parse_disk_size(disk_size), prepare=check_create,
+                                             cleanup_on_cancel=not os.path.exists(path),
+                                             native=native_create(disk_type, preallocation), preallocation=preallocation,
+                                             overwrite=overwrite))
+
+    def resize_disk(self, path, new_size):
+        command = resize_command(qemu_path, path, new_size)
+        return self.scheduler.submit(DiskJob("Resize", path, command, qemu_path, target_bytes=parse_disk_size(new_size),
+                                             prepare=check_resize))
+
+    def convert_disk(self, source, target, target_format, coroutines, out_of_order, compression, sparse):
+        command = convert_command(qemu_path, source, target, target_format, coroutines, out_of_order, compression, sparse)
+        return self.scheduler.submit(DiskJob(f"Convert to {target_format}", target, command, qemu_path, source=source,
+                                             prepare=check_convert, cleanup_on_cancel=True))
+
+    def create_overlay(self, base, overlay, base_format):
+        command = overlay_command(qemu_path, base, overlay, base_format)
+        return self.scheduler.submit(DiskJob("Linked clone", overlay, command, qemu_path, source=base,
+                                             prepare=check_overlay, cleanup_on_cancel=True))
+
+    def flatten(self, overlay):
+        return self.scheduler.submit(DiskJob("Flatten", overlay, flatten_command(qemu_path, overlay), qemu_path))
+
+    def commit(self, overlay):
+        return self.scheduler.submit(DiskJob("Commit into base", overlay, commit_command(qemu_path, overlay), qemu_path))
+
+    def check_in_use(self, path):
+        # Checked again when the job starts: a VM may have been launched on the disk while it was queued
+        return lambda job: disk_in_use_error(self.in_use, path)
+
+    def snapshot(self, path, action, name):
+        operation = {'-c': "Snapshot", '-a': "Revert to snapshot", '-d': "Delete snapshot"}[action]
+        return self.scheduler.submit(DiskJob(f"{operation} {name}", path, snapshot_command(qemu_path, path, action, name), qemu_path,
+                                             prepare=self.check_in_use(path)))
+
+    def external_snapshot(self, path, name):
+        return self.scheduler.submit(DiskJob(f"External snapshot {name}", path, [], qemu_path,
+                                             prepare=self.check_in_use(path),
+                                             native=create_external_snapshot(qemu_path, path, name)))
+
+    def revert_external(self, path, frozen):
+        return self.scheduler.submit(DiskJob("Revert to external snapshot", path, [], qemu_path, source=frozen,
+                                             prepare=self.check_in_use(path),
+                                             native=revert_external_snapshot(qemu_path, path, frozen)))
+
+    def delete_external(self, path, frozen):
+        child, command = delete_external_command(qemu_path, path, frozen)
+        return self.scheduler.submit(DiskJob("Delete external snapshot", child, command, qemu_path, source=frozen,
+                                             prepare=self.check_in_use(path), finish=remove_frozen(frozen)))
+
+    def cancel(self, job_id):
+        self.scheduler.cancel(job_id)
+
+class DiskCatalogScan(QObject):
+    scan_finished = Signal(list, str)
+    scan_failed = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.catalog = get_disk_catalog(qemu_path)
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return False
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
         return True
-    except subprocess.CalledProcessError as e:
-        gui_log(log_widget, f"Error pulling image '{image_name}': {e.stderr}")
-        return False
-    except FileNotFoundError:
-        gui_log(log_widget, "Error: 'docker' command not found. Ensure Docker is installed and running.")
-        return False
+
+    def run(self):
+        # Whatever goes wrong, the next Refresh must be able to start a scan again
+        try:
+            records, summary = self.catalog.scan()
+            rows = [self.catalog.row(record) for record in records]
+        except (OSError, ValueError) as e:
+            self.scan_failed.emit(f"Scan failed: {e}")
+            return
+        except Exception as e:
+            self.scan_failed.emit(f"Scan failed: {type(e).__name__}: {e}")
+            return
+        finally:
+            self.running = False
+        self.scan_finished.emit(rows, summary)
+
+class VcpuPinner(QObject):
+    pin_finished = Signal(str)
+
+    def start(self, name, pid, placement):
+        # vCPU threads only exist once QEMU has started up, so wait for them off the UI thread
+        threading.Thread(target=self.run, args=(name, pid, placement), daemon=True).start()
+
+    def run(self, name, pid, placement):
+        try:
+            count = pin_vcpus(pid, placement)
+        except OSError as e:
+            self.pin_finished.emit(f"{name}: vCPU pinning failed: {e}")
+            return
+        self.pin_finished.emit(f"{name}: {count} vCPUs pinned to host CPUs {', '.join(map(str, placement.host_cpus))}")
+
+class VmSupervisorQueue(QObject):
+    vm_changed = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        # Samples arrive from the supervisor's thread; the signal hands each one to the UI thread
+        self.supervisor = VmSupervisor(listener=self.vm_changed.emit)
+
+class VmBatchLaunch(QObject):
+    progress = Signal(str)
+    finished = Signal(list, list)
+
+    def __init__(self, supervisor):
+        super().__init__()
+        self.supervisor = supervisor
+        self.cancel = None
+        self.running = False
+
+    def start(self, configs, rate):
+        # Launches are spaced out over seconds or minutes, so they run off the UI thread; one batch at a time
+        # so Stop Batch always reaches the one that is running
+        if self.running:
+            return False
+        self.running = True
+        self.cancel = CancelToken()
+        launcher = BatchLauncher(self.supervisor, rate, qemu_img=qemu_path, listener=self.progress.emit)
+        threading.Thread(target=self.run, args=(launcher, configs, self.cancel), daemon=True).start()
+        return True
+
+    def run(self, launcher, configs, cancel):
+        try:
+            launched, failed = launcher.run(configs, cancel)
+        finally:
+            self.running = False
+        self.finished.emit(launched, failed)
+
+    def stop(self):
+        if self.cancel is not None:
+            self.cancel.cancel()
+
+class DiskSnapshotList(QObject):
+    snapshots_listed = Signal(str, list, str)
+
+    def start(self, path):
+        threading.Thread(target=self.run, args=(path,), daemon=True).start()
+
+    def run(self, path):
+        # Space accounting walks every L2 table, which takes a while on big images
+        try:
+            snapshots, summary = list_snapshots(qemu_path, path)
+        except (OSError, ValueError) as e:
+            self.snapshots_listed.emit(path, [], str(e))
+            return
+        self.snapshots_listed.emit(path, [snapshot.row() for snapshot in snapshots], summary)
+
+def disk_size_error(disk_size):
+    if not any(unit in disk_size for unit in ['G', 'T', 'M']):
+        return "Size must include unit (G, M, T)."
+    if any(char in disk_size for char in special_chars):
+        return 'Size cannot contain special characters!'
+    try:
+        if parse_disk_size(disk_size) <= 0:
+            return "Size must be greater than zero."
+    except ValueError:
+        return "Size must look like 10G, 512M or 1T."
+    return None
+
+def selected_job_ids(table):
+    rows = sorted({index.row() for index in table.view.selectionModel().selectedRows()})
+    return [int(table.model.row_values(row)[0]) for row in rows]
+
+class PasswordCheck(QObject):
+    # The last argument is an error message when the user store itself failed
+    login_checked = Signal(str, bool, str)
+    signup_checked = Signal(str, bool, str)
+
+    def __init__(self, users):
+        super().__init__()
+        self.users = users
+
+    # The KDF takes a calibrated ~150 ms, so both run on a worker thread
+    def check_login(self, username, password):
+        threading.Thread(target=self.run_login, args=(username, password), daemon=True).start()
+
+    def run_login(self, username, password):
+        try:
+            stored_password = self.users.get_password(username)
+            ok = verify_password(password, stored_password)
+            if ok and needs_rehash(stored_password):
+                # Plaintext or under-cost entry: store it with the current parameters now that we know the password
+                self.users.set_password(username, hash_password(password))
+        except (sqlite3.Error, OSError) as e:
+            self.login_checked.emit(username, False, str(e))
+            return
+        self.login_checked.emit(username, ok, "")
+
+    def add_user(self, username, password):
+        threading.Thread(target=self.run_signup, args=(username, password), daemon=True).start()
+
+    def run_signup(self, username, password):
+        try:
+            added = self.users.add_user(username, hash_password(password))
+        except (sqlite3.Error, OSError) as e:
+            self.signup_checked.emit(username, False, str(e))
+            return
+        self.signup_checked.emit(username, added, "")
+
 
 class LoginWindow(QWidget):
     def __init__(self):
@@ -275,18 +1013,12 @@ class LoginWindow(QWidget):
         self.setLayout(self.layout)
         self.layout.addWidget(self.stacked_widget)
 
-        self.users_file = "users.json"
-        self.users = self.load_users()
-
-    def load_users(self):
-        if os.path.exists(self.users_file):
-            with open(self.users_file, "r") as file:
-                return json.load(file)
-        return {}
-
-    def save_users(self):
-        with open(self.users_file, "w") as file:
-            json.dump(self.users, file)
+        # Indexed store; users.json is imported into it once on first start
+        self.users = open_user_store()
+        self.password_check = PasswordCheck(self.users)
+        self.password_check.login_checked.connect(self.login_finished)
+        self.password_check.signup_checked.connect(self.signup_finished)
+        self.signup_pending = False
 
     def create_login_page(self):
         login_page = QWidget()
@@ -411,7 +1143,16 @@ class LoginWindow(QWidget):
         username = self.username_input.text()
         password = self.password_input.text()
 
-        if username in self.users and self.users[username] == password:
+        self.login_button.setEnabled(False)
+        self.login_button.setText("Checking...")
+        self.password_check.check_login(username, password)
+
+    def login_finished(self, username, ok, error):
+        self.login_button.setEnabled(True)
+        self.login_button.setText("Login")
+        if error:
+            QMessageBox.critical(self, "Login Failed", f"Could not read the user database:\n{error}", QMessageBox.Ok)
+        elif ok:
             print(f"Welcome {username}!")
             self.main_window = CloudManagementWindow(username)
             self.main_window.show()
@@ -440,9 +1181,19 @@ class LoginWindow(QWidget):
         elif username in self.users:
             print("Username already exists!")
             QMessageBox.critical(self, "Sign-Up Failed", "Username already exists!", QMessageBox.Ok)
+        elif not self.signup_pending:
+            self.signup_pending = True
+            self.password_check.add_user(username, password)
+
+    def signup_finished(self, username, added, error):
+        self.signup_pending = False
+        if error:
+            QMessageBox.critical(self, "Sign-Up Failed", f"Could not save the new user:\n{error}", QMessageBox.Ok)
+        elif not added:
+            # The insert itself decides, so two sign-ups racing for a name cannot both win
+            print("Username already exists!")
+            QMessageBox.critical(self, "Sign-Up Failed", "Username already exists!", QMessageBox.Ok)
         else:
-            self.users[username] = password
-            self.save_users()
             print("Sign-up successful!")
             QMessageBox.information(self, "Sign-Up Successful", "You have successfully signed up!\nYou will now return to the login page.", QMessageBox.Ok)
 
@@ -465,17 +1216,49 @@ class CloudManagementWindow(QMainWindow):
         self.project_page = QWidget()
         self.open_vm_page = QWidget()
         self.open_vd_page = QWidget()
+        self.disk_jobs_page = QWidget()
+        self.convert_disk_page = QWidget()
+        self.disk_catalog_page = QWidget()
+        self.disk_snapshots_page = QWidget()
         self.docker_page = self.DockerWidget()
+        self.vm_supervisor = VmSupervisorQueue()
+        self.vm_supervisor.vm_changed.connect(self.show_vm)
+        self.disk_jobs = DiskJobQueue(in_use=self.vm_supervisor.supervisor.disk_users)
+        self.disk_jobs.job_changed.connect(self.show_disk_job)
+        self.disk_job_rows = {}
+        self.pending_launches = {}
+        self.disk_catalog_scan = DiskCatalogScan()
+        self.disk_catalog_scan.scan_finished.connect(self.show_disk_catalog)
+        self.disk_catalog_scan.scan_failed.connect(lambda message: self.disk_catalog_status.setText(message))
+        self.disk_snapshot_list = DiskSnapshotList()
+        self.vcpu_pinner = VcpuPinner()
+        self.running_vms_page = QWidget()
+        self.vm_rows = {}
+        self.vm_batch = VmBatchLaunch(self.vm_supervisor.supervisor)
+        self.vm_batch.progress.connect(lambda message: self.running_vms_status.setText(message))
+        self.vm_batch.finished.connect(self.vm_batch_finished)
+        self.vcpu_pinner.pin_finished.connect(lambda message: self.vm_status.setText(message))
+        self.disk_snapshot_list.snapshots_listed.connect(self.show_snapshots)
 
         self.init_start_menu_page()
         self.init_project_page()
         self.open_virtual_machine()
         self.add_virtual_disk()
+        self.init_disk_jobs_page()
+        self.init_convert_disk_page()
+        self.init_disk_catalog_page()
+        self.init_disk_snapshots_page()
+        self.init_running_vms_page()
 
         self.central_widget.addWidget(self.start_menu_page)
         self.central_widget.addWidget(self.project_page)
         self.central_widget.addWidget(self.open_vm_page)
         self.central_widget.addWidget(self.open_vd_page)
+        self.central_widget.addWidget(self.disk_jobs_page)
+        self.central_widget.addWidget(self.convert_disk_page)
+        self.central_widget.addWidget(self.disk_catalog_page)
+        self.central_widget.addWidget(self.disk_snapshots_page)
+        self.central_widget.addWidget(self.running_vms_page)
         self.central_widget.addWidget(self.docker_page)
 
         self.central_widget.setCurrentWidget(self.start_menu_page)
@@ -513,6 +1296,11 @@ class CloudManagementWindow(QMainWindow):
         btn_open_vm.setStyleSheet("background-color: #27AE60; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
         btn_open_vm.clicked.connect(self.open_virtual_machine_page)
         layout.addWidget(btn_open_vm)
+
+        btn_running_vms = QPushButton("Running VMs")
+        btn_running_vms.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_running_vms.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.running_vms_page))
+        layout.addWidget(btn_running_vms)
         
         btn_open_docker = QPushButton("Docker")
         btn_open_docker.setStyleSheet("background-color: #27AE60; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
@@ -530,10 +1318,9 @@ class CloudManagementWindow(QMainWindow):
         layout = QVBoxLayout()
 
     
-        allocation_label = QLabel("Disk Allocation Type:")
+        allocation_label = QLabel("Preallocation:")
         allocation_label.setFont(QFont("Arial", 14))
         self.allocation_input = QComboBox()
-        self.allocation_input.addItems(["Dynamic", "Fixed"])
         self.allocation_input.setFont(QFont("Arial", 14))
         allocation_layout = QHBoxLayout()
         allocation_layout.addWidget(allocation_label)
@@ -548,6 +1335,10 @@ class CloudManagementWindow(QMainWindow):
         self.disk_type_input = QComboBox()
         self.disk_type_input.addItems(['vmdk', 'vdi', 'vhd', 'vhdx', 'qcow', 'qcow2', 'raw', 'img'])
         self.disk_type_input.setFont(QFont("Arial", 14))
+        self.disk_type_input.currentTextChanged.connect(self.update_preallocation_modes)
+        self.update_preallocation_modes(self.disk_type_input.currentText())
+        self.disk_type_input.currentTextChanged.connect(self.apply_storage_defaults)
+        self.apply_storage_defaults()
         disk_type_layout = QHBoxLayout()
         disk_type_layout.addWidget(disk_type_label)
         disk_type_layout.addWidget(self.disk_type_input, stretch=1)
@@ -606,6 +1397,26 @@ class CloudManagementWindow(QMainWindow):
         btn_resize.clicked.connect(self.resize_virtual_disk)
         layout.addWidget(btn_resize)
 
+        btn_convert = QPushButton("Convert Virtual Disk")
+        btn_convert.setStyleSheet("background-color: #27AE60; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_convert.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.convert_disk_page))
+        layout.addWidget(btn_convert)
+
+        btn_catalog = QPushButton("Disk Catalog")
+        btn_catalog.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_catalog.clicked.connect(self.open_disk_catalog)
+        layout.addWidget(btn_catalog)
+
+        btn_snapshots = QPushButton("Snapshots")
+        btn_snapshots.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_snapshots.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.disk_snapshots_page))
+        layout.addWidget(btn_snapshots)
+
+        btn_jobs = QPushButton("Disk Jobs")
+        btn_jobs.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_jobs.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.disk_jobs_page))
+        layout.addWidget(btn_jobs)
+
     
         btn_back = QPushButton("Back")
         btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
@@ -614,6 +1425,614 @@ class CloudManagementWindow(QMainWindow):
 
         self.open_vd_page.setLayout(layout)
         self.selected_path = ""
+        self.confirmed_path = ""
+
+    def init_disk_jobs_page(self):
+        layout = QVBoxLayout()
+
+        self.disk_jobs_table = FilterableTable(DiskJobScheduler.COLUMNS, centered_columns=(0, 3, 5, 6, 7))
+        layout.addWidget(self.disk_jobs_table)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Jobs per storage device:"))
+        self.disk_jobs_per_device = QSpinBox()
+        self.disk_jobs_per_device.setRange(1, 16)
+        self.disk_jobs_per_device.setValue(self.disk_jobs.scheduler.per_device)
+        self.disk_jobs_per_device.valueChanged.connect(self.disk_jobs.scheduler.set_per_device)
+        controls.addWidget(self.disk_jobs_per_device)
+
+        btn_cancel = QPushButton("Cancel Selected")
+        btn_cancel.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_cancel.clicked.connect(self.cancel_disk_jobs)
+        controls.addWidget(btn_cancel)
+
+        btn_batch = QPushButton("Create Disks from CSV...")
+        btn_batch.setStyleSheet("background-color: #1E90FF; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_batch.clicked.connect(self.batch_create_disks)
+        controls.addWidget(btn_batch)
+        layout.addLayout(controls)
+
+        btn_back = QPushButton("Back")
+        btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_back.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.open_vd_page))
+        layout.addWidget(btn_back)
+
+        self.disk_jobs_page.setLayout(layout)
+
+    def init_running_vms_page(self):
+        layout = QVBoxLayout()
+
+        self.running_vms_table = FilterableTable(VmSupervisor.COLUMNS, centered_columns=(1, 2, 3, 4, 8))
+        layout.addWidget(self.running_vms_table)
+
+        controls = QHBoxLayout()
+        for text, color, action in (("Pause", "#008080", self.vm_supervisor.supervisor.pause),
+                                    ("Resume", "#27AE60", self.vm_supervisor.supervisor.resume),
+                                    ("Power Down", "#1E90FF", self.vm_supervisor.supervisor.powerdown),
+                                    ("Force Stop", "#E74C3C", self.vm_supervisor.supervisor.force_stop)):
+            button = QPushButton(text)
+            button.setStyleSheet(f"background-color: {color}; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+            button.clicked.connect(lambda checked=False, action=action: self.control_vms(action))
+            controls.addWidget(button)
+        btn_clear = QPushButton("Clear Exited")
+        btn_clear.setStyleSheet("background-color: #4A4A4A; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_clear.clicked.connect(self.clear_exited_vms)
+        controls.addWidget(btn_clear)
+        layout.addLayout(controls)
+
+        batch_controls = QHBoxLayout()
+        batch_controls.addWidget(QLabel("Batch launches per second:"))
+        self.vm_launch_rate = QDoubleSpinBox()
+        self.vm_launch_rate.setRange(0.05, 10)
+        self.vm_launch_rate.setSingleStep(0.25)
+        self.vm_launch_rate.setValue(VM_LAUNCH_RATE)
+        batch_controls.addWidget(self.vm_launch_rate)
+        btn_batch = QPushButton("Launch Batch...")
+        btn_batch.setStyleSheet("background-color: #1E90FF; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_batch.clicked.connect(self.launch_vm_batch)
+        batch_controls.addWidget(btn_batch)
+        btn_stop_batch = QPushButton("Stop Batch")
+        btn_stop_batch.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_stop_batch.clicked.connect(self.vm_batch.stop)
+        batch_controls.addWidget(btn_stop_batch)
+        layout.addLayout(batch_controls)
+
+        self.running_vms_status = QLabel("")
+        layout.addWidget(self.running_vms_status)
+
+        btn_back = QPushButton("Back")
+        btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_back.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.project_page))
+        layout.addWidget(btn_back)
+
+        self.running_vms_page.setLayout(layout)
+
+    def show_vm(self, vm):
+        model = self.running_vms_table.model
+        if vm.name not in self.vm_rows:
+            self.vm_rows[vm.name] = model.source_row_count()
+            model.append_rows([vm.row()])
+        else:
+            model.update_row(self.vm_rows[vm.name], vm.row())
+
+    def selected_vm_names(self):
+        table = self.running_vms_table
+        rows = sorted({index.row() for index in table.view.selectionModel().selectedRows()})
+        return [table.model.row_values(row)[0] for row in rows]
+
+    def control_vms(self, action):
+        names = self.selected_vm_names()
+        if not names:
+            QMessageBox.critical(self, "Error", "Select one or more VMs first.")
+            return
+        for name in names:
+            try:
+                action(name)
+            except (OSError, ValueError, QmpError) as e:
+                QMessageBox.critical(self, "Error", f"{name}:\n{e}")
+
+    def clear_exited_vms(self):
+        self.vm_supervisor.supervisor.clear_exited()
+        vms = self.vm_supervisor.supervisor.vms
+        self.vm_rows = {name: position for position, name in enumerate(vms)}
+        self.running_vms_table.model.set_rows([vm.row() for vm in vms.values()])
+
+    def launch_vm_batch(self):
+        if self.vm_batch.running:
+            QMessageBox.critical(self, "Error", "A batch is still launching. Stop it or wait for it to finish.")
+            return
+        spec_path, _ = QFileDialog.getOpenFileName(self, "VM Batch", "", "VM Specs (*.json *.yaml *.yml);;All Files (*)")
+        if not spec_path:
+            return
+        try:
+            configs = batch_configs(read_vm_specs(spec_path), self.host, self.vm_profiles, qemu_path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Invalid VM batch:\n{e}")
+            return
+        self.running_vms_status.setText(f"Launching {len(configs)} VMs...")
+        self.vm_batch.start(configs, self.vm_launch_rate.value())
+
+    def vm_batch_finished(self, launched, failed):
+        self.running_vms_status.setText(f"Batch done: {len(launched)} started, {len(failed)} failed"
+                                        + (f" ({', '.join(failed)})" if failed else ""))
+        if self.disk_catalog_scan.catalog.directories:
+            self.rescan_disk_catalog()
+
+    def init_convert_disk_page(self):
+        layout = QVBoxLayout()
+
+        source_label = QLabel("Source Disk:")
+        source_label.setFont(QFont("Arial", 14))
+        self.convert_source = QLineEdit()
+        self.convert_source.setFont(QFont("Arial", 14))
+        self.convert_source.textChanged.connect(self.update_convert_target)
+        source_button = QPushButton("Browse...")
+        source_button.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        source_button.clicked.connect(self.browse_convert_source)
+        source_layout = QHBoxLayout()
+        source_layout.addWidget(source_label)
+        source_layout.addWidget(self.convert_source, stretch=1)
+        source_layout.addWidget(source_button)
+        layout.addLayout(source_layout)
+
+        format_label = QLabel("Target Format:")
+        format_label.setFont(QFont("Arial", 14))
+        self.convert_format = QComboBox()
+        self.convert_format.addItems([self.disk_type_input.itemText(i) for i in range(self.disk_type_input.count())])
+        self.convert_format.setCurrentText('qcow2')
+        self.convert_format.setFont(QFont("Arial", 14))
+        self.convert_format.currentTextChanged.connect(self.update_convert_target)
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(format_label)
+        format_layout.addWidget(self.convert_format, stretch=1)
+        layout.addLayout(format_layout)
+
+        target_label = QLabel("Target Disk:")
+        target_label.setFont(QFont("Arial", 14))
+        self.convert_target = QLineEdit()
+        self.convert_target.setFont(QFont("Arial", 14))
+        target_layout = QHBoxLayout()
+        target_layout.addWidget(target_label)
+        target_layout.addWidget(self.convert_target, stretch=1)
+        layout.addLayout(target_layout)
+
+        coroutines_label = QLabel("Parallel coroutines (-m):")
+        coroutines_label.setFont(QFont("Arial", 14))
+        self.convert_coroutines = QSpinBox()
+        self.convert_coroutines.setRange(1, 16)
+        self.convert_coroutines.setValue(8)
+        self.convert_coroutines.setFont(QFont("Arial", 14))
+        compression_label = QLabel("Compression:")
+        compression_label.setFont(QFont("Arial", 14))
+        self.convert_compression = QComboBox()
+        self.convert_compression.addItems(CONVERT_COMPRESSION)
+        self.convert_compression.setFont(QFont("Arial", 14))
+        tuning_layout = QHBoxLayout()
+        tuning_layout.addWidget(coroutines_label)
+        tuning_layout.addWidget(self.convert_coroutines)
+        tuning_layout.addWidget(compression_label)
+        tuning_layout.addWidget(self.convert_compression)
+        layout.addLayout(tuning_layout)
+
+        self.convert_out_of_order = QCheckBox("Out-of-order writes (-W)")
+        self.convert_out_of_order.setChecked(True)
+        self.convert_sparse = QCheckBox("Detect zero blocks and keep the target sparse")
+        self.convert_sparse.setChecked(True)
+        layout.addWidget(self.convert_out_of_order)
+        layout.addWidget(self.convert_sparse)
+        # Compressed clusters are written in order; qemu-img rejects -W with -c
+        self.convert_compression.currentTextChanged.connect(
+            lambda compression: self.convert_out_of_order.setEnabled(compression == 'none'))
+
+        btn_convert = QPushButton("Convert Virtual Disk")
+        btn_convert.setStyleSheet("background-color: #1E90FF; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_convert.clicked.connect(self.convert_virtual_disk)
+        layout.addWidget(btn_convert)
+
+        btn_back = QPushButton("Back")
+        btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_back.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.open_vd_page))
+        layout.addWidget(btn_back)
+
+        self.convert_disk_page.setLayout(layout)
+
+    def browse_convert_source(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Source Disk',
+                                              '', 'Disk Files (*.qcow2 *.qcow *.raw *.vmdk *.img *.vdi *.vhd *.vhdx);;All Files (*)')
+        if path:
+            self.convert_source.setText(path)
+
+    def update_convert_target(self):
+        source = self.convert_source.text().strip()
+        if source:
+            self.convert_target.setText(f"{os.path.splitext(source)[0]}.{self.convert_format.currentText()}")
+
+    def convert_virtual_disk(self):
+        source = self.convert_source.text().strip()
+        target = self.convert_target.text().strip()
+        target_format = self.convert_format.currentText()
+
+        if not source or not os.path.exists(source):
+            QMessageBox.critical(self, "Error", "Please select an existing virtual disk.")
+            return
+        if not target or os.path.abspath(target) == os.path.abspath(source):
+            QMessageBox.critical(self, "Error", "The target must be a new file.")
+            return
+        if not os.path.exists(qemu_path):
+            QMessageBox.critical(self, "Error", f"QEMU not found at {qemu_path}.")
+            return
+
+        compression = self.convert_compression.currentText()
+        error = convert_compression_error(target_format, compression)
+        if error:
+            QMessageBox.critical(self, "Error", error)
+            return
+
+        self.disk_jobs.convert_disk(source, target, target_format, self.convert_coroutines.value(),
+                                    self.convert_out_of_order.isChecked(),
+                                    None if compression == 'none' else compression, self.convert_sparse.isChecked())
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
+
+    def init_disk_catalog_page(self):
+        layout = QVBoxLayout()
+
+        self.disk_catalog_status = QLabel("")
+        layout.addWidget(self.disk_catalog_status)
+
+        self.disk_catalog_table = FilterableTable(DiskCatalog.COLUMNS, centered_columns=(1, 2, 3, 4, 5, 7))
+        layout.addWidget(self.disk_catalog_table)
+
+        controls = QHBoxLayout()
+        btn_add_directory = QPushButton("Add Directory...")
+        btn_add_directory.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_add_directory.clicked.connect(self.add_disk_directory)
+        controls.addWidget(btn_add_directory)
+
+        btn_rescan = QPushButton("Rescan")
+        btn_rescan.setStyleSheet("background-color: #1E90FF; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        btn_rescan.clicked.connect(self.rescan_disk_catalog)
+        controls.addWidget(btn_rescan)
+        layout.addLayout(controls)
+
+        clone_controls = QHBoxLayout()
+        for text, color, action in (("Mark as Golden", "#DAA520", lambda: self.mark_golden_disk(True)),
+                                    ("Unmark Golden", "#808080", lambda: self.mark_golden_disk(False)),
+                                    ("New Linked Clone...", "#2ECC71", self.new_linked_clone),
+                                    ("Flatten", "#8E44AD", self.flatten_overlay),
+                                    ("Commit into Base", "#E67E22", self.commit_overlay),
+                                    ("Dependents", "#1E90FF", self.show_dependents)):
+            button = QPushButton(text)
+            button.setStyleSheet(f"background-color: {color}; color: white; font-size: 14px; padding: 8px; border-radius: 8px;")
+            button.clicked.connect(action)
+            clone_controls.addWidget(button)
+        layout.addLayout(clone_controls)
+
+        btn_back = QPushButton("Back")
+        btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_back.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.open_vd_page))
+        layout.addWidget(btn_back)
+
+        self.disk_catalog_page.setLayout(layout)
+
+    def init_disk_snapshots_page(self):
+        layout = QVBoxLayout()
+
+        disk_label = QLabel("qcow2 Disk:")
+        disk_label.setFont(QFont("Arial", 14))
+        self.snapshot_disk = QLineEdit()
+        self.snapshot_disk.setFont(QFont("Arial", 14))
+        self.snapshot_disk.editingFinished.connect(self.refresh_snapshots)
+        disk_button = QPushButton("Browse...")
+        disk_button.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
+        disk_button.clicked.connect(self.browse_snapshot_disk)
+        disk_layout = QHBoxLayout()
+        disk_layout.addWidget(disk_label)
+        disk_layout.addWidget(self.snapshot_disk, stretch=1)
+        disk_layout.addWidget(disk_button)
+        layout.addLayout(disk_layout)
+
+        self.snapshot_status = QLabel("")
+        layout.addWidget(self.snapshot_status)
+
+        self.snapshot_table = FilterableTable(SNAPSHOT_COLUMNS, centered_columns=(1, 2, 3, 4, 5))
+        layout.addWidget(self.snapshot_table)
+
+        controls = QHBoxLayout()
+        for text, color, action in (("Refresh", "#1E90FF", self.refresh_snapshots),
+                                    ("Internal Snapshot...", "#2ECC71", lambda: self.create_snapshot(INTERNAL)),
+                                    ("External Snapshot...", "#27AE60", lambda: self.create_snapshot(EXTERNAL)),
+                                    ("Revert", "#E67E22", self.revert_snapshot),
+                                    ("Delete", "#E74C3C", self.delete_snapshot)):
+            button = QPushButton(text)
+            button.setStyleSheet(f"background-color: {color}; color: white; font-size: 14px; padding: 8px; border-radius: 8px;")
+            button.clicked.connect(action)
+            controls.addWidget(button)
+        layout.addLayout(controls)
+
+        btn_back = QPushButton("Back")
+        btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_back.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.open_vd_page))
+        layout.addWidget(btn_back)
+
+        self.disk_snapshots_page.setLayout(layout)
+
+    def browse_snapshot_disk(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Select Disk", "", "QCOW2 Files (*.qcow2);;All Files (*)")
+        if path:
+            self.snapshot_disk.setText(path)
+            self.refresh_snapshots()
+
+    def refresh_snapshots(self):
+        path = self.snapshot_disk.text().strip()
+        if not path:
+            return
+        self.snapshot_status.setText("Reading snapshots...")
+        self.disk_snapshot_list.start(os.path.abspath(path))
+
+    def show_snapshots(self, path, rows, summary):
+        if path != os.path.abspath(self.snapshot_disk.text().strip()):
+            return
+        self.snapshot_table.model.set_rows(rows)
+        self.snapshot_status.setText(summary)
+
+    def snapshot_disk_error(self, path, rewrites):
+        # Golden bases are read-only, and rewriting a disk other overlays read from corrupts them
+        error = disk_in_use_error(self.vm_supervisor.supervisor.disk_users, path)
+        if error:
+            return error
+        catalog = self.disk_catalog_scan.catalog
+        if path in catalog.golden:
+            return f"{path} is a golden image and is kept read-only."
+        dependents = catalog.dependents(path)
+        if rewrites and dependents:
+            return f"{len(dependents)} disks are backed by {path}:\n" + "\n".join(dependents)
+        return None
+
+    def create_snapshot(self, kind):
+        path = os.path.abspath(self.snapshot_disk.text().strip())
+        if not os.path.exists(path):
+            QMessageBox.critical(self, "Error", "Select an existing qcow2 disk first.")
+            return
+        error = self.snapshot_disk_error(path, kind == EXTERNAL)
+        if error:
+            QMessageBox.critical(self, "Error", error)
+            return
+        name, ok = QInputDialog.getText(self, "Snapshot", "Snapshot name:")
+        if not ok:
+            return
+        error = snapshot_name_error(name)
+        if error:
+            QMessageBox.critical(self, "Error", error)
+            return
+        if kind == INTERNAL:
+            self.disk_jobs.snapshot(path, '-c', name)
+        else:
+            self.disk_jobs.external_snapshot(path, name)
+        self.snapshot_status.setText(f"Creating {kind} snapshot {name}...")
+
+    def selected_snapshot(self):
+        rows = self.snapshot_table.view.selectionModel().selectedRows()
+        if not rows:
+            QMessageBox.critical(self, "Error", "Select a snapshot first.")
+            return None
+        name, kind, _, _, _, _, snapshot_path = self.snapshot_table.model.row_values(rows[0].row())
+        if kind not in (INTERNAL, EXTERNAL):
+            QMessageBox.critical(self, "Error", "Select a snapshot, not the current image.")
+            return None
+        return name, kind, snapshot_path
+
+    def revert_snapshot(self):
+        selected = self.selected_snapshot()
+        if not selected:
+            return
+        name, kind, snapshot_path = selected
+        path = os.path.abspath(self.snapshot_disk.text().strip())
+        error = self.snapshot_disk_error(path, True)
+        if error:
+            QMessageBox.critical(self, "Error", error)
+            return
+        if QMessageBox.question(self, "Revert", f"Discard everything written to {os.path.basename(path)} "
+                                                f"since snapshot {name}?") != QMessageBox.Yes:
+            return
+        if kind == INTERNAL:
+            self.disk_jobs.snapshot(path, '-a', name)
+        else:
+            self.disk_jobs.revert_external(path, snapshot_path)
+        self.snapshot_status.setText(f"Reverting to {name}...")
+
+    def delete_snapshot(self):
+        selected = self.selected_snapshot()
+        if not selected:
+            return
+        name, kind, snapshot_path = selected
+        path = os.path.abspath(self.snapshot_disk.text().strip())
+        error = self.snapshot_disk_error(path, False)
+        if not error and kind == EXTERNAL:
+            # The snapshot file is merged into the file above it; any other overlay on it would lose its base
+            chain = [path] + [row[6] for row in self.snapshot_rows(EXTERNAL)]
+            others = [dependent for dependent in self.disk_catalog_scan.catalog.dependents(snapshot_path) if dependent not in chain]
+            if others:
+                error = f"{len(others)} other disks are backed by {snapshot_path}:\n" + "\n".join(others)
+        if error:
+            QMessageBox.critical(self, "Error", error)
+            return
+        if QMessageBox.question(self, "Delete", f"Delete snapshot {name}?") != QMessageBox.Yes:
+            return
+        try:
+            if kind == INTERNAL:
+                self.disk_jobs.snapshot(path, '-d', name)
+            else:
+                self.disk_jobs.delete_external(path, snapshot_path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot delete {name}:\n{e}")
+            return
+        self.snapshot_status.setText(f"Deleting {name}...")
+
+    def snapshot_rows(self, kind):
+        # Source rows, so a filter on the table does not hide part of the chain
+        return [row for row in self.snapshot_table.model.rows if row[1] == kind]
+
+    def open_disk_catalog(self):
+        self.central_widget.setCurrentWidget(self.disk_catalog_page)
+        self.rescan_disk_catalog()
+
+    def add_disk_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Disk Directory")
+        if directory:
+            self.disk_catalog_scan.catalog.add_directory(directory)
+            self.rescan_disk_catalog()
+
+    def rescan_disk_catalog(self):
+        if not self.disk_catalog_scan.catalog.directories:
+            self.disk_catalog_status.setText("No directories yet. Use Add Directory... to choose where disks live.")
+            return
+        if self.disk_catalog_scan.start():
+            self.disk_catalog_status.setText("Scanning...")
+
+    def show_disk_catalog(self, rows, summary):
+        self.disk_catalog_table.model.set_rows(rows)
+        self.disk_catalog_status.setText(summary)
+
+    def selected_catalog_disk(self):
+        rows = self.disk_catalog_table.view.selectionModel().selectedRows()
+        if not rows:
+            QMessageBox.critical(self, "Error", "Select a disk first.")
+            return None
+        return self.disk_catalog_table.model.row_values(rows[0].row())[0]
+
+    def mark_golden_disk(self, golden):
+        path = self.selected_catalog_disk()
+        if not path:
+            return
+        catalog = self.disk_catalog_scan.catalog
+        try:
+            if golden and catalog.info(path).backing_chain:
+                QMessageBox.critical(self, "Error", "Flatten the overlay before using it as a golden image.")
+                return
+            catalog.mark_golden(path, golden)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to change {path}:\n{e}")
+            return
+        self.refresh_golden_images()
+        self.rescan_disk_catalog()
+
+    def new_linked_clone(self):
+        base = self.selected_catalog_disk()
+        if not base:
+            return
+        default = os.path.join(os.path.dirname(base), f"{os.path.splitext(os.path.basename(base))[0]}-clone.qcow2")
+        overlay, _ = QFileDialog.getSaveFileName(self, "Linked Clone", default, "QCOW2 Files (*.qcow2)")
+        if not overlay:
+            return
+        try:
+            base_format = self.disk_catalog_scan.catalog.info(base).format
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot read {base}:\n{e}")
+            return
+        self.disk_jobs.create_overlay(base, overlay, base_format)
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
+
+    def selected_overlay(self):
+        path = self.selected_catalog_disk()
+        if not path:
+            return None
+        try:
+            backing_chain = self.disk_catalog_scan.catalog.info(path).backing_chain
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot read {path}:\n{e}")
+            return None
+        if not backing_chain:
+            QMessageBox.critical(self, "Error", f"{path} has no backing file.")
+            return None
+        return path
+
+    def flatten_overlay(self):
+        overlay = self.selected_overlay()
+        if overlay:
+            self.disk_jobs.flatten(overlay)
+            self.central_widget.setCurrentWidget(self.disk_jobs_page)
+
+    def commit_overlay(self):
+        overlay = self.selected_overlay()
+        if not overlay:
+            return
+        catalog = self.disk_catalog_scan.catalog
+        base = catalog.info(overlay).backing_chain[0]
+        if base in catalog.golden:
+            # Every other clone of the base would silently see these writes
+            QMessageBox.critical(self, "Error", f"{base} is a golden image shared by {len(catalog.dependents(base))} clones. "
+                                                "Unmark it before committing into it.")
+            return
+        self.disk_jobs.commit(overlay)
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
+
+    def show_dependents(self):
+        path = self.selected_catalog_disk()
+        if not path:
+            return
+        dependents = self.disk_catalog_scan.catalog.dependents(path)
+        QMessageBox.information(self, "Dependents", "\n".join(dependents) if dependents else f"Nothing is backed by {path}.")
+
+    def refresh_golden_images(self):
+        current = self.vm_base_image.currentText()
+        self.vm_base_image.clear()
+        self.vm_base_image.addItem("(none)")
+        self.vm_base_image.addItems(sorted(self.disk_catalog_scan.catalog.golden))
+        index = self.vm_base_image.findText(current)
+        self.vm_base_image.setCurrentIndex(max(0, index))
+
+    def show_disk_job(self, job):
+        model = self.disk_jobs_table.model
+        if job.id not in self.disk_job_rows:
+            self.disk_job_rows[job.id] = model.source_row_count()
+            model.append_rows([job.row()])
+        else:
+            model.update_row(self.disk_job_rows[job.id], job.row())
+        if job.state in FINISHED_STATES:
+            config = self.pending_launches.pop(job.id, None)
+            if config is not None and job.state == DONE:
+                self.launch_vm(config)
+            elif config is not None:
+                QMessageBox.critical(self, "Error", f"Linked clone for {config['name']} failed:\n{job.message}")
+            if job.state == DONE and self.disk_catalog_scan.catalog.directories:
+                self.rescan_disk_catalog()
+            if self.central_widget.currentWidget() is self.disk_snapshots_page:
+                self.refresh_snapshots()
+
+    def cancel_disk_jobs(self):
+        for job_id in selected_job_ids(self.disk_jobs_table):
+            self.disk_jobs.cancel(job_id)
+
+    def batch_create_disks(self):
+        csv_path, _ = QFileDialog.getOpenFileName(self, "Disk Batch", "", "CSV Files (*.csv);;All Files (*)")
+        if not csv_path:
+            return
+        if not os.path.exists(qemu_path):
+            QMessageBox.critical(self, "Error", f"QEMU not found at {qemu_path}.")
+            return
+        try:
+            specs = read_batch_csv(csv_path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Invalid disk batch:\n{e}")
+            return
+        # Validate everything first so a bad line does not leave half a batch queued
+        errors = []
+        for path, disk_size, disk_type, preallocation in specs:
+            error = disk_size_error(disk_size)
+            if error:
+                errors.append(f"{path}: {error}")
+        if errors:
+            QMessageBox.critical(self, "Error", "\n".join(errors))
+            return
+        for path, disk_size, disk_type, preallocation in specs:
+            if disk_type == 'img' and not path.endswith('.img'):
+                path += '.img'
+            self.disk_jobs.create_disk(path, disk_size, disk_type, preallocation)
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
+
+    def update_preallocation_modes(self, disk_type):
+        self.allocation_input.clear()
+        self.allocation_input.addItems(preallocation_modes(disk_type))
 
     def select_file_path(self):
         options = QFileDialog.Options()
@@ -624,6 +2043,8 @@ class CloudManagementWindow(QMainWindow):
         )
 
         if path:
+            # The dialog asked before replacing this exact name; one with an extension added was never confirmed
+            self.confirmed_path = path
             if not path.lower().endswith(f".{disk_type}"):
                 path += f".{disk_type}"
             self.selected_path = path
@@ -659,74 +2080,47 @@ class CloudManagementWindow(QMainWindow):
             return
 
         self.disk_input.setText(new_size.strip())
-        
-        
-        try:
-            result = subprocess.run(
-                [qemu_path, 'info', '--output=json', self.selected_path],
-                check=True, stdout=subprocess.PIPE, text=True)
-            info = json.loads(result.stdout)
-            current_virtual_size = int(info['virtual-size'])
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to read current disk size:\n{e}")
-            return
 
-        unit = new_size[-1].upper()
-        number = float(new_size[:-1])
-        new_size_bytes = {'G': 1024**3, 'M': 1024**2, 'T': 1024**4}.get(unit, 0) * number
-
-        if new_size_bytes < current_virtual_size:
-            QMessageBox.critical(self, "Error",
-                                 "Shrinking disks is not supported by QEMU. Only expansion is allowed.")
+        try:
+            parse_disk_size(new_size)
+        except ValueError:
+            QMessageBox.critical(self, "Error", "Size must look like 10G, 512M or 1T.")
             return
 
-        command = [qemu_path, 'resize', self.selected_path, new_size]
-
-        try:
-            subprocess.run(command, check=True)
-            QMessageBox.information(self, "Success", f"Disk resized to {new_size} successfully!")
-            
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Error", f"Failed to resize disk:\n{e}")
+        # The shrink check (qemu-img info) and the resize itself run on the disk job queue
+        self.disk_jobs.resize_disk(self.selected_path, new_size.strip())
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
 
     def create_virtual_disk(self):
         disk_size = self.disk_input.text().strip()
         disk_type = self.disk_type_input.currentText()
+        preallocation = self.allocation_input.currentText()
 
         if not disk_size or not disk_type or not self.selected_path:
             QMessageBox.critical(self, "Error", "All fields are required.")
             return
 
-        if not os.path.exists(qemu_path):
+        if not native_create(disk_type, preallocation) and not os.path.exists(qemu_path):
             QMessageBox.critical(self, "Error", f"QEMU not found at {qemu_path}.")
             return
 
-        if not any(unit in disk_size for unit in ['G', 'T', 'M']):
-            QMessageBox.critical(self, "Error", "Size must include unit (G, M, T).")
-            return
-
-        if any(char in disk_size for char in special_chars):
-            QMessageBox.critical(self, 'Error', 'Size cannot contain special characters!')
+        error = disk_size_error(disk_size)
+        if error:
+            QMessageBox.critical(self, "Error", error)
             return
         
         if disk_type.lower() == 'img':
-            disk_type = 'raw'
             if not self.selected_path.endswith('.img'):
                 self.selected_path += '.img'
 
-        command = [qemu_path, 'create', '-f', disk_type]
-        
-        if self.allocation_input.currentText() == "Fixed":
-            if not disk_type in ['vmdk', 'vdi', 'vhd', 'vhdx', 'qcow', 'qcow2', 'raw']:
-                command += ['-o', 'preallocation=full']
-        
-        command += [self.selected_path, disk_size]
-
-        try:
-            subprocess.run(command, check=True)
-            QMessageBox.information(self, "Success", "Virtual disk created successfully!")
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Error", f"Failed to create disk:\n{e}")
+        overwrite = os.path.exists(self.selected_path)
+        if overwrite and self.selected_path != self.confirmed_path and QMessageBox.question(
+                self, "Create Disk", f"{self.selected_path} already exists. Replace it?") != QMessageBox.Yes:
+            return
+        # One confirmation covers one create; clicking Create again asks again
+        self.confirmed_path = ""
+        self.disk_jobs.create_disk(self.selected_path, disk_size, disk_type, preallocation, overwrite=overwrite)
+        self.central_widget.setCurrentWidget(self.disk_jobs_page)
 
     def open_virtual_machine(self):
         layout = QVBoxLayout()
@@ -742,10 +2136,24 @@ class CloudManagementWindow(QMainWindow):
         cpu_label.setFont(QFont("Arial", 14))
         layout.addWidget(cpu_label)
 
+        self.host = get_host_topology()
         self.cpu_cores = QSpinBox()
-        self.cpu_cores.setRange(1, 4)
+        self.cpu_cores.setRange(1, len(self.host.cpus))
         self.cpu_cores.setFont(QFont("Arial", 14))
         layout.addWidget(self.cpu_cores)
+        layout.addWidget(QLabel(f"Host: {self.host.summary()}"))
+
+        self.vm_match_topology = QCheckBox("Match host topology")
+        self.vm_match_topology.setChecked(True)
+        self.vm_pin_vcpus = QCheckBox("Pin vCPUs to host cores")
+        self.vm_pin_vcpus.setEnabled(hasattr(os, "sched_setaffinity"))
+        self.vm_hugepages = QCheckBox("Hugepages")
+        self.vm_hugepages.setEnabled(any(self.host.hugepages.values()))
+        placement_layout = QHBoxLayout()
+        placement_layout.addWidget(self.vm_match_topology)
+        placement_layout.addWidget(self.vm_pin_vcpus)
+        placement_layout.addWidget(self.vm_hugepages)
+        layout.addLayout(placement_layout)
 
         memory_label = QLabel("Memory (MB):")
         memory_label.setFont(QFont("Arial", 14))
@@ -757,13 +2165,23 @@ class CloudManagementWindow(QMainWindow):
         self.memory.setFont(QFont("Arial", 14))
         layout.addWidget(self.memory)
 
-        
+
+        base_label = QLabel('Base image (linked clone):')
+        base_label.setFont(QFont("Arial", 14))
+        layout.addWidget(base_label)
+
+        self.vm_base_image = QComboBox()
+        self.vm_base_image.setFont(QFont("Arial", 14))
+        layout.addWidget(self.vm_base_image)
+        self.refresh_golden_images()
+
         disk_label = QLabel('Add Virtual Disk:')
         disk_label.setFont(QFont("Arial", 14))
         layout.addWidget(disk_label)
 
         self.disk_path = QLineEdit()
-        self.disk_path.setFont(QFont("Arial", 14))  
+        self.disk_path.setFont(QFont("Arial", 14))
+        self.disk_path.editingFinished.connect(self.apply_storage_defaults)
         disk_browse_btn = QPushButton("Browse...")
         disk_browse_btn.setFont(QFont("Arial", 14))
         disk_browse_btn.clicked.connect(self.browse_virtual_disk)
@@ -789,12 +2207,70 @@ class CloudManagementWindow(QMainWindow):
         iso_btn.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 8px; border-radius: 8px;")
         layout.addLayout(iso_layout)
 
+        accel_label = QLabel('Accelerator:')
+        accel_label.setFont(QFont("Arial", 14))
+        self.vm_profiles = get_launch_profiles()
+        self.vm_profile = QComboBox()
+        self.vm_profile.setFont(QFont("Arial", 14))
+        self.vm_profile.addItems([profile.name for profile in self.vm_profiles])
+        self.vm_profile.currentIndexChanged.connect(self.update_vm_profile)
+        accel_layout = QHBoxLayout()
+        accel_layout.addWidget(accel_label)
+        accel_layout.addWidget(self.vm_profile, stretch=1)
+        layout.addLayout(accel_layout)
+        self.vm_profile_description = QLabel("")
+        layout.addWidget(self.vm_profile_description)
+        self.update_vm_profile()
+
+        storage_label = QLabel('Storage:')
+        storage_label.setFont(QFont("Arial", 14))
+        self.vm_bus = QComboBox()
+        self.vm_bus.addItems(STORAGE_BUSES)
+        self.vm_bus.currentTextChanged.connect(self.update_storage_controls)
+        self.vm_cache = QComboBox()
+        self.vm_cache.addItems(CACHE_MODES)
+        self.vm_aio = QComboBox()
+        self.vm_aio.addItems(AIO_MODES)
+        self.vm_iothread = QCheckBox("iothread")
+        self.vm_queues = QSpinBox()
+        self.vm_queues.setRange(0, 64)
+        self.vm_queues.setSpecialValueText("queue per vCPU")
+        storage_layout = QHBoxLayout()
+        storage_layout.addWidget(storage_label)
+        for text, widget in (("Bus:", self.vm_bus), ("Cache:", self.vm_cache), ("AIO:", self.vm_aio),
+                             (None, self.vm_iothread), ("Queues:", self.vm_queues)):
+            if text:
+                storage_layout.addWidget(QLabel(text))
+            storage_layout.addWidget(widget)
+        layout.addLayout(storage_layout)
+
+        self.vm_status = QLabel("")
+        layout.addWidget(self.vm_status)
+
+        self.vm_command_line = QTextEdit()
+        self.vm_command_line.setReadOnly(True)
+        self.vm_command_line.setMaximumHeight(90)
+        self.vm_command_line.setPlaceholderText("The QEMU command line appears here after a dry run or launch.")
+        layout.addWidget(self.vm_command_line)
+
+        btn_dry_run = QPushButton("Dry Run")
+        btn_dry_run.setFont(QFont("Arial", 14))
+        btn_dry_run.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_dry_run.clicked.connect(lambda: self.create_vm(dry_run=True))
+        layout.addWidget(btn_dry_run)
+
         btn_create = QPushButton("Open Virtual Machine")
         btn_create.setFont(QFont("Arial", 14))
         btn_create.setStyleSheet("background-color: #1E90FF; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
-        btn_create.clicked.connect(self.create_vm)
+        btn_create.clicked.connect(lambda: self.create_vm())
         layout.addWidget(btn_create)
 
+        btn_running_vms = QPushButton("Running VMs")
+        btn_running_vms.setFont(QFont("Arial", 14))
+        btn_running_vms.setStyleSheet("background-color: #008080; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
+        btn_running_vms.clicked.connect(lambda: self.central_widget.setCurrentWidget(self.running_vms_page))
+        layout.addWidget(btn_running_vms)
+
         btn_back = QPushButton("Back")
         btn_back.setFont(QFont("Arial", 14))
         btn_back.setStyleSheet("background-color: #E74C3C; color: white; font-size: 16px; padding: 10px; border-radius: 8px;")
@@ -803,34 +2279,81 @@ class CloudManagementWindow(QMainWindow):
 
         self.open_vm_page.setLayout(layout)
         
-    def create_vm(self):
-        if not self.vm_name.text().strip():
-            QMessageBox.critical(self, 'Error', 'VM name is required!')
-            return
-        if self.vm_name.text()[0].isdigit():
-            QMessageBox.critical(self, 'Error', 'VM name cannot start with a number!')
-            return
-        if any(char in self.vm_name.text() for char in special_chars):
-            QMessageBox.critical(self, 'Error', 'VM name cannot contain special characters like @, &, #, ?, etc.')
-            return
-        if not self.cpu_cores.value():
-            QMessageBox.critical(self, 'Error', 'CPU is required!')
-            return
-        if not self.memory.value() and not (self.memory.value() > 512 and self.memory.value() < 32768):
-            QMessageBox.critical(self, 'Error', 'Memory must be between 512 and 32768 MB!')
+    def apply_storage_defaults(self):
+        # The attached disk's own format wins; without one, follow the format chosen on the disk page
+        path = self.disk_path.text().strip()
+        if path and os.path.splitext(path)[1]:
+            defaults = storage_defaults(disk_format(path))
+        elif hasattr(self, 'disk_type_input'):
+            defaults = storage_defaults(self.disk_type_input.currentText())
+        else:
+            defaults = storage_defaults('qcow2')
+        self.vm_bus.setCurrentText(defaults.bus)
+        self.vm_cache.setCurrentText(defaults.cache)
+        self.vm_aio.setCurrentText(defaults.aio)
+        self.vm_iothread.setChecked(defaults.iothread)
+        self.vm_queues.setValue(defaults.queues)
+
+    def update_storage_controls(self, bus):
+        self.vm_iothread.setEnabled(bus != 'ide')
+        self.vm_queues.setEnabled(bus != 'ide')
+
+    def vm_storage(self):
+        return StorageOptions(self.vm_bus.currentText(), self.vm_cache.currentText(), self.vm_aio.currentText(),
+                              self.vm_iothread.isChecked(), self.vm_queues.value())
+
+    def update_vm_profile(self):
+        profile = self.vm_profiles[self.vm_profile.currentIndex()]
+        self.vm_profile_description.setText(f"{profile.description} (-cpu {profile.cpu_model})")
+
+    def create_vm(self, dry_run=False):
+        # The same rules as a batch spec file (vm_batch), so both reject the same VMs
+        error = vm_name_error(self.vm_name.text()) or \
+            vm_resources_error(self.cpu_cores.value(), self.memory.value(), len(self.host.cpus)) or \
+            storage_error(self.vm_storage())
+        if error:
+            QMessageBox.critical(self, 'Error', error)
             return
-        if not self.iso_path.text().strip():
-            QMessageBox.critical(self, 'Error', 'ISO Path is required!')
+        try:
+            placement = plan_placement(self.cpu_cores.value(), self.memory.value(), self.host,
+                                       self.vm_match_topology.isChecked(), self.vm_pin_vcpus.isChecked(),
+                                       self.vm_hugepages.isChecked())
+        except ValueError as e:
+            QMessageBox.critical(self, 'Error', str(e))
             return
-        if not self.disk_path.text().strip():
-            QMessageBox.critical(self, 'Error', 'Virtual Disk Path is required!')
+
+        base = self.vm_base_image.currentText() if self.vm_base_image.currentIndex() > 0 else ""
+        if base:
+            # The clone gets its own overlay next to the base; the base itself is never written
+            overlay = os.path.join(os.path.dirname(base), f"{self.vm_name.text()}.qcow2")
+            if os.path.exists(overlay):
+                QMessageBox.critical(self, 'Error', f'{overlay} already exists!')
+                return
+            try:
+                base_format = self.disk_catalog_scan.catalog.info(base).format
+            except (OSError, ValueError) as e:
+                QMessageBox.critical(self, 'Error', f'Cannot read base image {base}:\n{e}')
+                return
+            config = {
+                'name': self.vm_name.text(),
+                'cpu': self.cpu_cores.value(),
+                'memory': self.memory.value(),
+                'disk': overlay,
+                'iso': self.iso_path.text().strip(),
+                'profile': self.vm_profiles[self.vm_profile.currentIndex()],
+                'storage': self.vm_storage(),
+                'placement': placement
+            }
+            if dry_run:
+                self.show_launch_command(config)
+                return
+            job = self.disk_jobs.create_overlay(base, overlay, base_format)
+            self.pending_launches[job.id] = config
             return
 
-        disk_path_str = self.disk_path.text().strip()
-        ext = os.path.splitext(disk_path_str)[1].lower().lstrip('.')
-        valid_extensions = [self.disk_type_input.itemText(i) for i in range(self.disk_type_input.count())]
-        if ext not in valid_extensions:
-            QMessageBox.critical(self, 'Error', f'Invalid disk format! Allowed: {", ".join(valid_extensions)}')
+        error = vm_disk_error(self.disk_path.text(), self.iso_path.text())
+        if error:
+            QMessageBox.critical(self, 'Error', error)
             return
 
         config = {
@@ -838,22 +2361,38 @@ class CloudManagementWindow(QMainWindow):
             'cpu': self.cpu_cores.value(),
             'memory': self.memory.value(),
             'disk': self.disk_path.text(),
-            'iso': self.iso_path.text()
+            'iso': self.iso_path.text(),
+            'profile': self.vm_profiles[self.vm_profile.currentIndex()],
+            'storage': self.vm_storage(),
+            'placement': placement
         }
+        if dry_run:
+            self.show_launch_command(config)
+            return
+        self.launch_vm(config)
 
+    def show_launch_command(self, config):
+        command_line = format_command(launch_command(config, config['profile']))
+        self.vm_command_line.setPlainText(command_line)
+        QMessageBox.information(self, "Dry Run", f"Profile: {config['profile'].description}\n\n{command_line}")
+
+    def launch_vm(self, config):
+        command = launch_command(config, config['profile'])
+        self.vm_command_line.setPlainText(format_command(command))
+        try:
+            save_vm_config(config, command)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to save the VM configuration:\n{e}")
         try:
-            subprocess.Popen([
-                r"c:\newww\ucrt64\bin\qemu-system-x86_64.exe",
-                "-m", str(config['memory']),
-                "-cpu", "max",
-                "-smp", str(config['cpu']),
-                "-hda", str(config['disk']),
-                "-cdrom", str(config['iso']),
-                "-boot", "menu=on",
-                "-display", "sdl"
-            ])
+            vm = self.vm_supervisor.supervisor.launch(config['name'], command)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to launch VM:\n{e}")
+            return
+        self.vm_command_line.setPlainText(format_command(vm.command))
+        placement = config.get('placement')
+        if placement and placement.host_cpus:
+            self.vm_status.setText(f"Pinning {config['name']} vCPUs...")
+            self.vcpu_pinner.start(config['name'], vm.process.pid, placement)
 
     def browse_iso(self):
         path, _ = QFileDialog.getOpenFileName(self, 'Select ISO', '', 'ISO Files (*.iso)')
@@ -865,6 +2404,7 @@ class CloudManagementWindow(QMainWindow):
                                               '', 'Disk Files (*.qcow2 *.raw *.vmdk *.img *.vdi *.vhd *.vhdx);;All Files (*)')
         if path:
             self.disk_path.setText(path)
+            self.apply_storage_defaults()
 
     def open_virtual_machine_page(self):
         self.central_widget.setCurrentWidget(self.open_vm_page)
@@ -884,6 +2424,7 @@ class CloudManagementWindow(QMainWindow):
         self.disk_input.clear()                           
         self.selected_path_edit.clear()                  
         self.selected_path = ""                       
+        self.confirmed_path = ""
 
     class DockerWidget(QWidget):
         def __init__(self):
@@ -914,51 +2455,33 @@ class CloudManagementWindow(QMainWindow):
                 """)
         
 
-            self.results_table = QTableWidget()
-            self.results_table.setColumnCount(5) 
-            self.results_table.setHorizontalHeaderLabels(['Name', 'Description', 'Stars', 'Official', 'Pull Count'])
-            self.results_table.setColumnWidth(0, 100)
-            self.results_table.setColumnWidth(1, 200)
-            self.results_table.setColumnWidth(2, 100)
-            self.results_table.setColumnWidth(3, 100)
-            self.results_table.setColumnWidth(4, 150)
-            for row in range(self.results_table.rowCount()):
-                for column in range(self.results_table.columnCount()):
-                    item = self.results_table.item(row, column)
-                    if item is not None:
-                        item.setTextAlignment(Qt.AlignCenter)
-            self.results_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-            self.results_table.setSelectionMode(QAbstractItemView.NoSelection)
-            self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
-            self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
-            self.results_table.setStyleSheet("""
-                QHeaderView::section {
-                background-color: #d3d3d3;  /* Light grey background for header */
-                color: black;  /* Black text color for header */
-                font-weight: bold;  /* Bold header text */
-                }
-                QTableWidget::item {
-                background-color: #e0e0e0;  /* Grey background for data cells */
-                color: black;  /* <-- Add this line for font color */
-                }
-                QTableWidget::item:even {
-                background-color: #f5f5f5;  /* Lighter grey for even rows */
-                }
-                QTableWidget::item:odd {
-                background-color: #e0e0e0;  /* Darker grey for odd rows */
-                }
-        """)
-            self.results_table.setVisible(False)           
-            
+            self.results_table = FilterableTable(['Name', 'Description', 'Stars', 'Official', 'Pull Count'],
+                                                 centered_columns=(2, 3, 4), selectable=False)
+            self.results_table.view.setColumnWidth(0, 100)
+            self.results_table.view.setColumnWidth(1, 200)
+            self.results_table.view.setColumnWidth(2, 100)
+            self.results_table.view.setColumnWidth(3, 100)
+            self.results_table.view.setColumnWidth(4, 150)
+            self.results_table.setVisible(False)
+
+            self.containers_table = FilterableTable(ContainerInventory.COLUMNS)
+            self.containers_table.setVisible(False)
+
             self.output_box = QTextEdit()
             self.output_box.setReadOnly(True)
+            self.output_box.log_sink = QtLogSink(self.output_box)
             
+            self.build_job = None
+            self.bulk_jobs = []
             self.init_docker_tab()
+            self.init_live_containers_tab()
+            self.init_pulls_tab()
 
             layout = QVBoxLayout()
             layout.addWidget(self.tabs)
             layout.addWidget(self.status_label) 
             layout.addWidget(self.results_table)
+            layout.addWidget(self.containers_table)
             layout.addWidget(self.output_box)
             self.setLayout(layout)
 
@@ -979,6 +2502,8 @@ class CloudManagementWindow(QMainWindow):
             stop_btn = QPushButton("Stop Container")
             search_hub_btn = QPushButton("Search DockerHub")
             pull_btn = QPushButton("Pull Image")
+            self.cancel_build_btn = QPushButton("Cancel Build")
+            self.cancel_build_btn.setEnabled(False)
             
             create_btn.clicked.connect(self.create_dockerfile_action)
             build_btn.clicked.connect(self.build_image_action)
@@ -989,9 +2514,10 @@ class CloudManagementWindow(QMainWindow):
             stop_btn.clicked.connect(self.stop_container_action)
             search_hub_btn.clicked.connect(self.search_dockerhub_action)
             pull_btn.clicked.connect(self.pull_image_action)
+            self.cancel_build_btn.clicked.connect(self.cancel_build_action)
 
             top_row = QHBoxLayout()
-            for btn in [create_btn, build_btn, list_btn, search_btn]:
+            for btn in [create_btn, build_btn, self.cancel_build_btn, list_btn, search_btn]:
                 top_row.addWidget(btn)
 
             bottom_row = QHBoxLayout()
@@ -1004,11 +2530,94 @@ class CloudManagementWindow(QMainWindow):
             docker_tab.setLayout(layout)
             self.tabs.addTab(docker_tab, "Docker")
 
+        def init_live_containers_tab(self):
+            live_tab = QWidget()
+            layout = QVBoxLayout()
+
+            self.live_status_label = QLabel("Stopped")
+            layout.addWidget(self.live_status_label)
+
+            self.live_table = FilterableTable(ContainerInventory.COLUMNS)
+            layout.addWidget(self.live_table)
+
+            start_btn = QPushButton("Start Live View")
+            stop_btn = QPushButton("Stop Live View")
+            start_btn.clicked.connect(self.start_live_view)
+            stop_btn.clicked.connect(self.stop_live_view)
+            buttons_row = QHBoxLayout()
+            for btn in [start_btn, stop_btn]:
+                buttons_row.addWidget(btn)
+            layout.addLayout(buttons_row)
+
+            bulk_row = QHBoxLayout()
+            self.bulk_action_input = QComboBox()
+            self.bulk_action_input.addItems(BULK_ACTIONS)
+            self.bulk_grace_input = QSpinBox()
+            self.bulk_grace_input.setRange(0, 300)
+            self.bulk_grace_input.setValue(10)
+            self.bulk_grace_input.setSuffix(" s grace")
+            bulk_btn = QPushButton("Apply to Selected")
+            bulk_btn.clicked.connect(lambda: self.bulk_container_action(self.live_table))
+            for widget in [self.bulk_action_input, self.bulk_grace_input, bulk_btn]:
+                bulk_row.addWidget(widget)
+            layout.addLayout(bulk_row)
+
+            live_tab.setLayout(layout)
+            self.tabs.addTab(live_tab, "Live Containers")
+
+            self.live_inventory = ContainerInventory()
+            self.live_rows = {}
+            self.live_watcher = None
+
+        def start_live_view(self):
+            self.stop_live_view()
+            # Events are requested from before the scan, so nothing that happens during it is missed
+            since = time.time()
+            try:
+                self.live_inventory = get_docker_client().inventory()
+            except (DockerEngineError, FileNotFoundError) as e:
+                self.live_status_label.setText(f"Error listing containers: {e}")
+                return
+            show_container_inventory(self.live_table, self.live_inventory)
+            self.live_rows = {c.id: row for row, c in enumerate(self.live_inventory)}
+
+            self.live_watcher = ContainerEventWatcher()
+            self.live_watcher.container_changed.connect(self.patch_live_row)
+            self.live_watcher.container_removed.connect(self.remove_live_row)
+            self.live_watcher.status_changed.connect(self.live_status_label.setText)
+            self.live_watcher.start(since)
+
+        def stop_live_view(self):
+            if self.live_watcher is not None:
+                self.live_watcher.stop()
+                self.live_watcher = None
+                self.live_status_label.setText("Stopped")
+
+        def patch_live_row(self, container):
+            self.live_inventory.update(container)
+            values = self.live_inventory.row(container)
+            row_position = self.live_rows.get(container.id)
+            if row_position is None:
+                self.live_rows[container.id] = self.live_table.model.source_row_count()
+                self.live_table.model.append_rows([values])
+            else:
+                self.live_table.model.update_row(row_position, values)
+
+        def remove_live_row(self, container_id):
+            self.live_inventory.remove(container_id)
+            row_position = self.live_rows.pop(container_id, None)
+            if row_position is None:
+                return
+            self.live_table.model.remove_row(row_position)
+            for other_id, other_row in self.live_rows.items():
+                if other_row > row_position:
+                    self.live_rows[other_id] = other_row - 1
+
         def create_dockerfile_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
@@ -1029,9 +2638,9 @@ class CloudManagementWindow(QMainWindow):
 
         def build_image_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
@@ -1040,13 +2649,27 @@ class CloudManagementWindow(QMainWindow):
             if dockerfile_path:
                 image_name, ok = QInputDialog.getText(self, "Image Name", "Enter image name:")
                 if ok and image_name:
-                    build_docker_image(dockerfile_path, image_name, self.output_box)
+                    if self.build_job is not None:
+                        self.build_job.cancel()
+                    self.build_job = build_docker_image(dockerfile_path, image_name, self.output_box)
+                    self.build_job.build_finished.connect(self.build_finished)
+                    self.cancel_build_btn.setEnabled(True)
+
+        def cancel_build_action(self):
+            if self.build_job is not None:
+                self.cancel_build_btn.setEnabled(False)
+                self.build_job.cancel()
+
+        def build_finished(self, ok, message):
+            if self.sender() is self.build_job:
+                self.build_job = None
+                self.cancel_build_btn.setEnabled(False)
 
         def list_images_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
@@ -1056,63 +2679,86 @@ class CloudManagementWindow(QMainWindow):
 
         def search_image_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
             self.dockerfile_text.clear()
-            image_name, ok = QInputDialog.getText(self, "Search Image", "Enter image name:")
+            image_name, ok = QInputDialog.getText(self, "Search Image", "Enter image name (partial names work):")
             if ok and image_name:
-                search_local_image(image_name, self.output_box)
+                sort_by, ok = QInputDialog.getItem(self, "Search Image", "Sort results by:", ["Name", "Size", "Age"], 0, False)
+                if ok:
+                    search_local_image(image_name, self.output_box, sort_by.lower())
             
                 
                 
         def list_running_containers_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
             self.dockerfile_text.clear()
-            list_running_containers(self.output_box)
+            list_running_containers(self.output_box, self.containers_table)
 
         def list_all_containers_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
             self.dockerfile_text.clear()
-            list_all_containers(self.output_box)
+            list_all_containers(self.output_box, self.containers_table)
             
         def stop_container_action(self):
+            # Containers picked in the listing are stopped together; otherwise ask for one ID
+            selected = selected_container_ids(self.containers_table) if self.containers_table.isVisible() else []
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
             self.dockerfile_text.clear()
+            if selected:
+                self.start_bulk_action("Stop", selected, 10)
+                return
+            self.containers_table.setVisible(False)
             container_id, ok = QInputDialog.getText(self, "Stop Container", "Enter container ID or name:")
             if ok and container_id:
                 stop_container(container_id.strip(), self.output_box)
 
+        def bulk_container_action(self, table):
+            selected = selected_container_ids(table)
+            if not selected:
+                QMessageBox.information(self, "Bulk Action", "Select one or more containers first.")
+                return
+            self.start_bulk_action(self.bulk_action_input.currentText(), selected, self.bulk_grace_input.value())
+
+        def start_bulk_action(self, action, container_ids, grace_period):
+            gui_log(self.output_box, f"{action} {len(container_ids)} container(s)...")
+            job = BulkContainerAction(action, container_ids, grace_period)
+            job.container_done.connect(
+                lambda container_id, ok, detail: gui_log(self.output_box, f"{container_id}: {'OK' if ok else 'FAILED'} ({detail})"))
+            job.action_finished.connect(lambda report: gui_log(self.output_box, report))
+            job.action_finished.connect(lambda report: self.bulk_jobs.remove(job))
+            self.bulk_jobs.append(job)
+            job.start()
+
         def search_dockerhub_action(self):
             self.output_box.clear()
             image_name, ok = QInputDialog.getText(self, "Search DockerHub", "Enter image name:")
             if ok and image_name:
                 self.status_label.setVisible(True)
-                search_dockerhub_image(image_name.strip(), self.output_box, self.status_label, self.results_table)
                 self.results_table.setVisible(True)
-                self.results_table.clearContents()
-                self.results_table.setRowCount(0)
+                self.containers_table.setVisible(False)
+                self.results_table.model.clear()
                 self.output_box.clear()
                 self.dockerfile_text.clear()
                 search_dockerhub_image(
@@ -1124,16 +2770,78 @@ class CloudManagementWindow(QMainWindow):
 
         def pull_image_action(self):
             self.output_box.clear()
-            self.results_table.clearContents()
-            self.results_table.setRowCount(0)
+            self.results_table.model.clear()
             self.results_table.setVisible(False)
+            self.containers_table.setVisible(False)
             self.output_box.clear()
             self.status_label.clear()
             self.status_label.setVisible(False)
             self.dockerfile_text.clear()
-            image_name, ok = QInputDialog.getText(self, "Pull Image", "Enter image name to download:")
-            if ok and image_name:
-                pull_docker_image(image_name.strip(), self.output_box)
+            image_names, ok = QInputDialog.getMultiLineText(self, "Pull Images", "Enter image names to download (one per line):")
+            names = [name for name in image_names.replace(",", " ").split() if name] if ok else []
+            if names:
+                self.pull_queue.set_concurrency(self.pull_concurrency.value())
+                self.pull_queue.submit(names)
+                self.tabs.setCurrentWidget(self.pulls_tab)
+
+        def init_pulls_tab(self):
+            self.pulls_tab = QWidget()
+            layout = QVBoxLayout()
+
+            concurrency_row = QHBoxLayout()
+            concurrency_row.addWidget(QLabel("Parallel pulls:"))
+            self.pull_concurrency = QSpinBox()
+            self.pull_concurrency.setRange(1, 16)
+            self.pull_concurrency.setValue(PULL_CONCURRENCY)
+            concurrency_row.addWidget(self.pull_concurrency)
+            self.pull_throughput_label = QLabel("")
+            concurrency_row.addWidget(self.pull_throughput_label, stretch=1)
+            layout.addLayout(concurrency_row)
+
+            self.pulls_table = QTableWidget()
+            self.pulls_table.setColumnCount(4)
+            self.pulls_table.setHorizontalHeaderLabels(['Image', 'Layer', 'Status', 'Progress'])
+            self.pulls_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            self.pulls_table.setStyleSheet(TABLE_STYLE)
+            layout.addWidget(self.pulls_table)
+
+            pull_btn = QPushButton("Pull Images")
+            cancel_btn = QPushButton("Cancel Pulls")
+            pull_btn.clicked.connect(self.pull_image_action)
+            cancel_btn.clicked.connect(lambda: self.pull_queue.cancel())
+            buttons_row = QHBoxLayout()
+            for btn in [pull_btn, cancel_btn]:
+                buttons_row.addWidget(btn)
+            layout.addLayout(buttons_row)
+
+            self.pulls_tab.setLayout(layout)
+            self.tabs.addTab(self.pulls_tab, "Pulls")
+
+            self.pull_rows = {}
+            self.pull_queue = ImagePullQueue()
+            self.pull_queue.image_status.connect(lambda image, status: self.set_pull_row(image, "", status, ""))
+            self.pull_queue.layer_progress.connect(self.set_pull_row)
+            self.pull_queue.throughput_changed.connect(self.pull_throughput_label.setText)
+            self.pull_queue.queue_finished.connect(self.pull_throughput_label.setText)
+
+        def set_pull_row(self, image_name, layer_id, status, progress):
+            key = (image_name, layer_id)
+            row_position = self.pull_rows.get(key)
+            if row_position is None:
+                if not layer_id and image_name not in {image for image, _ in self.pull_rows}:
+                    row_position = self.pulls_table.rowCount()
+                else:
+                    # Layer rows go right under their image's rows
+                    row_position = max(row for (image, _), row in self.pull_rows.items() if image == image_name) + 1
+                    for other_key, other_row in self.pull_rows.items():
+                        if other_row >= row_position:
+                            self.pull_rows[other_key] = other_row + 1
+                self.pulls_table.insertRow(row_position)
+                self.pull_rows[key] = row_position
+                self.pulls_table.setItem(row_position, 0, QTableWidgetItem(image_name if not layer_id else ""))
+                self.pulls_table.setItem(row_position, 1, QTableWidgetItem(layer_id))
+            self.pulls_table.setItem(row_position, 2, QTableWidgetItem(status))
+            self.pulls_table.setItem(row_position, 3, QTableWidgetItem(progress))
 
 
 if __name__ == "__main__":
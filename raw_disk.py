@@ -0,0 +1,118 @@
+import os
+import time
+
+RAW_WRITE_CHUNK = 4 * 1024 * 1024
+RAW_MODES = ['off', 'falloc', 'full']
+
+
+def native_raw_supported(mode):
+    # Without posix_fallocate (Windows) falloc goes through qemu-img like every other format
+    return mode in ('off', 'full') or hasattr(os, "posix_fallocate")
+
+
+def create_raw(path, size, mode, cancel=None, on_progress=None, overwrite=False):
+    # O_EXCL unless the user confirmed replacing the file: a disk that is already there is never truncated
+    # by accident. Once the file is ours, a cancel or failure removes it
+    replace = os.O_TRUNC if overwrite else os.O_EXCL
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | replace | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        if mode == 'falloc' and size:
+            # Reserves every block without writing it: no data I/O, but no ENOSPC surprises later
+            os.posix_fallocate(fd, 0, size)
+        elif mode == 'full':
+            os.ftruncate(fd, size)
+            zeros = bytes(RAW_WRITE_CHUNK)
+            position = 0
+            while position < size:
+                if cancel is not None:
+                    cancel.check()
+                count = min(RAW_WRITE_CHUNK, size - position)
+                position += os.write(fd, zeros[:count])
+                if on_progress is not None:
+                    on_progress(position)
+            os.fsync(fd)
+        else:
+            os.ftruncate(fd, size)
+    except BaseException:
+        os.close(fd)
+        os.unlink(path)
+        raise
+    os.close(fd)
+
+
+def data_bytes(path):
+    # Bytes SEEK_DATA reports as data. Blocks fallocate reserved but never wrote count as holes
+    # on most filesystems, which is what separates falloc from full here
+    if not hasattr(os, "SEEK_DATA"):
+        return None
+    total = 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        position = 0
+        while position < size:
+            try:
+                start = os.lseek(fd, position, os.SEEK_DATA)
+            except OSError:
+                break
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            total += end - start
+            position = end
+    finally:
+        os.close(fd)
+    return total
+
+
+def allocation_report(path):
+    stat = os.stat(path)
+    allocated = stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+    return stat.st_size, allocated, data_bytes(path)
+
+
+def first_write_latency(path, writes=200, block=4096):
+    # Random 4K writes made durable one by one: the cost a guest pays the first time it touches a block
+    import random
+
+    size = os.path.getsize(path)
+    offsets = random.sample(range(size // block), writes)
+    data = os.urandom(block)
+    latencies = []
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        for offset in offsets:
+            start = time.perf_counter()
+            os.pwrite(fd, data, offset * block)
+            if hasattr(os, "fdatasync"):
+                os.fdatasync(fd)
+            else:
+                os.fsync(fd)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    finally:
+        os.close(fd)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def run_benchmark(size=512 * 1024 * 1024, directory=None):
+    import tempfile
+
+    from docker_engine import format_size
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        for mode in RAW_MODES:
+            if not native_raw_supported(mode):
+                continue
+            path = os.path.join(tmp_dir, f"{mode}.raw")
+            start = time.perf_counter()
+            create_raw(path, size, mode)
+            created = time.perf_counter() - start
+            virtual, allocated, data = allocation_report(path)
+            p50, p99 = first_write_latency(path)
+            data_text = format_size(data) if data is not None else "n/a"
+            print(f"{mode:<7} create {created * 1000:8.1f} ms  virtual {format_size(virtual):>7}  "
+                  f"allocated {format_size(allocated):>7}  data {data_text:>7}  "
+                  f"first write p50 {p50:7.0f} us  p99 {p99:7.0f} us")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+USERS_JSON_FILE = "users.json"
+USERS_DB_FILE = "users.db"
+USER_STORE_BACKEND = os.environ.get("CLOUD_USER_STORE", "sqlite")
+
+
+class UserStore:
+    def get_password(self, username):
+        raise NotImplementedError
+
+    def add_user(self, username, password):
+        # Returns False when the username is already taken
+        raise NotImplementedError
+
+    def set_password(self, username, password):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def __contains__(self, username):
+        return self.get_password(username) is not None
+
+
+class JsonUserStore(UserStore):
+    # The original whole-file format, kept for setups that still want users.json
+    def __init__(self, path=USERS_JSON_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.users = load_users_json(path)
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.users, file)
+        os.replace(tmp_path, self.path)
+
+    def get_password(self, username):
+        return self.users.get(username)
+
+    def add_user(self, username, password):
+        with self.lock:
+            if username in self.users:
+                return False
+            self.users[username] = password
+            self.save()
+            return True
+
+    def set_password(self, username, password):
+        with self.lock:
+            self.users[username] = password
+            self.save()
+
+    def count(self):
+        return len(self.users)
+
+
+class SqliteUserStore(UserStore):
+    def __init__(self, path=USERS_DB_FILE, legacy_json=USERS_JSON_FILE):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS users ("
+                         "username TEXT PRIMARY KEY, password TEXT NOT NULL, created REAL NOT NULL) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def connection(self):
+        # One connection per thread; WAL lets readers in other processes run during a signup
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def migrate_json(self, json_path):
+        conn = self.connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+            return
+        # BEGIN IMMEDIATE makes a second instance starting at the same time wait, then see the marker
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                users = load_users_json(json_path)
+                now = time.time()
+                conn.executemany("INSERT OR IGNORE INTO users (username, password, created) VALUES (?, ?, ?)",
+                                 [(username, password, now) for username, password in users.items()])
+                conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (os.path.abspath(json_path),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_password(self, username):
+        row = self.connection().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password):
+        try:
+            with self.connection() as conn:
+                conn.execute("INSERT INTO users (username, password, created) VALUES (?, ?, ?)",
+                             (username, password, time.time()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def set_password(self, username, password):
+        with self.connection() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = ?", (password, username))
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def load_users_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        content = file.read()
+    return json.loads(content) if content.strip() else {}
+
+
+def open_user_store(backend=USER_STORE_BACKEND):
+    if backend == "json":
+        return JsonUserStore()
+    return SqliteUserStore()
+
+
+def run_benchmark(sizes=(1000, 10000, 100000), lookups=2000):
+    import tempfile
+    import random
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in ("json", "sqlite"):
+            for size in sizes:
+                if backend == "json" and size > 10000:
+                    continue
+                json_path = os.path.join(tmp_dir, f"users-{size}.json")
+                with open(json_path, "w") as file:
+                    json.dump({f"user{i}": f"secret{i}" for i in range(size)}, file)
+                if backend == "json":
+                    store = JsonUserStore(json_path)
+                else:
+                    store = SqliteUserStore(os.path.join(tmp_dir, f"users-{size}.db"), json_path)
+
+                names = [f"user{random.randrange(size)}" for _ in range(lookups)]
+                start = time.perf_counter()
+                for name in names:
+                    store.get_password(name)
+                login_us = (time.perf_counter() - start) / lookups * 1e6
+
+                signups = 50
+                start = time.perf_counter()
+                for i in range(signups):
+                    store.add_user(f"new{i}", "secret")
+                signup_us = (time.perf_counter() - start) / signups * 1e6
+                print(f"{backend:<7} {size:>7} users  login {login_us:8.1f} us  signup {signup_us:10.1f} us")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from dataclasses import fields, replace
+
+from docker_engine import CancelToken
+from disk_catalog import get_disk_catalog
+from disk_jobs import overlay_command
+from host_topology import get_host_topology, pin_vcpus, plan_placement
+from vm_launch import (AIO_MODES, CACHE_MODES, DISPLAY_MODES, QEMU_SYSTEM, STORAGE_BUSES, StorageOptions, disk_format,
+                       format_command, get_launch_profiles, launch_command, save_vm_config, storage_defaults,
+                       storage_error, vm_disk_error, vm_name_error, vm_resources_error)
+from vm_supervisor import EXITED, QmpError, VmSupervisor
+
+QEMU_IMG = os.environ.get("QEMU_IMG", r"C:\newww\ucrt64\bin\qemu-img.exe")
+# VMs started per second: each one reads its disk, allocates (or preallocates) RAM and spins up vCPUs at once,
+# so starting 30 together makes all of them boot slowly instead of a few boot quickly
+VM_LAUNCH_RATE = float(os.environ.get("CLOUD_VM_LAUNCH_RATE", "1"))
+VM_POWERDOWN_TIMEOUT = 60
+SPEC_KEYS = {'name', 'count', 'cpu', 'memory', 'disk', 'iso', 'base', 'accel', 'storage', 'match_topology', 'pin',
+             'hugepages', 'display', 'vnc_display'}
+STORAGE_CHOICES = {'bus': STORAGE_BUSES, 'cache': CACHE_MODES, 'aio': AIO_MODES}
+
+
+def read_vm_specs(path):
+    # A list of VM specs, or {"defaults": {...}, "vms": [...]}; "count": n expands one spec into name1..namen
+    with open(path, "r") as file:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML spec files need PyYAML (pip install pyyaml); JSON works without it")
+            document = yaml.safe_load(file)
+        else:
+            document = json.load(file)
+    defaults = {}
+    if isinstance(document, dict):
+        defaults = document.get('defaults') or {}
+        document = document.get('vms')
+    if not isinstance(document, list) or not all(isinstance(spec, dict) for spec in document):
+        raise ValueError(f"{path}: expected a list of VM specs")
+    specs = []
+    for spec in document:
+        spec = {**defaults, **spec}
+        count = spec.pop('count', None)
+        if count is None:
+            specs.append(spec)
+        else:
+            specs.extend({**spec, 'name': f"{spec.get('name', '')}{number}"} for number in range(1, int(count) + 1))
+    return specs
+
+
+def spec_storage(spec, disk):
+    storage = storage_defaults(disk_format(disk))
+    options = spec.get('storage') or {}
+    names = {option.name for option in fields(StorageOptions)}
+    for key, value in options.items():
+        if key not in names:
+            raise ValueError(f"unknown storage option '{key}'")
+        if key in STORAGE_CHOICES and value not in STORAGE_CHOICES[key]:
+            raise ValueError(f"{key} must be one of {', '.join(STORAGE_CHOICES[key])}")
+        setattr(storage, key, value)
+    return storage
+
+
+def remaining_host(host, pinned, hugepages):
+    # What is left for the next VM once earlier ones in the batch have taken their cores and hugepages;
+    # empty nodes stay listed so memory binding still sees a multi-node host
+    free = {size_kb: count - hugepages.get(size_kb, 0) for size_kb, count in host.hugepages.items()}
+    return replace(host, cpus=[host_cpu for host_cpu in host.cpus if host_cpu.cpu not in pinned],
+                   nodes={node: [cpu for cpu in cpus if cpu not in pinned] for node, cpus in host.nodes.items()},
+                   hugepages=free)
+
+
+def batch_configs(specs, host, profiles, qemu_img=QEMU_IMG):
+    # Every spec is checked with create_vm's rules before anything starts; all problems are reported together
+    configs = []
+    errors = []
+    names = set()
+    vnc_displays = {int(spec['vnc_display']) for spec in specs
+                    if spec.get('display') == 'vnc' and str(spec.get('vnc_display', '')).isdigit()}
+    pinned = set()
+    hugepages = {}
+    for index, spec in enumerate(specs, start=1):
+        name = str(spec.get('name', ''))
+        try:
+            unknown = set(spec) - SPEC_KEYS
+            if unknown:
+                raise ValueError(f"unknown key{'s' if len(unknown) > 1 else ''} {', '.join(sorted(unknown))}")
+            cpu, memory = int(spec.get('cpu', 1)), int(spec.get('memory', 4096))
+            disk, iso, base = str(spec.get('disk', '')), str(spec.get('iso', '')), str(spec.get('base', ''))
+            if base:
+                disk = os.path.join(os.path.dirname(base), f"{name}.qcow2")
+            storage = spec_storage(spec, disk)
+            error = vm_name_error(name) or vm_resources_error(cpu, memory, len(host.cpus)) or storage_error(storage)
+            if error:
+                raise ValueError(error)
+            if name in names:
+                raise ValueError("duplicate VM name")
+            profile = profiles[0]
+            if spec.get('accel'):
+                matching = [profile for profile in profiles if profile.name == spec['accel']]
+                if not matching:
+                    raise ValueError(f"accel must be one of {', '.join(profile.name for profile in profiles)}")
+                profile = matching[0]
+            display = spec.get('display', 'none')
+            if display not in DISPLAY_MODES:
+                raise ValueError(f"display must be one of {', '.join(DISPLAY_MODES)}")
+            placement = plan_placement(cpu, memory, remaining_host(host, pinned, hugepages),
+                                       bool(spec.get('match_topology', True)), bool(spec.get('pin', False)),
+                                       bool(spec.get('hugepages', False)))
+            config = {'name': name, 'cpu': cpu, 'memory': memory, 'disk': disk, 'iso': iso, 'profile': profile,
+                      'storage': storage, 'placement': placement, 'display': display}
+            if base:
+                if os.path.exists(disk):
+                    raise ValueError(f"{disk} already exists!")
+                try:
+                    config['base_format'] = get_disk_catalog(qemu_img).info(base).format
+                except (OSError, ValueError) as e:
+                    raise ValueError(f"Cannot read base image {base}:\n{e}")
+                config['base'] = base
+            else:
+                error = vm_disk_error(disk, iso)
+                if error:
+                    raise ValueError(error)
+            if display == 'vnc':
+                # Specs without a display number get the lowest one nobody asked for
+                vnc_display = spec.get('vnc_display')
+                if vnc_display is None:
+                    vnc_display = min(set(range(len(vnc_displays) + 1)) - vnc_displays)
+                if int(vnc_display) in {other.get('vnc_display') for other in configs}:
+                    raise ValueError(f"VNC display {vnc_display} is already used")
+                vnc_displays.add(int(vnc_display))
+                config['vnc_display'] = int(vnc_display)
+        except (TypeError, ValueError) as e:
+            errors.append(f"VM {index} ({name or 'unnamed'}): {e}")
+            continue
+        names.add(name)
+        pinned.update(placement.host_cpus)
+        if placement.hugepage_size_kb:
+            size_kb = placement.hugepage_size_kb
+            hugepages[size_kb] = hugepages.get(size_kb, 0) + memory * 1024 // size_kb
+        configs.append(config)
+    if errors:
+        raise ValueError("\n".join(errors))
+    return configs
+
+
+class BatchLauncher:
+    def __init__(self, supervisor, rate=VM_LAUNCH_RATE, qemu_system=QEMU_SYSTEM, qemu_img=QEMU_IMG, listener=None):
+        self.supervisor = supervisor
+        self.rate = rate
+        self.qemu_system = qemu_system
+        self.qemu_img = qemu_img
+        self.listener = listener
+
+    def notify(self, message):
+        if self.listener is not None:
+            self.listener(message)
+
+    def start(self, config):
+        if config.get('base'):
+            # Same linked clone create_vm makes: an overlay next to the golden base
+            subprocess.run(overlay_command(self.qemu_img, config['base'], config['disk'], config['base_format']),
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        command = launch_command(config, config['profile'], self.qemu_system)
+        save_vm_config(config, command)
+        vm = self.supervisor.launch(config['name'], command)
+        placement = config['placement']
+        if placement.host_cpus:
+            threading.Thread(target=self.pin, args=(config['name'], vm.process.pid, placement), daemon=True).start()
+        return vm
+
+    def pin(self, name, pid, placement):
+        try:
+            count = pin_vcpus(pid, placement)
+        except OSError as e:
+            self.notify(f"{name}: vCPU pinning failed: {e}")
+            return
+        self.notify(f"{name}: {count} vCPUs pinned to host CPUs {', '.join(map(str, placement.host_cpus))}")
+
+    def run(self, configs, cancel=None):
+        cancel = cancel or CancelToken()
+        wake = threading.Event()
+        cancel.on_cancel(wake.set)
+        interval = 1 / self.rate if self.rate > 0 else 0
+        launched, failed = [], []
+        for position, config in enumerate(configs):
+            if position and wake.wait(interval):
+                break
+            try:
+                vm = self.start(config)
+            except subprocess.CalledProcessError as e:
+                failed.append(config['name'])
+                self.notify(f"{config['name']}: linked clone failed: {e.stdout.strip()}")
+                continue
+            except (OSError, ValueError) as e:
+                failed.append(config['name'])
+                self.notify(f"{config['name']}: {e}")
+                continue
+            launched.append(config['name'])
+            display = f", VNC :{config['vnc_display']}" if config['display'] == 'vnc' else ""
+            self.notify(f"{config['name']}: started, pid {vm.process.pid}{display} ({position + 1}/{len(configs)})")
+        return launched, failed
+
+    def shut_down(self, names, timeout=VM_POWERDOWN_TIMEOUT):
+        # ACPI power button first so guests can flush their disks, quit for whatever is still up after the timeout
+        vms = self.supervisor.vms
+        for name in names:
+            try:
+                self.supervisor.powerdown(name)
+            except (OSError, ValueError, QmpError) as e:
+                self.notify(f"{name}: power down failed: {e}")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(vms[name].status != EXITED for name in names):
+            time.sleep(0.5)
+        for name in names:
+            if vms[name].status == EXITED:
+                continue
+            self.notify(f"{name}: still running after {timeout}s, forcing it off")
+            try:
+                self.supervisor.force_stop(name)
+            except (OSError, ValueError, QmpError) as e:
+                # Most likely it exited on its own since the check
+                self.notify(f"{name}: force stop failed: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate a JSON/YAML list of VM specs and launch them headless")
+    parser.add_argument("spec")
+    parser.add_argument("--rate", type=float, default=VM_LAUNCH_RATE, help="VMs started per second")
+    parser.add_argument("--display", choices=DISPLAY_MODES, help="override every spec's display")
+    parser.add_argument("--dry-run", action="store_true", help="print the commands without starting anything")
+    parser.add_argument("--qemu", default=QEMU_SYSTEM)
+    parser.add_argument("--qemu-img", default=QEMU_IMG)
+    args = parser.parse_args()
+
+    try:
+        specs = read_vm_specs(args.spec)
+        if args.display:
+            specs = [{**spec, 'display': args.display} for spec in specs]
+        configs = batch_configs(specs, get_host_topology(), get_launch_profiles(args.qemu), args.qemu_img)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Invalid VM batch {args.spec}:\n{e}")
+    if args.dry_run:
+        for config in configs:
+            print(format_command(launch_command(config, config['profile'], args.qemu)))
+        sys.exit(0)
+
+    supervisor = VmSupervisor()
+    launcher = BatchLauncher(supervisor, args.rate, args.qemu, args.qemu_img, listener=print)
+    launched, failed = launcher.run(configs)
+    print(f"{len(launched)} started, {len(failed)} failed; Ctrl+C powers them all down")
+    try:
+        while any(supervisor.vms[name].status != EXITED for name in launched):
+            time.sleep(5)
+            print("  ".join(f"{column:<10}" for column in VmSupervisor.COLUMNS))
+            for name in launched:
+                print("  ".join(f"{value:<10}" for value in supervisor.vms[name].row()))
+    except KeyboardInterrupt:
+        launcher.shut_down(launched)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import shlex
+import subprocess
+from dataclasses import dataclass, field, asdict, is_dataclass
+
+from disk_jobs import DISK_FORMATS, qemu_format
+from host_topology import memory_args, smp_arg
+
+QEMU_SYSTEM = os.environ.get("QEMU_SYSTEM", r"c:\newww\ucrt64\bin\qemu-system-x86_64.exe")
+# Forces a profile (kvm, hvf, whpx or tcg) even when detection disagrees, e.g. to dry-run the KVM command elsewhere
+VM_ACCEL = os.environ.get("CLOUD_VM_ACCEL", "")
+TCG_TB_SIZE_MB = int(os.environ.get("CLOUD_TCG_TB_SIZE", "0"))
+PLATFORM_ACCELERATORS = {"linux": ["kvm", "tcg"], "win32": ["whpx", "tcg"], "darwin": ["hvf", "tcg"]}
+VM_CONFIG_DIR = os.environ.get("CLOUD_VM_DIR", "vms")
+VM_MEMORY_MB = (512, 32768)
+VM_NAME_SPECIAL_CHARS = set("!@#$%^&*()-_+=~`[{]}\\|;:\"'<,>./?")
+# sdl opens a window per guest; none and vnc run headless, vnc with a server on VNC_LISTEN:<display>
+DISPLAY_MODES = ['sdl', 'none', 'vnc']
+VNC_LISTEN = os.environ.get("CLOUD_VNC_LISTEN", "127.0.0.1")
+
+STORAGE_BUSES = ['virtio-blk', 'virtio-scsi', 'ide']
+CACHE_MODES = ['none', 'writeback', 'writethrough', 'directsync', 'unsafe']
+# -blockdev has no cache= shorthand: each mode is host O_DIRECT, flush handling and the guest-visible write cache
+CACHE_OPTIONS = {
+    'none': (True, False, True),
+    'writeback': (False, False, True),
+    'writethrough': (False, False, False),
+    'directsync': (True, False, False),
+    'unsafe': (False, True, True),
+}
+# io_uring is Linux only; native AIO is Linux (O_DIRECT only) and Windows overlapped I/O
+AIO_MODES = ['threads', 'native', 'io_uring'] if sys.platform.startswith("linux") else ['threads', 'native']
+# Formats whose drivers do most of their own metadata I/O read far better through the host page cache
+PAGE_CACHED_FORMATS = ('vmdk', 'vdi', 'vpc', 'vhdx', 'qcow')
+
+
+@dataclass(slots=True)
+class LaunchProfile:
+    name: str
+    accel: list = field(default_factory=list)
+    cpu_model: str = "max"
+    description: str = ""
+
+
+def compiled_accelerators(qemu_system):
+    # "Accelerators supported in QEMU binary:" followed by one name per line
+    try:
+        result = subprocess.run([qemu_system, "-accel", "help"], check=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        # No binary to ask (a dry run on another machine): assume the usual build for this platform
+        return PLATFORM_ACCELERATORS.get(sys.platform, ["tcg"])
+    return [line.strip() for line in result.stdout.splitlines()[1:] if line.strip()]
+
+
+def kvm_usable():
+    return os.access("/dev/kvm", os.R_OK | os.W_OK)
+
+
+def hvf_usable():
+    try:
+        result = subprocess.run(["sysctl", "-n", "kern.hv_support"], stdout=subprocess.PIPE, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.stdout.strip() == "1"
+
+
+def host_memory_mb():
+    if hasattr(os, "sysconf"):
+        try:
+            return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1024**2
+        except (ValueError, OSError):
+            return None
+    if sys.platform == "win32":
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("length", ctypes.c_ulong), ("load", ctypes.c_ulong)] + \
+                       [(name, ctypes.c_ulonglong) for name in ("total", "available", "page_total", "page_available",
+                                                                "virtual_total", "virtual_available", "extended")]
+
+        status = MemoryStatus()
+        status.length = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.total // 1024**2
+    return None
+
+
+def tcg_tb_size(host_mb=None):
+    # QEMU's default translation cache is 1 GiB on top of guest RAM, which pushes small hosts into swap;
+    # scale it with host memory instead and keep the full size where there is room for it
+    if TCG_TB_SIZE_MB:
+        return TCG_TB_SIZE_MB
+    if host_mb is None:
+        return 512
+    return min(1024, max(128, host_mb // 16))
+
+
+def tcg_accel(host_mb=None):
+    # thread=multi gives every vCPU its own host thread instead of round-robining them all on one
+    return f"tcg,thread=multi,tb-size={tcg_tb_size(host_mb)}"
+
+
+def make_profile(name, host_mb=None):
+    if name == "kvm":
+        return LaunchProfile("kvm", ["kvm"], "host", "KVM hardware virtualization, host CPU passthrough")
+    if name == "hvf":
+        return LaunchProfile("hvf", ["hvf"], "host", "Hypervisor.framework, host CPU passthrough")
+    if name == "whpx":
+        # QEMU tries each -accel in turn, so a host without the Hypervisor Platform feature still boots under TCG
+        return LaunchProfile("whpx", ["whpx,kernel-irqchip=off", tcg_accel(host_mb)], "max",
+                             "Windows Hypervisor Platform, falling back to multi-threaded TCG")
+    return LaunchProfile("tcg", [tcg_accel(host_mb)], "max",
+                         f"Multi-threaded TCG emulation, {tcg_tb_size(host_mb)} MB translation cache")
+
+
+def detect_profiles(qemu_system):
+    # Best first: a hardware accelerator the host can actually use, then TCG which always works
+    compiled = compiled_accelerators(qemu_system)
+    usable = {"kvm": kvm_usable, "hvf": hvf_usable, "whpx": lambda: sys.platform == "win32"}
+    names = [name for name in ("kvm", "hvf", "whpx") if name in compiled and usable[name]()]
+    host_mb = host_memory_mb()
+    profiles = [make_profile(name, host_mb) for name in names + ["tcg"]]
+    if VM_ACCEL:
+        profiles = [make_profile(VM_ACCEL, host_mb)] + [profile for profile in profiles if profile.name != VM_ACCEL]
+    return profiles
+
+
+@dataclass(slots=True)
+class StorageOptions:
+    bus: str = 'virtio-blk'
+    cache: str = 'none'
+    aio: str = 'threads'
+    iothread: bool = True
+    queues: int = 0
+
+
+def storage_defaults(disk_format):
+    # raw and qcow2 go straight to the device with O_DIRECT and the fastest AIO engine;
+    # the other formats keep the page cache and the thread pool
+    if qemu_format(disk_format) in PAGE_CACHED_FORMATS:
+        return StorageOptions('virtio-blk', 'writeback', 'threads', True, 0)
+    return StorageOptions('virtio-blk', 'none', 'io_uring' if 'io_uring' in AIO_MODES else 'native', True, 0)
+
+
+def storage_error(storage):
+    if storage.aio == 'native' and not CACHE_OPTIONS[storage.cache][0] and sys.platform != "win32":
+        return "aio=native needs O_DIRECT: use cache=none or cache=directsync."
+    return None
+
+
+def disk_format(path):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return qemu_format(extension or 'raw')
+
+
+def storage_args(path, storage, cpus):
+    direct, no_flush, write_cache = CACHE_OPTIONS[storage.cache]
+    queues = storage.queues or cpus
+    if storage.bus == 'ide':
+        # Legacy path kept for guests without virtio drivers; it has no iothreads or queues to set
+        drive = {'file': path, 'format': disk_format(path), 'if': 'ide', 'cache': storage.cache, 'aio': storage.aio}
+        return ["-drive", ",".join(f"{key}={str(value).replace(',', ',,')}" for key, value in drive.items())]
+    # JSON -blockdev so paths with commas need no escaping; the format node opens any backing chain itself
+    cache = {'direct': direct, 'no-flush': no_flush}
+    args = ["-blockdev", json.dumps({'driver': 'file', 'node-name': 'disk0-file', 'filename': path,
+                                     'aio': storage.aio, 'cache': cache}),
+            "-blockdev", json.dumps({'driver': disk_format(path), 'node-name': 'disk0', 'file': 'disk0-file',
+                                     'cache': cache})]
+    iothread = ",iothread=iothread0" if storage.iothread else ""
+    if storage.iothread:
+        args += ["-object", "iothread,id=iothread0"]
+    write_cache = "on" if write_cache else "off"
+    if storage.bus == 'virtio-scsi':
+        args += ["-device", f"virtio-scsi-pci,id=scsi0,num_queues={queues}{iothread}",
+                 "-device", f"scsi-hd,drive=disk0,bus=scsi0.0,write-cache={write_cache}"]
+    else:
+        args += ["-device", f"virtio-blk-pci,drive=disk0,num-queues={queues},write-cache={write_cache}{iothread}"]
+    return args
+
+
+launch_profiles = None
+
+def get_launch_profiles(qemu_system=QEMU_SYSTEM):
+    global launch_profiles
+    if launch_profiles is None:
+        launch_profiles = detect_profiles(qemu_system)
+    return launch_profiles
+
+
+def vm_name_error(name):
+    if not name.strip():
+        return 'VM name is required!'
+    if name[0].isdigit():
+        return 'VM name cannot start with a number!'
+    if any(char in VM_NAME_SPECIAL_CHARS for char in name):
+        return 'VM name cannot contain special characters like @, &, #, ?, etc.'
+    return None
+
+
+def vm_resources_error(cpu, memory, max_cpus):
+    if not 1 <= cpu <= max_cpus:
+        return f'CPU must be between 1 and {max_cpus}!'
+    if not VM_MEMORY_MB[0] <= memory <= VM_MEMORY_MB[1]:
+        return f'Memory must be between {VM_MEMORY_MB[0]} and {VM_MEMORY_MB[1]} MB!'
+    return None
+
+
+def vm_disk_error(disk, iso):
+    # A VM without a base image boots an installer ISO onto its own disk
+    if not iso.strip():
+        return 'ISO Path is required!'
+    if not disk.strip():
+        return 'Virtual Disk Path is required!'
+    if os.path.splitext(disk.strip())[1].lower().lstrip('.') not in DISK_FORMATS:
+        return f'Invalid disk format! Allowed: {", ".join(DISK_FORMATS)}'
+    return None
+
+
+def display_args(config):
+    display = config.get('display', 'sdl')
+    if display == 'vnc':
+        return ["-display", "none", "-vnc", f"{VNC_LISTEN}:{config.get('vnc_display', 0)}"]
+    if display == 'none':
+        # Nobody is there to pick from a boot menu
+        return ["-display", "none"]
+    return ["-boot", "menu=on", "-display", "sdl"]
+
+
+def launch_command(config, profile, qemu_system=QEMU_SYSTEM):
+    placement = config.get('placement')
+    # Named vCPU threads ("CPU 0/KVM") are how the pinning finds them after launch
+    name = f"{config['name']},debug-threads=on" if placement and placement.host_cpus else str(config['name'])
+    command = [qemu_system, "-name", name]
+    for accel in profile.accel:
+        command += ["-accel", accel]
+    command += ["-cpu", profile.cpu_model, "-m", str(config['memory']),
+                "-smp", smp_arg(config['cpu'], placement) if placement else str(config['cpu'])]
+    if placement:
+        command += memory_args(config['memory'], placement)
+    storage = config.get('storage') or storage_defaults(disk_format(str(config['disk'])))
+    command += storage_args(str(config['disk']), storage, config['cpu'])
+    if config.get('iso'):
+        command += ["-cdrom", str(config['iso'])]
+    command += display_args(config)
+    return command
+
+
+def format_command(command):
+    return subprocess.list2cmdline(command) if sys.platform == "win32" else shlex.join(command)
+
+
+def vm_config_path(name):
+    return os.path.join(VM_CONFIG_DIR, f"{name}.json")
+
+
+def save_vm_config(config, command):
+    # What was launched and with which options, so the VM can be started the same way again
+    document = {key: asdict(value) if is_dataclass(value) else value for key, value in config.items()}
+    document.setdefault('storage', asdict(storage_defaults(disk_format(str(config['disk'])))))
+    document['command'] = command
+    document['command_line'] = format_command(command)
+    os.makedirs(VM_CONFIG_DIR, exist_ok=True)
+    path = vm_config_path(config['name'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(document, file, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Dry run: prints what create_vm would launch on this machine without starting anything
+    parser = argparse.ArgumentParser(description="Show the QEMU launch command for a VM")
+    parser.add_argument("disk")
+    parser.add_argument("--name", default="vm")
+    parser.add_argument("--memory", type=int, default=4096)
+    parser.add_argument("--cpus", type=int, default=2)
+    parser.add_argument("--iso", default="")
+    parser.add_argument("--qemu", default=QEMU_SYSTEM)
+    parser.add_argument("--bus", choices=STORAGE_BUSES)
+    parser.add_argument("--cache", choices=CACHE_MODES)
+    parser.add_argument("--aio", choices=AIO_MODES)
+    args = parser.parse_args()
+
+    profiles = get_launch_profiles(args.qemu)
+    for profile in profiles:
+        print(f"{profile.name:<5} {' '.join('-accel ' + accel for accel in profile.accel)} -cpu {profile.cpu_model}"
+              f"  ({profile.description})")
+    storage = storage_defaults(disk_format(args.disk))
+    storage.bus, storage.cache, storage.aio = args.bus or storage.bus, args.cache or storage.cache, args.aio or storage.aio
+    error = storage_error(storage)
+    if error:
+        parser.error(error)
+    config = {'name': args.name, 'cpu': args.cpus, 'memory': args.memory, 'disk': args.disk, 'iso': args.iso,
+              'storage': storage}
+    print(format_command(launch_command(config, profiles[0], args.qemu)))
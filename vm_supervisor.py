@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from dataclasses import dataclass, field
+
+from docker_engine import format_size
+from disk_jobs import format_elapsed
+
+VM_RUNTIME_DIR = os.environ.get("CLOUD_VM_RUNTIME", os.path.join(tempfile.gettempdir(), "cloud-vms"))
+VM_SAMPLE_INTERVAL = 1.0
+VM_STATS_SAMPLES = 300
+QMP_CONNECT_TIMEOUT = 10
+QMP_TIMEOUT = 5
+STARTING, EXITED = "starting", "exited"
+
+
+class QmpError(Exception):
+    pass
+
+
+class QmpClient:
+    # One JSON object per line each way; events can arrive between a command and its reply
+    def __init__(self, address, timeout=QMP_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.events = deque(maxlen=100)
+        self.lock = threading.Lock()
+
+    def connect(self, deadline):
+        kind, _, target = self.address.partition(":")
+        while True:
+            try:
+                if kind == "unix":
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(target)
+                else:
+                    host, _, port = target.rpartition(":")
+                    sock = socket.create_connection((host, int(port)), timeout=self.timeout)
+                break
+            except OSError:
+                # QEMU opens the socket a moment after the process starts
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        sock.settimeout(self.timeout)
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        if "QMP" not in self.read():
+            raise QmpError("no QMP greeting")
+        self.execute("qmp_capabilities")
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("QMP connection closed")
+        return json.loads(line)
+
+    def execute(self, command, **arguments):
+        message = {"execute": command}
+        if arguments:
+            message["arguments"] = arguments
+        with self.lock:
+            if self.sock is None:
+                # Closed by the sampler when the VM exited, or after a timeout
+                raise ConnectionError("QMP connection closed")
+            try:
+                self.sock.sendall(json.dumps(message).encode() + b"\r\n")
+                while True:
+                    reply = self.read()
+                    if "event" in reply:
+                        self.events.append(reply)
+                    elif "error" in reply:
+                        raise QmpError(reply["error"].get("desc", str(reply["error"])))
+                    else:
+                        return reply.get("return")
+            except (OSError, ValueError):
+                # Replies carry no id: one that turns up after a timeout would be read as the answer
+                # to the next command, so the connection is dropped and the caller reconnects
+                self.drop()
+                raise
+
+    def drop(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def close(self):
+        # Under the lock so a command running on another thread sees either the open socket or none
+        with self.lock:
+            self.drop()
+
+
+def qmp_address(name):
+    # Unix sockets where QEMU has them; loopback TCP on Windows
+    if sys.platform == "win32":
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            return f"tcp:127.0.0.1:{probe.getsockname()[1]}"
+    os.makedirs(VM_RUNTIME_DIR, exist_ok=True)
+    return f"unix:{os.path.join(VM_RUNTIME_DIR, f'{name}.qmp')}"
+
+
+def command_disks(command):
+    # Image files a QEMU command line opens: JSON -blockdev, -drive file=... (",," escapes a comma) and -hda
+    disks = []
+    for option, value in zip(command, command[1:]):
+        filename = None
+        if option == "-blockdev" and value.startswith("{"):
+            try:
+                filename = json.loads(value).get("filename")
+            except ValueError:
+                pass
+        elif option == "-drive":
+            for part in value.replace(",,", "\0").split(","):
+                key, _, item = part.partition("=")
+                if key == "file":
+                    filename = item.replace("\0", ",")
+        elif option in ("-hda", "-hdb", "-hdc", "-hdd"):
+            filename = value
+        if filename:
+            disks.append(os.path.abspath(filename))
+    return disks
+
+
+def process_cpu_seconds(pid):
+    # utime + stime from /proc/<pid>/stat; the name field can contain spaces, so split after its ')'
+    try:
+        with open(f"/proc/{pid}/stat", "r") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+@dataclass(slots=True)
+class VmSample:
+    time: float
+    status: str
+    cpu_percent: object = None
+    rss: object = None
+    read_bytes: int = 0
+    write_bytes: int = 0
+    read_rate: float = 0.0
+    write_rate: float = 0.0
+
+
+@dataclass(slots=True)
+class VmProcess:
+    name: str
+    command: list
+    process: object
+    address: str
+    client: object = None
+    status: str = STARTING
+    message: str = ""
+    started: float = field(default_factory=time.monotonic)
+    samples: deque = field(default_factory=lambda: deque(maxlen=VM_STATS_SAMPLES))
+    cpu_seconds: object = None
+
+    def average_cpu(self, seconds=60):
+        recent = [sample.cpu_percent for sample in list(self.samples)[-int(seconds / VM_SAMPLE_INTERVAL):]
+                  if sample.cpu_percent is not None]
+        return sum(recent) / len(recent) if recent else None
+
+    def row(self):
+        last = self.samples[-1] if self.samples else VmSample(0.0, self.status)
+        average = self.average_cpu()
+        return [self.name, str(self.process.pid), self.message or self.status,
+                f"{last.cpu_percent:.0f}%" if last.cpu_percent is not None else "",
+                f"{average:.0f}%" if average is not None else "",
+                format_size(last.rss) if last.rss is not None else "",
+                f"{format_size(last.read_rate)}/s", f"{format_size(last.write_rate)}/s",
+                format_elapsed(time.monotonic() - self.started)]
+
+
+class VmSupervisor:
+    COLUMNS = ["VM", "PID", "Status", "CPU", "CPU (1 min)", "RSS", "Read", "Write", "Uptime"]
+
+    def __init__(self, listener=None, interval=VM_SAMPLE_INTERVAL):
+        self.listener = listener
+        self.interval = interval
+        self.vms = {}
+        self.lock = threading.Lock()
+        self.sampler = None
+
+    def notify(self, vm):
+        if self.listener is not None:
+            self.listener(vm)
+
+    def launch(self, name, command):
+        with self.lock:
+            running = self.vms.get(name)
+            if running is not None and running.status != EXITED:
+                raise ValueError(f"A VM named {name} is already running.")
+        address = qmp_address(name)
+        if address.startswith("unix:") and os.path.exists(address[5:]):
+            os.remove(address[5:])
+        command = command + ["-qmp", f"{address},server=on,wait=off"]
+        # Out of the terminal's process group: Ctrl+C in the launcher must not kill guests before they can power down
+        if sys.platform == "win32":
+            process = subprocess.Popen(command, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            process = subprocess.Popen(command, start_new_session=True)
+        vm = VmProcess(name, command, process, address)
+        with self.lock:
+            self.vms[name] = vm
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.run, daemon=True)
+                self.sampler.start()
+        threading.Thread(target=self.attach, args=(vm,), daemon=True).start()
+        self.notify(vm)
+        return vm
+
+    def attach(self, vm):
+        client = QmpClient(vm.address)
+        try:
+            client.connect(time.monotonic() + QMP_CONNECT_TIMEOUT)
+        except (OSError, ValueError, QmpError) as e:
+            client.close()
+            if vm.process.poll() is None:
+                vm.message = f"no QMP: {e}"
+                self.notify(vm)
+            return
+        vm.client = client
+        vm.message = ""
+
+    def reattach(self, vm, client):
+        # Only the first caller to see this dead client swaps it out, so one new connection is made
+        with self.lock:
+            if vm.client is not client:
+                return
+            vm.client = None
+        if vm.process.poll() is None:
+            threading.Thread(target=self.attach, args=(vm,), daemon=True).start()
+
+    def command(self, name, qmp_command):
+        vm = self.vms.get(name)
+        if vm is None or vm.status == EXITED:
+            raise ValueError(f"{name} is not running.")
+        # The sampler drops vm.client when the VM exits, so hold on to the one checked here
+        client = vm.client
+        if client is None:
+            if qmp_command == "quit":
+                # Without a monitor there is still the process itself
+                vm.process.terminate()
+                return
+            raise ValueError(f"{name} has no QMP connection yet.")
+        try:
+            client.execute(qmp_command)
+            if qmp_command != "quit":
+                vm.status = client.execute("query-status").get("status", vm.status)
+        except (OSError, ValueError) as e:
+            # QEMU closes the monitor as it quits; anything else is a lost or timed-out connection
+            if qmp_command != "quit" or not isinstance(e, ConnectionError):
+                if client.sock is None:
+                    self.reattach(vm, client)
+                raise
+        self.notify(vm)
+
+    def pause(self, name):
+        self.command(name, "stop")
+
+    def resume(self, name):
+        self.command(name, "cont")
+
+    def powerdown(self, name):
+        # ACPI power button: the guest decides when (and whether) to shut down
+        self.command(name, "system_powerdown")
+
+    def force_stop(self, name):
+        self.command(name, "quit")
+
+    def disk_users(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            return [vm.name for vm in self.vms.values() if vm.status != EXITED and path in command_disks(vm.command)]
+
+    def clear_exited(self):
+        with self.lock:
+            exited = [name for name, vm in self.vms.items() if vm.status == EXITED]
+            for name in exited:
+                del self.vms[name]
+        return exited
+
+    def sample(self, vm):
+        now = time.monotonic()
+        previous = vm.samples[-1] if vm.samples else None
+        exit_code = vm.process.poll()
+        if exit_code is not None:
+            vm.status = EXITED
+            vm.message = f"exited ({exit_code})"
+            if vm.client is not None:
+                vm.client.close()
+                vm.client = None
+            return
+        sample = VmSample(now, vm.status)
+        client = vm.client
+        if client is not None:
+            try:
+                sample.status = vm.status = client.execute("query-status").get("status", vm.status)
+                for device in client.execute("query-blockstats") or []:
+                    stats = device.get("stats", {})
+                    sample.read_bytes += stats.get("rd_bytes", 0)
+                    sample.write_bytes += stats.get("wr_bytes", 0)
+            except (OSError, ValueError, QmpError) as e:
+                vm.message = f"QMP: {e}"
+                if client.sock is None:
+                    self.reattach(vm, client)
+        cpu_seconds = process_cpu_seconds(vm.process.pid)
+        sample.rss = process_rss(vm.process.pid)
+        if previous is not None and now > previous.time:
+            elapsed = now - previous.time
+            if cpu_seconds is not None and vm.cpu_seconds is not None:
+                sample.cpu_percent = 100.0 * (cpu_seconds - vm.cpu_seconds) / elapsed
+            sample.read_rate = max(0, sample.read_bytes - previous.read_bytes) / elapsed
+            sample.write_rate = max(0, sample.write_bytes - previous.write_bytes) / elapsed
+        vm.cpu_seconds = cpu_seconds
+        vm.samples.append(sample)
+
+    def run(self):
+        while True:
+            with self.lock:
+                vms = [vm for vm in self.vms.values() if vm.status != EXITED]
+            for vm in vms:
+                self.sample(vm)
+                self.notify(vm)
+            time.sleep(self.interval)
+
+
+def run_benchmark(vms=4, seconds=5):
+    # Supervises a few fake_qemu_system.py processes: QMP round trips and the cost of a sampling pass
+    fake = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_qemu_system.py")
+    supervisor = VmSupervisor(interval=0.5)
+    try:
+        for i in range(vms):
+            supervisor.launch(f"bench{i}", [sys.executable, fake, "-name", f"bench{i}", "-smp", "2"])
+        deadline = time.monotonic() + QMP_CONNECT_TIMEOUT
+        while any(vm.client is None for vm in supervisor.vms.values()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        vm = supervisor.vms["bench0"]
+        start = time.perf_counter()
+        for _ in range(200):
+            vm.client.execute("query-status")
+        print(f"query-status round trip: {(time.perf_counter() - start) / 200 * 1e6:.0f} us")
+        start = time.perf_counter()
+        for vm in supervisor.vms.values():
+            supervisor.sample(vm)
+        print(f"sampling pass over {vms} VMs: {(time.perf_counter() - start) * 1000:.1f} ms")
+        supervisor.pause("bench1")
+        time.sleep(seconds)
+        for vm in supervisor.vms.values():
+            print("  ".join(vm.row()))
+        supervisor.powerdown("bench0")
+        time.sleep(2)
+        print("after powerdown:", supervisor.vms["bench0"].row()[2])
+    finally:
+        for vm in supervisor.vms.values():
+            if vm.process.poll() is None:
+                vm.process.kill()
+
+
+if __name__ == "__main__":
+    run_benchmark()